@@ -6,12 +6,67 @@
 # =============================
 import pandas as pd
 import streamlit as st
+import time
 from datetime import date, timedelta
-
-from db import get_conn, init_db
+from functools import wraps
+from pathlib import Path
+from uuid import uuid4
+
+from datos import (
+    COL_ADICIONAL, DIAS, actualizar_encargado, actualizar_trabajador, anios_con_hojas, buscar_trabajadores,
+    cambiar_estado_hoja, catalogo_trabajadores, cerrar_hojas_rango, contar_registros, delete_hoja, desactivar_trabajador,
+    eliminar_hojas_rango, eliminar_registros, ensure_semana, grilla_semana, guardar_grilla,
+    guardar_registro, hoja, hoja_mas_reciente, hoja_vecina, hojas_del_anio, montos_semana,
+    registros_trabajador, resumen_rango, trabajador, vista_semanal,
+)
+import escritor
+import historial
+import perfil
+import precarga
+import respaldo
+import sitios
+from archivo import MESES_VIVOS, archivar
+from cache import CACHE
+from db import fijar_ruta, generacion, init_db, ruta_actual, tablas_afectadas
+from importador import importar, leer
+from reportes import exportar_planilla
+
+LIMITE_BUSQUEDA = 50  # coincidencias que muestran los selectores de trabajador
 
 st.set_page_config(page_title="QUALISEM G. (registros)", layout="wide")
+
+# -------------------- Sitio (una DB por sitio, sitios.py) --------------------
+# Las sesiones de un mismo servidor pueden estar en sitios distintos: cada ejecución (script,
+# fragmento o callback) enruta su hilo a la DB del sitio de su sesión antes de tocar datos.
+def sitio_de_sesion():
+    """Fija db.ruta_actual() del hilo en la DB del sitio elegido en esta sesión."""
+    try:
+        fijar_ruta(sitios.ruta(st.session_state.get("sitio", sitios.PRINCIPAL)))
+    except ValueError:  # el sitio ya no está (sitios.json cambió): vuelve al principal
+        st.session_state["sitio"] = sitios.PRINCIPAL
+        fijar_ruta(None)
+
+def del_sitio(cb):
+    """Para callbacks (on_click): corren antes que el script, quizá en un hilo aún sin sitio."""
+    @wraps(cb)
+    def envoltura(*args, **kwargs):
+        sitio_de_sesion()
+        return cb(*args, **kwargs)
+    return envoltura
+
+def cambiar_sitio_cb():
+    # Hoja elegida, formularios y resultados eran del sitio anterior
+    for clave in list(st.session_state):
+        if clave not in ("sitio", "perfil_sql"):
+            del st.session_state[clave]
+
+SITIOS = sitios.sitios()  # cada rerun: dos stat (sitios.json y data/sitios/); relee solo si cambiaron
+if len(SITIOS) > 1:
+    st.sidebar.selectbox("🏢 Sitio", options=list(SITIOS), key="sitio", on_change=cambiar_sitio_cb)
+sitio_de_sesion()
 init_db()
+respaldos = respaldo.iniciar_programado()  # hilo del proceso (uno por sitio): respalda cada INTERVALO_HORAS y rota
+perfil.iniciar(perfil.POR_DEFECTO or st.session_state.get("perfil_sql", False))
 
 # -------------------- Utilidades (LUN–SÁB) --------------------
 def monday_of_week(d: date) -> date:
@@ -20,50 +75,66 @@ def monday_of_week(d: date) -> date:
 def saturday_of_week(d: date) -> date:
     return monday_of_week(d) + timedelta(days=5)
 
-def label_dow(idx: int) -> str:
-    return ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"][idx]
-
-def ensure_semana(ini: date, fin: date, encargado: str | None = None):
-    """Crea semana si no existe; devuelve (id, encargado, cerrada)."""
-    with get_conn() as conn:
-        row = conn.execute(
-            "SELECT id, encargado, cerrada FROM semanas WHERE semana_inicio=? AND semana_fin=?",
-            (ini.isoformat(), fin.isoformat()),
-        ).fetchone()
-        if row is None:
-            enc = (encargado or "").strip() or "—"
-            conn.execute(
-                "INSERT INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,?,0)",
-                (ini.isoformat(), fin.isoformat(), enc),
-            )
-            row = conn.execute(
-                "SELECT id, encargado, cerrada FROM semanas WHERE semana_inicio=? AND semana_fin=?",
-                (ini.isoformat(), fin.isoformat()),
-            ).fetchone()
-        return row["id"], row["encargado"], int(row["cerrada"])
-
-def list_hojas():
-    """Devuelve DataFrame de semanas como 'hojas' ordenadas desc por inicio."""
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT id, semana_inicio, semana_fin, encargado, cerrada
-            FROM semanas
-            ORDER BY date(semana_inicio) DESC
-            """,
-            conn,
-        )
-    if df.empty:
-        return pd.DataFrame(columns=["id","semana_inicio","semana_fin","encargado","cerrada"])
-    df["semana_inicio"] = pd.to_datetime(df["semana_inicio"]).dt.date
-    df["semana_fin"]    = pd.to_datetime(df["semana_fin"]).dt.date
-    return df
+# -------------------- Fragmentos (reruns parciales) --------------------
+# Tablas que lee cada sección. Una interacción dentro de un fragmento re-ejecuta solo ese
+# fragmento; una escritura re-ejecuta solo las secciones que leen alguna tabla que cambió
+# (las demás ni se tocan). "pagina" es el cuerpo del script: si cambia, rerun completo.
+DEPENDENCIAS = {
+    "pagina": {"semanas"},
+    "eliminar_hoja": {"entradas"},
+    "masivo": {"semanas", "entradas"},
+    "registro": {"trabajadores", "trabajadores_fts"},
+    "grilla": {"entradas", "trabajadores"},
+    "editor": {"trabajadores", "trabajadores_fts", "entradas"},
+    "vista": {"entradas", "trabajadores", "instantaneas"},
+    "montos": {"totales_semana", "trabajadores", "instantaneas"},
+    "planilla": set(),
+    "importar": set(),
+    "historial": {"entradas", "trabajadores"},
+    "respaldos": set(),
+    "sitios": set(),
+}
+
+def fragmento(nombre):
+    """st.fragment con clave `nombre` (de DEPENDENCIAS); muestra su aviso pendiente y se mide en el perfil."""
+    def deco(fn):
+        @st.fragment(key=nombre)
+        @wraps(fn)
+        def envoltura(*args, **kwargs):
+            sitio_de_sesion()
+            st.session_state.setdefault("fragmentos_en_pagina", set()).add(nombre)
+            with perfil.seccion(nombre):
+                aviso = st.session_state.pop(f"aviso_{nombre}", None)
+                if aviso:
+                    getattr(st, aviso[0])(aviso[1])
+                fn(*args, **kwargs)
+        return envoltura
+    return deco
+
+def avisar(seccion, tipo, texto):
+    """Mensaje (success/warning/error/info) que la sección muestra en su próxima ejecución."""
+    st.session_state[f"aviso_{seccion}"] = (tipo, texto)
+
+def tras_escribir(escritura):
+    """
+    Para callbacks (on_click): tras `escritura`, re-ejecuta solo las secciones que leen lo que
+    cambió (triggers y cascadas incluidos); rerun completo si cambió algo del cuerpo del script.
+    Solo se apuntan las secciones que se mostraron en la página actual: pedir el rerun de un
+    fragmento que no se dibujó (p. ej. "eliminar_hoja" en una hoja archivada) es un error.
+    """
+    tablas = getattr(escritura, "tablas", None)
+    if tablas is None:
+        st.rerun()
+    tocadas = tablas_afectadas(tablas)
+    if DEPENDENCIAS["pagina"] & tocadas:
+        st.rerun()
+    en_pagina = st.session_state.get("fragmentos_en_pagina", set())
+    secciones = [n for n, deps in DEPENDENCIAS.items() if deps & tocadas and n in en_pagina]
+    if secciones:
+        st.rerun(scope=secciones)
 
-def delete_hoja(semana_id: int):
-    """Elimina la hoja/semana: borra sus entradas y luego la fila de semanas."""
-    with get_conn() as conn:
-        conn.execute("DELETE FROM entradas WHERE semana_id=?", (int(semana_id),))
-        conn.execute("DELETE FROM semanas  WHERE id=?", (int(semana_id),))
+# Cada rerun completo vuelve a anotar los fragmentos que dibuja (ver tras_escribir)
+st.session_state["fragmentos_en_pagina"] = set()
 
 # -------------------- Sidebar: selector de HOJA (semana) --------------------
 st.sidebar.title("📄 QUALISEM G. (registros)")
@@ -75,40 +146,51 @@ if "hoja_id" not in st.session_state:
     sid, _, _ = ensure_semana(ini, fin, None)
     st.session_state["hoja_id"] = int(sid)
 
-df_hojas = list_hojas()
-if df_hojas.empty:
-    ini = monday_of_week(date.today())
-    fin = saturday_of_week(date.today())
-    sid, _, _ = ensure_semana(ini, fin, None)
+# Hoja actual por id; si ya no existe (borrada en otra sesión), la más reciente o la de hoy
+row_sel = hoja(st.session_state["hoja_id"])
+if row_sel is None:
+    sid = hoja_mas_reciente()
+    if sid is None:
+        sid, _, _ = ensure_semana(monday_of_week(date.today()), saturday_of_week(date.today()), None)
     st.session_state["hoja_id"] = int(sid)
-    df_hojas = list_hojas()
+    row_sel = hoja(sid)
 
 def hoja_label(row):
-    estado = "🔒" if row["cerrada"] else "🟢"
+    estado = "📦" if row["archivada"] else "🔒" if row["cerrada"] else "🟢"
     enc = row["encargado"] or "—"
     return f"{row['semana_inicio']} → {row['semana_fin']}  | Enc: {enc} {estado}"
 
-opciones = {hoja_label(r): int(r["id"]) for _, r in df_hojas.iterrows()}
-labels = list(opciones.keys())
-label_actual = next((k for k,v in opciones.items() if v == st.session_state["hoja_id"]), labels[0])
+# Selector por año: solo se cargan las hojas del año elegido (≤ 53)
+anios = anios_con_hojas()
+anio_sel = st.sidebar.selectbox("Año", options=anios, index=anios.index(row_sel["semana_inicio"].year))
 
-sel_label = st.sidebar.selectbox("Hoja (semana)", options=labels, index=labels.index(label_actual))
-st.session_state["hoja_id"] = opciones[sel_label]
+hojas_anio = hojas_del_anio(anio_sel)
+opciones = {h["id"]: hoja_label(h) for h in hojas_anio}
+ids_anio = list(opciones.keys())
+if not ids_anio:  # el año se quedó sin hojas (borradas en otra sesión): se sigue mostrando la actual
+    opciones = {row_sel["id"]: hoja_label(row_sel)}
+    ids_anio = [row_sel["id"]]
+idx_actual = ids_anio.index(row_sel["id"]) if row_sel["id"] in opciones else 0
+
+sel_id = st.sidebar.selectbox("Hoja (semana)", options=ids_anio, index=idx_actual, format_func=opciones.get)
+if sel_id != row_sel["id"]:
+    st.session_state["hoja_id"] = int(sel_id)
+    row_sel = hoja(sel_id)
 
-row_sel = df_hojas[df_hojas["id"] == st.session_state["hoja_id"]].iloc[0]
 semana_id = int(row_sel["id"])
 sem_ini   = row_sel["semana_inicio"]
 sem_fin   = row_sel["semana_fin"]
 encargado_guardado = row_sel["encargado"] or "—"
 cerrada   = int(row_sel["cerrada"])
+archivada = row_sel["archivada"]  # movida a data/archivo/ (archivo.py): solo lectura
 
-# Navegación rápida
+# Navegación rápida (hoja vecina por índice de fecha)
 col_nav1, col_nav2, col_nav3 = st.sidebar.columns([1,1,1])
 with col_nav1:
     if st.button("◀ Ant.", use_container_width=True):
-        idx = df_hojas.index[df_hojas["id"] == semana_id][0]
-        if idx + 1 < len(df_hojas):
-            st.session_state["hoja_id"] = int(df_hojas.iloc[idx+1]["id"])
+        sid = hoja_vecina(sem_ini, -1)
+        if sid is not None:
+            st.session_state["hoja_id"] = sid
             st.rerun()
 with col_nav2:
     if st.button("Hoy", use_container_width=True):
@@ -119,9 +201,9 @@ with col_nav2:
         st.rerun()
 with col_nav3:
     if st.button("Sig. ▶", use_container_width=True):
-        idx = df_hojas.index[df_hojas["id"] == semana_id][0]
-        if idx - 1 >= 0:
-            st.session_state["hoja_id"] = int(df_hojas.iloc[idx-1]["id"])
+        sid = hoja_vecina(sem_ini, +1)
+        if sid is not None:
+            st.session_state["hoja_id"] = sid
             st.rerun()
 
 # Crear nueva hoja (Lun–Sáb)
@@ -137,68 +219,235 @@ if st.sidebar.button("Crear hoja", use_container_width=True):
 
 # Encargado + estado de la HOJA actual
 st.sidebar.caption(f"Hoja: **{sem_ini} → {sem_fin}** (Lun–Sáb)")
-encargado_input = st.sidebar.text_input("Encargado de la semana", value=encargado_guardado, key="wk_encargado_input")
-if (encargado_input or "—") != encargado_guardado:
-    with get_conn() as conn:
-        conn.execute("UPDATE semanas SET encargado=? WHERE id=?", (encargado_input.strip() or "—", int(semana_id)))
+encargado_input = st.sidebar.text_input(
+    "Encargado de la semana", value=encargado_guardado, key=f"wk_encargado_input_{semana_id}", disabled=archivada
+)
+if not archivada and (encargado_input or "—") != encargado_guardado:
+    actualizar_encargado(semana_id, encargado_input)
     encargado_guardado = encargado_input.strip() or "—"
 
-if cerrada:
+if archivada:
+    st.sidebar.info(f"📦 Semana ARCHIVADA (solo lectura). Encargado: {encargado_guardado}")
+elif cerrada:
     st.sidebar.error(f"Semana CERRADA. Encargado: {encargado_guardado}")
     if st.sidebar.button("🔓 Abrir hoja", use_container_width=True):
-        with get_conn() as conn:
-            conn.execute("UPDATE semanas SET cerrada=0 WHERE id=?", (int(semana_id),))
+        cambiar_estado_hoja(semana_id, False)
         st.success("✅ Hoja abierta.")
         st.rerun()
 else:
     st.sidebar.success(f"Semana ABIERTA. Encargado: {encargado_guardado}")
     if st.sidebar.button("🔒 Cerrar hoja", use_container_width=True):
-        with get_conn() as conn:
-            conn.execute("UPDATE semanas SET cerrada=1 WHERE id=?", (int(semana_id),))
+        cambiar_estado_hoja(semana_id, True)
         st.warning("🔒 Hoja cerrada.")
         st.rerun()
 
 # --- Eliminar hoja (semana) actual ---
-st.sidebar.markdown("#### 🗑️ Eliminar hoja")
-with get_conn() as conn:
-    total_regs = conn.execute(
-        "SELECT COUNT(*) AS c FROM entradas WHERE semana_id=?", (int(semana_id),)
-    ).fetchone()["c"]
-
-st.sidebar.caption(
-    f"Esta hoja tiene **{total_regs}** registro(s). "
-    "Se eliminarán definitivamente de esta semana."
-)
+@fragmento("eliminar_hoja")
+def seccion_eliminar_hoja(semana_id):
+    st.markdown("#### 🗑️ Eliminar hoja")
+    total_regs = contar_registros(semana_id)
+
+    st.caption(
+        f"Esta hoja tiene **{total_regs}** registro(s). "
+        "Se eliminarán definitivamente de esta semana."
+    )
 
-col_del_a, col_del_b = st.sidebar.columns([1, 1])
-with col_del_a:
-    confirm_del = st.checkbox("Sí, deseo eliminar", key=f"confirm_del_{semana_id}")
-with col_del_b:
-    danger = st.button("Eliminar hoja", use_container_width=True)
+    col_del_a, col_del_b = st.columns([1, 1])
+    with col_del_a:
+        confirm_del = st.checkbox("Sí, deseo eliminar", key=f"confirm_del_{semana_id}")
+    with col_del_b:
+        danger = st.button("Eliminar hoja", use_container_width=True)
 
-if danger:
-    if not confirm_del:
-        st.sidebar.warning("Marca la casilla de confirmación para eliminar.")
-    else:
-        delete_hoja(semana_id)
-        # Elegir nueva hoja activa tras borrar
-        df_rest = list_hojas()
-        if df_rest.empty:
-            ini = monday_of_week(date.today())
-            fin = saturday_of_week(date.today())
-            sid_new, _, _ = ensure_semana(ini, fin, None)
+    if danger:
+        if not confirm_del:
+            st.warning("Marca la casilla de confirmación para eliminar.")
+        else:
+            delete_hoja(semana_id)
+            # Elegir nueva hoja activa tras borrar
+            sid_new = hoja_mas_reciente()
+            if sid_new is None:
+                ini = monday_of_week(date.today())
+                fin = saturday_of_week(date.today())
+                sid_new, _, _ = ensure_semana(ini, fin, None)
             st.session_state["hoja_id"] = int(sid_new)
+            st.success("🗑️ Hoja eliminada correctamente.")
+            st.rerun()
+
+if not archivada:
+    with st.sidebar:
+        seccion_eliminar_hoja(semana_id)
+
+# --- Gestión masiva (cierre de año, limpieza) ---
+@fragmento("masivo")
+def seccion_masivo(sem_ini):
+    rango_desde = st.date_input("Desde (inicio de hoja)", value=date(sem_ini.year, 1, 1), key="masivo_desde")
+    rango_hasta = st.date_input("Hasta (inicio de hoja)", value=date(sem_ini.year, 12, 31), key="masivo_hasta")
+    if rango_desde > rango_hasta:
+        st.warning("El rango está invertido.")
+        return
+    resumen = resumen_rango(rango_desde, rango_hasta)
+    st.caption(
+        f"**{resumen['hojas']}** hoja(s) en el rango ({resumen['cerradas']} cerrada(s)), "
+        f"**{resumen['registros']}** registro(s)."
+    )
+    col_m1, col_m2 = st.columns(2)
+    with col_m1:
+        if st.button("🔒 Cerrar todas", use_container_width=True, key="masivo_cerrar"):
+            n = cerrar_hojas_rango(rango_desde, rango_hasta, True)
+            st.success(f"{n} hoja(s) cerrada(s).")
+            st.rerun()
+    with col_m2:
+        if st.button("🔓 Abrir todas", use_container_width=True, key="masivo_abrir"):
+            n = cerrar_hojas_rango(rango_desde, rango_hasta, False)
+            st.success(f"{n} hoja(s) abierta(s).")
+            st.rerun()
+    confirm_masivo = st.checkbox("Sí, deseo eliminar todas las hojas del rango", key="masivo_confirm")
+    if st.button("🗑️ Eliminar hojas del rango", use_container_width=True, key="masivo_eliminar"):
+        if not confirm_masivo:
+            st.warning("Marca la casilla de confirmación para eliminar.")
         else:
-            st.session_state["hoja_id"] = int(df_rest.iloc[0]["id"])
-        st.success("🗑️ Hoja eliminada correctamente.")
+            n = eliminar_hojas_rango(rango_desde, rango_hasta)
+            if rango_desde <= sem_ini <= rango_hasta:
+                sid_new = hoja_mas_reciente()
+                if sid_new is None:
+                    sid_new, _, _ = ensure_semana(monday_of_week(date.today()), saturday_of_week(date.today()), None)
+                st.session_state["hoja_id"] = int(sid_new)
+            st.success(f"🗑️ {n} hoja(s) eliminada(s).")
+            st.rerun()
+
+    st.markdown("**📦 Archivo**")
+    st.caption("Mueve las hojas cerradas antiguas a data/archivo/ (una DB por año) y compacta la DB viva. "
+               "Siguen visibles como solo lectura.")
+    meses = st.number_input("Cerradas hace más de (meses)", min_value=1, step=1, value=MESES_VIVOS, key="archivo_meses")
+    if st.button("📦 Archivar hojas antiguas", use_container_width=True, key="masivo_archivar"):
+        res = archivar(int(meses))
+        st.success(f"📦 {res['hojas']} hoja(s) archivada(s).")
         st.rerun()
 
+with st.sidebar.expander("🗂️ Gestión masiva de hojas"):
+    seccion_masivo(sem_ini)
+
+# --- Respaldos (copias en caliente, respaldo.py) ---
+@fragmento("respaldos")
+def seccion_respaldos():
+    lista = respaldo.listar()
+    if respaldos.ultimo_error:
+        st.error(f"Falló el último respaldo programado: {respaldos.ultimo_error}")
+    st.caption(
+        f"Automático cada {respaldo.INTERVALO_HORAS:g} h; se conservan el último de cada uno de los "
+        f"{respaldo.DIARIOS} días y de las {respaldo.SEMANALES} semanas más recientes."
+    )
+    if st.button("💾 Respaldar ahora", use_container_width=True, key="respaldo_crear"):
+        try:
+            res = respaldo.crear()
+        except Exception as e:
+            st.error(f"Error respaldando: {e}")
+        else:
+            respaldo.rotar()
+            avisar("respaldos", "success", f"💾 {res['nombre']} ({res['bytes'] / 2**20:.1f} MiB, integridad ok).")
+            st.rerun(scope="fragment")
+    if not lista:
+        st.info("Todavía no hay respaldos.")
+        return
+    nombres = [r["nombre"] for r in lista]
+    etiquetas = {r["nombre"]: f"{r['creado']:%Y-%m-%d %H:%M} · {r['bytes'] / 2**20:.1f} MiB" for r in lista}
+    elegido = st.selectbox("Respaldo", options=nombres, format_func=etiquetas.get, key="respaldo_elegido")
+    confirmar = st.checkbox("Sí, deseo volver la base a ese momento", key="respaldo_confirm")
+    if st.button("⏪ Restaurar", use_container_width=True, key="respaldo_restaurar"):
+        if not confirmar:
+            st.warning("Marca la casilla de confirmación para restaurar.")
+            return
+        try:
+            res = respaldo.restaurar(elegido)
+        except Exception as e:
+            st.error(f"Error restaurando: {e}")
+            return
+        avisar("respaldos", "success", f"⏪ Restaurado {res['restaurado']} (el estado anterior quedó en {res['respaldo_previo']}).")
+        st.rerun()
+
+with st.sidebar.expander("💾 Respaldos"):
+    seccion_respaldos()
+
+# --- Sitios: alta y planilla consolidada (todas las DBs por ATTACH) ---
+@fragmento("sitios")
+def seccion_sitios(sem_ini, sem_fin):
+    nuevo = st.text_input("Nuevo sitio", key="sitio_nuevo", placeholder="p. ej. obra-norte")
+    if st.button("➕ Crear sitio", use_container_width=True, key="sitio_crear", disabled=not nuevo.strip()):
+        try:
+            sitios.crear(nuevo)
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        avisar("sitios", "success", f"🏢 Sitio {nuevo.strip().lower()} creado.")
+        st.rerun()  # aparece en el selector (cuerpo del script)
+    if len(SITIOS) < 2:
+        return
+    st.divider()
+    st.caption("Planilla de todos los sitios (hojas vivas) en un solo CSV.")
+    c1, c2 = st.columns(2)
+    with c1:
+        desde = st.date_input("Desde", value=date(sem_ini.year, 1, 1), key="consolidado_desde")
+    with c2:
+        hasta = st.date_input("Hasta", value=sem_fin, key="consolidado_hasta")
+    if st.button("🧾 Consolidado", use_container_width=True, key="btn_consolidado"):
+        if desde > hasta:
+            st.warning("El rango está invertido.")
+            return
+        st.session_state["consolidado"] = (
+            [*sitios.exportar_consolidado(desde, hasta)], sitios.resumen(desde, hasta)
+        )
+    if "consolidado" in st.session_state:
+        (ruta, filas), por_sitio = st.session_state["consolidado"]
+        st.dataframe(pd.DataFrame(por_sitio), hide_index=True, use_container_width=True)
+        if Path(ruta).exists():
+            with open(ruta, "rb") as fh:
+                st.download_button(f"⬇️ {Path(ruta).name} ({filas} filas)", data=fh, file_name=Path(ruta).name,
+                                   mime="text/csv", key="dl_consolidado")
+
+with st.sidebar.expander("🏢 Sitios"):
+    seccion_sitios(sem_ini, sem_fin)
+
 # -------------------- Tabs --------------------
-reg_tab, montos_tab = st.tabs(["📋 Registros (Lun–Sáb)", "💰 Montos y Total (pago sábado)"])
+reg_tab, montos_tab, rango_tab, historial_tab, importar_tab = st.tabs(
+    ["📋 Registros (Lun–Sáb)", "💰 Montos y Total (pago sábado)", "📑 Planilla por rango", "📈 Historial", "📥 Importar"]
+)
 
 # -------------------- TAB 1 – Registros --------------------
-with reg_tab:
-    st.markdown(f"## 📋 Registros (Lunes a Sábado) — Hoja {sem_ini} → {sem_fin}")
+@del_sitio
+def guardar_registro_cb(semana_id, es_sabado):
+    """on_click de 'Guardar registro': lee el formulario de session_state (valores ya confirmados)."""
+    ss = st.session_state
+    modo = ss[f"modo_trab_{semana_id}"]
+    if modo == "Existente":
+        trab_id = ss.get(f"trab_existente_{semana_id}_{ss.get(f'trab_buscar_{semana_id}', '')}") or None
+        row_trab = trabajador(trab_id) if trab_id else None
+        nombre, cargo = (row_trab["nombre"], row_trab["cargo"]) if row_trab else ("", "")
+    else:
+        trab_id = None
+        nombre = ss.get(f"nuevo_nombre_{semana_id}", "").strip()
+        cargo = ss.get(f"nuevo_cargo_{semana_id}", "").strip()
+
+    if not nombre:
+        return avisar("registro", "error", "El nombre del trabajador es obligatorio.")
+    if modo == "Nuevo" and not cargo:
+        return avisar("registro", "error", "Para un trabajador nuevo, el Cargo es obligatorio.")
+
+    add_extra_monto = ss.get(f"add_extra_monto_{semana_id}", 0.0)
+    add_extra_flag = ss.get(f"add_extra_flag_{semana_id}", False)
+    extra_flag = 1 if (es_sabado and float(add_extra_monto or 0) > 0) else int(bool(add_extra_flag) and es_sabado)
+    extra_monto = float(add_extra_monto if extra_flag else 0)
+    try:
+        guardar_registro(
+            semana_id, ss[f"add_fecha_{semana_id}"], trab_id, nombre, cargo,
+            ss.get(f"add_act_{semana_id}", ""), ss[f"add_monto_{semana_id}"], extra_flag, extra_monto,
+        )
+    except Exception as e:
+        return avisar("registro", "error", f"Error guardando registro: {e}")
+    avisar("registro", "success", "Registro guardado/actualizado.")
+    tras_escribir(guardar_registro)
+
+@fragmento("registro")
+def seccion_registro(semana_id, sem_ini, sem_fin, cerrada):
     st.subheader("Registrar día por trabajador")
 
     if cerrada:
@@ -227,327 +476,480 @@ with reg_tab:
         disabled=disabled,
     )
 
-    add_trab = ""
-    add_cargo = ""
-
     if modo == "Existente":
-        with get_conn() as conn:
-            rows = conn.execute(
-                "SELECT nombre, COALESCE(cargo, '') AS cargo FROM trabajadores WHERE activo=1 ORDER BY nombre"
-            ).fetchall()
-        nombres = [r["nombre"] for r in rows]
-        cargos_map = {r["nombre"]: r["cargo"] for r in rows}
-
-        sel_trab = st.selectbox(
+        # Búsqueda indexada (FTS5): solo se traen las coincidencias, no el catálogo entero
+        buscar = st.text_input(
+            "Buscar trabajador", key=f"trab_buscar_{semana_id}", disabled=disabled,
+            placeholder="Nombre o cargo (sin tildes también sirve)",
+        )
+        rows = buscar_trabajadores(buscar, LIMITE_BUSQUEDA)
+        etiquetas = {int(r["id"]): f"{r['nombre']} — {r['cargo']}" if r["cargo"] else r["nombre"] for r in rows}
+
+        sel_id_trab = st.selectbox(
             "Trabajador (autocompletar)",
-            options=["(Seleccione)"] + nombres,
+            options=[0] + list(etiquetas),
             index=0,
-            key=f"trab_existente_{semana_id}",
+            format_func=lambda i: etiquetas.get(i, "(Seleccione)"),
+            key=f"trab_existente_{semana_id}_{buscar}",
             disabled=disabled,
         )
+        row_trab = trabajador(sel_id_trab) if sel_id_trab else None
 
         coln1, coln2 = st.columns(2)
         with coln1:
-            st.text_input("Nombre", value=sel_trab if sel_trab != "(Seleccione)" else "",
-                          disabled=True, key=f"readonly_nombre_{semana_id}")
+            st.text_input("Nombre", value=row_trab["nombre"] if row_trab else "",
+                          disabled=True, key=f"readonly_nombre_{semana_id}_{sel_id_trab}")
         with coln2:
-            st.text_input("Cargo", value=cargos_map.get(sel_trab, "") if sel_trab != "(Seleccione)" else "",
-                          disabled=True, key=f"readonly_cargo_{semana_id}")
-
-        if sel_trab != "(Seleccione)":
-            add_trab = sel_trab
-            add_cargo = cargos_map.get(sel_trab, "")
+            st.text_input("Cargo", value=row_trab["cargo"] if row_trab else "",
+                          disabled=True, key=f"readonly_cargo_{semana_id}_{sel_id_trab}")
 
     else:
         coln1, coln2 = st.columns(2)
         with coln1:
-            add_trab = st.text_input("Nombre (nuevo)", key=f"nuevo_nombre_{semana_id}", disabled=disabled).strip()
+            st.text_input("Nombre (nuevo)", key=f"nuevo_nombre_{semana_id}", disabled=disabled)
         with coln2:
-            add_cargo = st.text_input("Cargo", key=f"nuevo_cargo_{semana_id}", disabled=disabled).strip()
+            st.text_input("Cargo", key=f"nuevo_cargo_{semana_id}", disabled=disabled)
 
     # Monto y actividad
     col3, col4 = st.columns(2)
     with col3:
-        add_monto = st.number_input(
+        st.number_input(
             "Monto del día (S/)", min_value=0.0, step=1.0, value=0.0,
             key=f"add_monto_{semana_id}", disabled=disabled
         )
     with col4:
-        add_act = st.text_input("Actividad (opcional)", key=f"add_act_{semana_id}", disabled=disabled)
+        st.text_input("Actividad (opcional)", key=f"add_act_{semana_id}", disabled=disabled)
 
     # Adicional sábado
     es_sabado = (isinstance(add_fecha, date) and add_fecha.weekday() == 5)
     colx = st.columns([1, 1])
     with colx[0]:
-        add_extra_flag = st.checkbox(
+        st.checkbox(
             "Pago adicional de sábado",
             value=False,
             key=f"add_extra_flag_{semana_id}",
             disabled=(disabled or not es_sabado),
         )
     with colx[1]:
-        add_extra_monto = st.number_input(
+        st.number_input(
             "Monto adicional (solo sábado)",
             min_value=0.0, step=1.0, value=0.0,
             key=f"add_extra_monto_{semana_id}",
             disabled=(disabled or not es_sabado),
         )
 
-    guardar = st.button("💾 Guardar registro", use_container_width=True, disabled=disabled, key=f"btn_guardar_{semana_id}")
+    st.button(
+        "💾 Guardar registro", use_container_width=True, disabled=disabled, key=f"btn_guardar_{semana_id}",
+        on_click=guardar_registro_cb, args=(semana_id, es_sabado),
+    )
 
-    if guardar and not cerrada:
-        if not add_trab:
-            st.error("El nombre del trabajador es obligatorio.")
-        elif modo == "Nuevo" and not add_cargo:
-            st.error("Para un trabajador nuevo, el Cargo es obligatorio.")
-        else:
-            if modo == "Nuevo":
-                with get_conn() as conn:
-                    conn.execute(
-                        "INSERT OR IGNORE INTO trabajadores(nombre, cargo) VALUES (?, ?)",
-                        (add_trab, add_cargo),
-                    )
+@del_sitio
+def guardar_grilla_cb(semana_id, sem_ini, clave):
+    """on_click de 'Guardar grilla': la grilla editada = la original + los cambios del data_editor."""
+    # Las filas de edited_rows son posiciones en la grilla que se mostró: se aplican sobre esa
+    # misma grilla (con su trabajador_id), no sobre una relectura que otra sesión pudo cambiar
+    original = st.session_state[f"grilla_mostrada_{semana_id}"]
+    editada = original.copy()
+    for fila, cambios in st.session_state[clave]["edited_rows"].items():
+        for col, valor in cambios.items():
+            editada.loc[int(fila), col] = valor
+    try:
+        guardados, eliminados = guardar_grilla(semana_id, sem_ini, original, editada)
+    except Exception as e:
+        return avisar("grilla", "error", f"Error guardando grilla: {e}")
+    if not (guardados or eliminados):
+        return avisar("grilla", "info", "No hay cambios en la grilla.")
+    version = f"grilla_v_{semana_id}"
+    st.session_state[version] = st.session_state.get(version, 0) + 1
+    avisar("grilla", "success", f"Grilla guardada: {guardados} registro(s) guardado(s), {eliminados} eliminado(s).")
+    tras_escribir(guardar_grilla)
+
+@fragmento("grilla")
+def seccion_grilla(semana_id, sem_ini, cerrada):
+    st.markdown("### 🗓️ Carga semanal (grilla)")
+    st.caption("Celda vacía = sin registro. El adicional se guarda en el registro del sábado.")
 
-            extra_flag = 1 if (es_sabado and float(add_extra_monto or 0) > 0) else int(bool(add_extra_flag) and es_sabado)
-            extra_monto = float(add_extra_monto if extra_flag else 0)
+    disabled = bool(cerrada)
+    df_grilla = grilla_semana(semana_id)
+    if df_grilla.empty:
+        st.info("Aún no tienes trabajadores en el catálogo.")
+        return
+    clave = f"grilla_{semana_id}_{st.session_state.get(f'grilla_v_{semana_id}', 0)}"
+    st.session_state[f"grilla_mostrada_{semana_id}"] = df_grilla  # ver guardar_grilla_cb
+    st.data_editor(
+        df_grilla,
+        key=clave,
+        hide_index=True,
+        num_rows="fixed",
+        disabled=True if disabled else ["trabajador", "cargo"],
+        column_order=["trabajador", "cargo", *DIAS, COL_ADICIONAL],
+        column_config={
+            "trabajador": st.column_config.TextColumn("Trabajador"),
+            "cargo": st.column_config.TextColumn("Cargo"),
+            **{d: st.column_config.NumberColumn(d, min_value=0.0, step=1.0) for d in DIAS},
+            COL_ADICIONAL: st.column_config.NumberColumn(COL_ADICIONAL, min_value=0.0, step=1.0, help="Solo sábado"),
+        },
+    )
+    st.button(
+        "💾 Guardar grilla", use_container_width=True, disabled=disabled, key=f"btn_grilla_{semana_id}",
+        on_click=guardar_grilla_cb, args=(semana_id, sem_ini, clave),
+    )
 
-            try:
-                with get_conn() as conn:
-                    conn.execute(
-                        """
-                        INSERT INTO entradas(semana_id, fecha, trabajador, actividad, monto, extra_sabado, extra_monto)
-                        VALUES (?,?,?,?,?,?,?)
-                        ON CONFLICT(semana_id, fecha, trabajador) DO UPDATE SET
-                          actividad=excluded.actividad,
-                          monto=excluded.monto,
-                          extra_sabado=excluded.extra_sabado,
-                          extra_monto=excluded.extra_monto
-                        """,
-                        (
-                            int(semana_id),
-                            add_fecha.isoformat(),
-                            add_trab.strip(),
-                            add_act.strip(),
-                            float(add_monto),
-                            extra_flag,
-                            extra_monto,
-                        ),
-                    )
-                st.success("Registro guardado/actualizado.")
-                st.rerun()
-            except Exception as e:
-                st.error(f"Error guardando registro: {e}")
+@del_sitio
+def guardar_trabajador_cb(trabajador_id):
+    ss = st.session_state
+    try:
+        actualizar_trabajador(
+            trabajador_id, ss[f"edit_nombre_{trabajador_id}"], ss[f"edit_cargo_{trabajador_id}"],
+            ss[f"edit_activo_{trabajador_id}"],
+        )
+    except Exception as e:
+        return avisar("editor", "error", f"Error al actualizar: {e}")
+    avisar("editor", "success", "Trabajador actualizado.")
+    tras_escribir(actualizar_trabajador)
+
+@del_sitio
+def desactivar_trabajador_cb(trabajador_id):
+    desactivar_trabajador(trabajador_id)
+    avisar("editor", "warning", "Trabajador desactivado.")
+    tras_escribir(desactivar_trabajador)
+
+@del_sitio
+def eliminar_registros_cb(semana_id, trabajador_id, clave=None):
+    """on_click de los borrados: con `clave` (data_editor), solo las filas marcadas en 'Seleccionar'."""
+    fechas_sel = None
+    if clave is not None:
+        # Posiciones en la tabla que se mostró: se traducen con sus fechas, no con una relectura
+        fechas = st.session_state[f"{clave}_fechas"]
+        marcadas = [int(i) for i, c in st.session_state[clave]["edited_rows"].items() if c.get("Seleccionar")]
+        fechas_sel = [fechas[i] for i in marcadas]  # ISO, como en la DB
+        if not fechas_sel:
+            return avisar("editor", "warning", "No hay filas seleccionadas.")
+    try:
+        eliminar_registros(semana_id, trabajador_id, fechas_sel)
+    except Exception as e:
+        return avisar("editor", "error", f"Error al eliminar: {e}")
+    if fechas_sel is None:
+        avisar("editor", "warning", "Se eliminaron todos los registros de esta hoja para este trabajador.")
+    else:
+        avisar("editor", "success", f"Eliminados {len(fechas_sel)} registro(s).")
+    tras_escribir(eliminar_registros)
 
-    # ----- Editor de trabajador (con BORRADO de registros) -----
-    st.divider()
+@fragmento("editor")
+def seccion_editor(semana_id, archivada):
     st.markdown("### ✏️ Editar trabajador (catálogo)")
-    with get_conn() as conn:
-        cat_rows = conn.execute(
-            "SELECT id, nombre, COALESCE(cargo, '') AS cargo, activo FROM trabajadores ORDER BY nombre"
-        ).fetchall()
-
-    if cat_rows:
-        nombres_cat = [r["nombre"] for r in cat_rows]
-        sel_edit = st.selectbox(
-            "Selecciona trabajador",
-            options=["(Seleccione)"] + nombres_cat,
-            index=0,
-            key=f"edit_trab_sel_{semana_id}"
-        )
+    buscar_edit = st.text_input("Buscar en el catálogo", key=f"edit_trab_buscar_{semana_id}",
+                                placeholder="Nombre o cargo (incluye inactivos)")
+    cat_rows = buscar_trabajadores(buscar_edit, LIMITE_BUSQUEDA, False)
 
-        if sel_edit != "(Seleccione)":
-            tr = next(r for r in cat_rows if r["nombre"] == sel_edit)
-            c1, c2, c3 = st.columns([1.2, 1, 0.8])
-            with c1:
-                nuevo_nombre = st.text_input("Nombre", value=tr["nombre"], key=f"edit_nombre_{tr['id']}")
-            with c2:
-                nuevo_cargo = st.text_input("Cargo", value=tr["cargo"], key=f"edit_cargo_{tr['id']}")
-            with c3:
-                activo_flag = st.checkbox("Activo", value=bool(tr["activo"]), key=f"edit_activo_{tr['id']}")
-
-            e1, e2 = st.columns(2)
-            with e1:
-                if st.button("💾 Guardar cambios", key=f"btn_save_trab_{tr['id']}"):
-                    try:
-                        with get_conn() as conn:
-                            conn.execute(
-                                "UPDATE trabajadores SET nombre=?, cargo=?, activo=? WHERE id=?",
-                                (nuevo_nombre.strip(), nuevo_cargo.strip(), int(activo_flag), int(tr["id"]))
-                            )
-                        st.success("Trabajador actualizado.")
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error al actualizar: {e}")
-            with e2:
-                if st.button("🗑️ Desactivar (no mostrar)", key=f"btn_del_trab_{tr['id']}"):
-                    with get_conn() as conn:
-                        conn.execute("UPDATE trabajadores SET activo=0 WHERE id=?", (int(tr["id"]),))
-                    st.warning("Trabajador desactivado.")
-                    st.rerun()
-
-            # ---- BORRAR REGISTROS DE ESTA HOJA (SEMANA) ----
-            st.markdown("#### 🧹 Registros de esta hoja para este trabajador")
-            with get_conn() as conn:
-                df_regs = pd.read_sql_query(
-                    """
-                    SELECT fecha, actividad, monto, extra_monto
-                    FROM entradas
-                    WHERE semana_id=? AND trabajador=?
-                    ORDER BY date(fecha)
-                    """,
-                    conn,
-                    params=(semana_id, sel_edit),
-                )
+    if not cat_rows:
+        if buscar_edit:
+            st.info("Ningún trabajador coincide con la búsqueda.")
+        else:
+            st.info("Aún no tienes trabajadores en el catálogo.")
+        return
+
+    etiquetas_cat = {int(r["id"]): r["nombre"] if r["activo"] else f"{r['nombre']} (inactivo)" for r in cat_rows}
+    sel_edit = st.selectbox(
+        "Selecciona trabajador",
+        options=[0] + list(etiquetas_cat),
+        index=0,
+        format_func=lambda i: etiquetas_cat.get(i, "(Seleccione)"),
+        key=f"edit_trab_sel_{semana_id}_{buscar_edit}"
+    )
+    if not sel_edit:
+        return
 
-            if df_regs.empty:
-                st.info("Sin registros de esta hoja para este trabajador.")
-            else:
-                # Mantener fecha como datetime.date (NO string)
-                df_regs["fecha"] = pd.to_datetime(df_regs["fecha"]).dt.date
-                df_regs = df_regs.rename(columns={
-                    "fecha": "Fecha",
-                    "actividad": "Actividad",
-                    "monto": "Monto",
-                    "extra_monto": "Monto adicional"
-                })
-                df_regs["Seleccionar"] = False
-
-                edited = st.data_editor(
-                    df_regs,
-                    key=f"ed_regs_{semana_id}_{sel_edit}",
-                    hide_index=True,
-                    num_rows="fixed",
-                    column_config={
-                        "Fecha": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD"),
-                        "Actividad": st.column_config.TextColumn("Actividad"),
-                        "Monto": st.column_config.NumberColumn("Monto", step=1.0, help="Monto del día"),
-                        "Monto adicional": st.column_config.NumberColumn("Monto adicional", step=1.0, help="Solo sábado"),
-                        "Seleccionar": st.column_config.CheckboxColumn("Seleccionar", help="Marca para eliminar"),
-                    }
-                )
+    tr = trabajador(sel_edit)
+    tid = int(tr["id"])
+    c1, c2, c3 = st.columns([1.2, 1, 0.8])
+    with c1:
+        st.text_input("Nombre", value=tr["nombre"], key=f"edit_nombre_{tid}")
+    with c2:
+        st.text_input("Cargo", value=tr["cargo"], key=f"edit_cargo_{tid}")
+    with c3:
+        st.checkbox("Activo", value=bool(tr["activo"]), key=f"edit_activo_{tid}")
+
+    e1, e2 = st.columns(2)
+    with e1:
+        st.button("💾 Guardar cambios", key=f"btn_save_trab_{tid}", on_click=guardar_trabajador_cb, args=(tid,))
+    with e2:
+        st.button("🗑️ Desactivar (no mostrar)", key=f"btn_del_trab_{tid}",
+                  on_click=desactivar_trabajador_cb, args=(tid,))
+
+    # ---- BORRAR REGISTROS DE ESTA HOJA (SEMANA) ----
+    st.markdown("#### 🧹 Registros de esta hoja para este trabajador")
+    df_regs = registros_trabajador(semana_id, tid)
+
+    if df_regs.empty:
+        st.info("Sin registros de esta hoja para este trabajador.")
+        return
+
+    clave = f"ed_regs_{semana_id}_{tid}"
+    st.session_state[f"{clave}_fechas"] = df_regs["fecha"].tolist()  # ver eliminar_registros_cb
+    # Mantener fecha como datetime.date (NO string)
+    df_regs["fecha"] = pd.to_datetime(df_regs["fecha"]).dt.date
+    df_regs = df_regs.rename(columns={
+        "fecha": "Fecha",
+        "actividad": "Actividad",
+        "monto": "Monto",
+        "extra_monto": "Monto adicional"
+    })
+    df_regs["Seleccionar"] = False
+
+    st.data_editor(
+        df_regs,
+        key=clave,
+        hide_index=True,
+        num_rows="fixed",
+        column_config={
+            "Fecha": st.column_config.DateColumn("Fecha", format="YYYY-MM-DD"),
+            "Actividad": st.column_config.TextColumn("Actividad"),
+            "Monto": st.column_config.NumberColumn("Monto", step=1.0, help="Monto del día"),
+            "Monto adicional": st.column_config.NumberColumn("Monto adicional", step=1.0, help="Solo sábado"),
+            "Seleccionar": st.column_config.CheckboxColumn("Seleccionar", help="Marca para eliminar"),
+        }
+    )
 
-                col_del1, col_del2 = st.columns([1, 1])
-                with col_del1:
-                    if st.button("🗑️ Eliminar seleccionados", type="primary", key=f"del_sel_{semana_id}_{sel_edit}"):
-                        # edited["Fecha"] es datetime.date -> ISO para el DELETE
-                        fechas_sel = [f.isoformat() for f, s in zip(edited["Fecha"], edited["Seleccionar"]) if s]
-                        if not fechas_sel:
-                            st.warning("No hay filas seleccionadas.")
-                        else:
-                            try:
-                                with get_conn() as conn:
-                                    for f in fechas_sel:
-                                        conn.execute(
-                                            "DELETE FROM entradas WHERE semana_id=? AND trabajador=? AND fecha=?",
-                                            (int(semana_id), sel_edit, f),
-                                        )
-                                st.success(f"Eliminados {len(fechas_sel)} registro(s).")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"Error al eliminar: {e}")
-                with col_del2:
-                    if st.button("🗑️ Eliminar TODOS los registros de esta hoja", key=f"del_all_{semana_id}_{sel_edit}"):
-                        try:
-                            with get_conn() as conn:
-                                conn.execute(
-                                    "DELETE FROM entradas WHERE semana_id=? AND trabajador=?",
-                                    (int(semana_id), sel_edit),
-                                )
-                            st.warning("Se eliminaron todos los registros de esta hoja para este trabajador.")
-                            st.rerun()
-                        except Exception as e:
-                            st.error(f"Error al eliminar todo: {e}")
-    else:
-        st.info("Aún no tienes trabajadores en el catálogo.")
+    col_del1, col_del2 = st.columns([1, 1])
+    with col_del1:
+        st.button("🗑️ Eliminar seleccionados", type="primary", key=f"del_sel_{semana_id}_{tid}",
+                  on_click=eliminar_registros_cb, args=(semana_id, tid, clave), disabled=archivada)
+    with col_del2:
+        st.button("🗑️ Eliminar TODOS los registros de esta hoja", key=f"del_all_{semana_id}_{tid}",
+                  on_click=eliminar_registros_cb, args=(semana_id, tid), disabled=archivada)
 
-    # ----- Vista semanal -----
-    st.divider()
+@fragmento("vista")
+def seccion_vista(semana_id, sem_ini, sem_fin):
     st.markdown(f"## 📊 Vista semanal (Lun–Sáb) — Hoja {sem_ini} → {sem_fin}")
 
-    with get_conn() as conn:
-        df_det = pd.read_sql_query(
-            """
-            SELECT e.fecha, e.trabajador, e.actividad, e.monto, e.extra_monto,
-                   COALESCE(t.cargo, '') AS cargo
-            FROM entradas e
-            LEFT JOIN trabajadores t ON t.nombre = e.trabajador
-            WHERE e.semana_id=? AND date(e.fecha) BETWEEN date(?) AND date(?)
-            ORDER BY e.trabajador, date(e.fecha)
-            """,
-            conn,
-            params=(semana_id, sem_ini.isoformat(), sem_fin.isoformat()),
-        )
+    df_sem = vista_semanal(semana_id, sem_ini, sem_fin)
 
-    if df_det.empty:
+    if df_sem.empty:
         st.info("Sin registros en esta hoja.")
     else:
-        df_det["fecha"] = pd.to_datetime(df_det["fecha"]).dt.date
-        df_det["dow"] = pd.to_datetime(df_det["fecha"]).dt.weekday
-
-        df_pivot = df_det.pivot_table(index=["trabajador"], columns="dow", values="monto", aggfunc="sum").fillna(0)
-        df_pivot = df_pivot.rename(columns={i: label_dow(i) for i in range(6)})
+        st.dataframe(df_sem, use_container_width=True)
 
-        extras = (
-            df_det[df_det["dow"] == 5]
-            .groupby("trabajador", as_index=False)
-            .agg(monto_adicional=("extra_monto", "sum"))
-        )
-        dias = df_det.groupby("trabajador")["fecha"].nunique().rename("dias").reset_index()
-        cargos = df_det.groupby("trabajador")["cargo"].agg(lambda x: next((v for v in x if v), "")).rename("cargo").reset_index()
-
-        df_sem = (
-            df_pivot.reset_index()
-            .merge(extras, on="trabajador", how="left")
-            .merge(dias, on="trabajador", how="left")
-            .merge(cargos, on="trabajador", how="left")
-        )
-        df_sem["monto_adicional"] = df_sem["monto_adicional"].fillna(0.0)
-        df_sem["dias"] = df_sem["dias"].fillna(0).astype(int)
+with reg_tab:
+    st.markdown(f"## 📋 Registros (Lunes a Sábado) — Hoja {sem_ini} → {sem_fin}")
+    seccion_registro(semana_id, sem_ini, sem_fin, cerrada)
 
-        cols_dias = [c for c in df_sem.columns if c in [label_dow(i) for i in range(6)]]
-        df_sem["Total semana"] = df_sem[cols_dias].sum(axis=1) + df_sem["monto_adicional"]
+    # ----- Carga semanal en grilla (trabajadores × días) -----
+    st.divider()
+    seccion_grilla(semana_id, sem_ini, cerrada)
 
-        columnas = ["trabajador", "cargo"] + cols_dias + ["dias", "monto_adicional", "Total semana"]
-        df_sem = df_sem[columnas].rename(columns={"monto_adicional": "Monto adicional"})
+    # ----- Editor de trabajador (con BORRADO de registros) -----
+    st.divider()
+    seccion_editor(semana_id, archivada)
 
-        st.dataframe(df_sem, use_container_width=True)
+    # ----- Vista semanal -----
+    st.divider()
+    seccion_vista(semana_id, sem_ini, sem_fin)
 
 # -------------------- TAB 2 – Montos y Total (pago sábado) --------------------
-with montos_tab:
+@fragmento("montos")
+def seccion_montos(semana_id, sem_ini, sem_fin):
     st.markdown(f"## 💰 Montos y Total (pago sábado) — Hoja {sem_ini} → {sem_fin}")
 
-    with get_conn() as conn:
-        df = pd.read_sql_query(
-            """
-            SELECT e.trabajador,
-                   COALESCE(t.cargo, '') AS cargo,
-                   COUNT(DISTINCT date(e.fecha)) AS dias,
-                   SUM(CASE WHEN strftime('%w', e.fecha) IN ('1','2','3','4','5','6') THEN e.monto ELSE 0 END) AS monto_semana,
-                   SUM(CASE WHEN strftime('%w', e.fecha) = '6' THEN e.extra_monto ELSE 0 END) AS monto_adicional
-            FROM entradas e
-            LEFT JOIN trabajadores t ON t.nombre = e.trabajador
-            WHERE e.semana_id=?
-            GROUP BY e.trabajador, t.cargo
-            ORDER BY e.trabajador
-            """,
-            conn,
-            params=(semana_id,),
-        )
+    df = montos_semana(semana_id)
 
     if df.empty:
         st.info("Sin registros en esta hoja.")
-    else:
-        df["Monto adicional"] = df["monto_adicional"].fillna(0)
-        df["Total a pagar"] = df["monto_semana"].fillna(0) + df["Monto adicional"]
-        df = df[["trabajador", "cargo", "dias", "Monto adicional", "Total a pagar"]]
-        df["dias"] = df["dias"].fillna(0).astype(int)
+        return
+
+    df["Monto adicional"] = df["monto_adicional"].fillna(0)
+    df["Total a pagar"] = df["monto_semana"].fillna(0) + df["Monto adicional"]
+    df = df[["trabajador", "cargo", "dias", "Monto adicional", "Total a pagar"]]
+    df["dias"] = df["dias"].fillna(0).astype(int)
+
+    st.dataframe(df, use_container_width=True)
+    st.metric("💰 Efectivo necesario el sábado", float(df["Total a pagar"].sum()))
+
+    st.download_button(
+        "⬇️ Exportar planilla de pagos (CSV)",
+        data=df.to_csv(index=False).encode("utf-8"),
+        file_name=f"pagos_semana_{sem_ini}_a_{sem_fin}.csv",
+        mime="text/csv",
+    )
+
+with montos_tab:
+    seccion_montos(semana_id, sem_ini, sem_fin)
+
+# -------------------- TAB 3 – Planilla por rango (varias semanas) --------------------
+@fragmento("planilla")
+def seccion_planilla(sem_ini, sem_fin):
+    st.markdown("## 📑 Planilla por rango (trabajador × semana)")
+    st.caption("Incluye las hojas cuyo lunes cae dentro del rango, con subtotal por trabajador y total general.")
+
+    trimestre_ini = date(sem_ini.year, 3 * ((sem_ini.month - 1) // 3) + 1, 1)
+    cr1, cr2, cr3 = st.columns([1, 1, 1])
+    with cr1:
+        planilla_desde = st.date_input("Desde", value=trimestre_ini, key="planilla_desde")
+    with cr2:
+        planilla_hasta = st.date_input("Hasta", value=sem_fin, key="planilla_hasta")
+    with cr3:
+        planilla_formato = st.radio("Formato", ["csv", "xlsx"], horizontal=True, key="planilla_formato")
+
+    if st.button("⚙️ Generar planilla", use_container_width=True, key="btn_planilla"):
+        if planilla_desde > planilla_hasta:
+            st.warning("El rango está invertido.")
+        else:
+            try:
+                ruta, filas = exportar_planilla(planilla_desde, planilla_hasta, planilla_formato)
+                st.session_state["planilla_archivo"] = (str(ruta), filas)
+            except Exception as e:
+                st.error(f"Error generando planilla: {e}")
+
+    if "planilla_archivo" in st.session_state:
+        ruta, filas = st.session_state["planilla_archivo"]
+        if Path(ruta).exists():
+            st.caption(f"{filas} fila(s) en **{Path(ruta).name}**")
+            # Se entrega el archivo en disco, no un bytes armado en memoria
+            with open(ruta, "rb") as fh:
+                st.download_button(
+                    "⬇️ Descargar planilla",
+                    data=fh,
+                    file_name=Path(ruta).name,
+                    mime="text/csv" if ruta.endswith(".csv")
+                    else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    key="dl_planilla",
+                )
 
+with rango_tab:
+    seccion_planilla(sem_ini, sem_fin)
+
+# -------------------- TAB 4 – Importar histórico (CSV/Excel) --------------------
+@fragmento("importar")
+def seccion_importar():
+    st.markdown("## 📥 Importar registros históricos")
+    st.caption(
+        "Registros: una fila por día (fecha, trabajador, cargo, actividad, monto, extra_monto). "
+        "Grilla: una fila por trabajador con Lunes..Sábado y Adicional sábado (más semana_inicio o el lunes de abajo). "
+        "Las hojas y trabajadores que falten se crean; las hojas cerradas o archivadas no se tocan."
+    )
+    subido = st.file_uploader("Archivo", type=["csv", "xlsx"], key="importar_archivo")
+    usar_semana = st.checkbox("La grilla no trae semana_inicio: usar este lunes", key="importar_usar_semana")
+    semana = st.date_input("Lunes de la hoja", value=monday_of_week(date.today()), key="importar_semana",
+                           disabled=not usar_semana)
+    if st.button("📥 Importar", use_container_width=True, key="btn_importar", disabled=subido is None):
+        if usar_semana and semana.weekday() != 0:
+            st.warning("La fecha elegida no es lunes.")
+            return
+        try:
+            res = importar(leer(subido, subido.name), semana if usar_semana else None)
+        except Exception as e:
+            st.error(f"Error importando: {e}")
+            return
+        st.session_state["importar_resultado"] = (subido.name, res)
+        st.rerun()  # hojas nuevas: cambia el selector (cuerpo del script)
+
+    if "importar_resultado" in st.session_state:
+        nombre, res = st.session_state["importar_resultado"]
+        st.success(
+            f"**{nombre}**: {res['importadas']} de {res['filas']} fila(s) importada(s) en {res['segundos']:.1f} s · "
+            f"{res['hojas_creadas']} hoja(s) y {res['trabajadores_creados']} trabajador(es) nuevo(s)."
+        )
+        errores = res["errores"]
+        if not errores.empty:
+            st.warning(f"{len(errores)} fila(s) rechazada(s).")
+            st.dataframe(errores["error"].value_counts().rename("filas"), use_container_width=True)
+            st.download_button(
+                "⬇️ Descargar reporte de errores (CSV)",
+                data=errores.to_csv(index=False).encode("utf-8"),
+                file_name=f"{Path(nombre).stem}_errores.csv",
+                mime="text/csv",
+                key="dl_importar_errores",
+            )
+
+with importar_tab:
+    seccion_importar()
+
+# -------------------- TAB – Historial por trabajador --------------------
+@fragmento("historial")
+def seccion_historial():
+    st.markdown("## 📈 Historial por trabajador")
+    c1, c2 = st.columns([2, 3])
+    with c1:
+        buscar = st.text_input("Buscar trabajador", key="hist_buscar", placeholder="Nombre o cargo…")
+    rows = buscar_trabajadores(buscar, LIMITE_BUSQUEDA, False)
+    if not rows:
+        st.info("Sin coincidencias.")
+        return
+    nombres = {r["id"]: r["nombre"] for r in rows}
+    with c2:
+        tid = st.selectbox("Trabajador", list(nombres), format_func=nombres.get, key="hist_trabajador")
+
+    c1, c2, c3 = st.columns([2, 2, 2])
+    with c1:
+        h_desde = st.date_input("Desde", value=date.today().replace(day=1) - timedelta(days=365), key="hist_desde")
+    with c2:
+        h_hasta = st.date_input("Hasta", value=date.today(), key="hist_hasta")
+    with c3:
+        periodo = st.radio("Agrupar por", ["mes", "semana"], format_func=str.capitalize, horizontal=True, key="hist_periodo")
+    if h_desde > h_hasta:
+        st.warning("El rango está invertido.")
+        return
+
+    t0 = time.perf_counter()
+    df = historial.serie(tid, h_desde, h_hasta, periodo)
+    ms = (time.perf_counter() - t0) * 1000
+    if df.empty:
+        st.info("Sin registros de este trabajador en el rango.")
+    else:
+        m1, m2, m3 = st.columns(3)
+        m1.metric("Total", f"{df['total'].sum():,.2f}")
+        m2.metric("Días trabajados", int(df["dias"].sum()))
+        m3.metric("Sábados con adicional", int(df["sabados_adicional"].sum()))
+        st.line_chart(df[["total"]])
+        st.bar_chart(df[["dias"]])
         st.dataframe(df, use_container_width=True)
-        st.metric("💰 Efectivo necesario el sábado", float(df["Total a pagar"].sum()))
 
-        st.download_button(
-            "⬇️ Exportar planilla de pagos (CSV)",
-            data=df.to_csv(index=False).encode("utf-8"),
-            file_name=f"pagos_semana_{sem_ini}_a_{sem_fin}.csv",
-            mime="text/csv",
+    with st.expander("🏆 Ranking del rango (todos los trabajadores)"):
+        t1 = time.perf_counter()
+        ranking = historial.resumen(h_desde, h_hasta).sort_values("total", ascending=False)
+        ms_ranking = (time.perf_counter() - t1) * 1000
+        cat = {r["id"]: r["nombre"] for r in catalogo_trabajadores()}
+        ranking.insert(0, "trabajador", ranking.index.map(cat))
+        st.dataframe(ranking.reset_index(drop=True), use_container_width=True, hide_index=True)
+        st.caption(f"{len(ranking)} trabajador(es) · {ms_ranking:.0f} ms")
+    st.caption(f"Serie en {ms:.1f} ms sobre {historial.filas():,} fila(s) de la caché columnar.")
+
+with historial_tab:
+    seccion_historial()
+
+# -------------------- Precarga de las hojas vecinas (◀ Ant. / Sig. ▶) --------------------
+# Con la hoja ya mostrada: la anterior y la siguiente se calculan en segundo plano (precarga.py).
+# Se pide de nuevo solo si cambió la hoja, el sitio o los datos; un pedido nuevo cancela el anterior.
+pedido = (str(ruta_actual()), semana_id, generacion())
+if st.session_state.get("precarga_pedida") != pedido:
+    precarga.pedir(st.session_state.setdefault("precarga_sesion", uuid4().hex), sem_ini)
+    st.session_state["precarga_pedida"] = pedido
+
+# -------------------- Depuración: perfil SQL del rerun (opt-in) --------------------
+st.sidebar.divider()
+st.sidebar.checkbox("🐞 Perfil SQL (depuración)", key="perfil_sql", help="Mide cada consulta de cada rerun de esta sesión")
+if perfil.activo():
+    res = perfil.volcar(ruta_actual().parent / "perfil_sql.jsonl", {"hoja_id": int(semana_id)})
+    with st.sidebar.expander("🐞 Perfil del último rerun", expanded=True):
+        st.caption(
+            f"Rerun: **{res['rerun_ms']:.0f} ms** · DB: **{res['db_ms']:.1f} ms** "
+            f"en {res['consultas']} consulta(s)"
+        )
+        if res["mas_lentas"]:
+            st.dataframe(pd.DataFrame(res["mas_lentas"]), hide_index=True, use_container_width=True)
+        cs = CACHE.stats()
+        st.caption(
+            f"Caché: {cs['aciertos']} aciertos / {cs['fallos']} fallos ({cs['tasa_aciertos']:.0%}) · "
+            f"{cs['entradas']} resultado(s) en {cs['sitios']} sitio(s), hasta {cs['maximo']} por sitio"
+        )
+        ps = precarga.stats()
+        st.caption(
+            f"Precarga: {ps['hojas']} hoja(s) vecina(s) en {ps['ms_por_hoja']:.0f} ms c/u · "
+            f"{ps['usadas']}/{ps['precargadas']} resultados usados ({ps['tasa_aciertos']:.0%}) · "
+            f"{ps['canceladas']} cancelada(s)"
+        )
+        es = escritor.stats()
+        st.caption(
+            f"Escritor (todo el proceso; no entra en el perfil): {es['escrituras']} escritura(s) en "
+            f"{es['lotes']} transacción(es), {es['por_lote']:.1f} por lote · {es['reintentos']} reintento(s)"
         )
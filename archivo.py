@@ -0,0 +1,241 @@
+"""
+archivo.py — Archivo en frío: las hojas cerradas antiguas salen de la DB viva a una DB por año
+Las hojas cerradas con fin anterior a hace `meses` meses se copian a data/archivo/registro_<año>.db
+(semanas, entradas, totales e instantánea) y se borran de la viva, que luego se compacta (VACUUM).
+Las conexiones del pool adjuntan esos archivos (ATTACH) y datos.py/reportes.py leen a través de
+las vistas temporales de db.VISTAS_LECTURA: las hojas archivadas siguen en el selector y en los
+reportes, como solo lectura.
+
+    python archivo.py --meses 12             # archiva y compacta
+    python archivo.py --meses 12 --simular   # solo cuenta lo que se archivaría
+"""
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import date
+from pathlib import Path
+
+import datos
+import db
+from escritor import escritura
+
+MESES_VIVOS = 12  # las hojas cerradas más recientes que esto se quedan en la DB viva
+
+# Mismas columnas que la DB viva (v7), sin triggers: lo archivado no se edita.
+# dow se guarda como columna normal (en la viva es generada).
+ESQUEMA_ARCHIVO = """
+CREATE TABLE IF NOT EXISTS semanas (
+    id             INTEGER PRIMARY KEY,  -- mismo id que tenía en la DB viva (AUTOINCREMENT: no se reusa)
+    semana_inicio  TEXT NOT NULL,
+    semana_fin     TEXT NOT NULL,
+    encargado      TEXT NOT NULL,
+    cerrada        INTEGER NOT NULL DEFAULT 1,
+    archivada      TEXT NOT NULL DEFAULT (datetime('now')),
+    UNIQUE (semana_inicio, semana_fin)
+);
+CREATE INDEX IF NOT EXISTS idx_semanas_hojas
+    ON semanas(semana_inicio, semana_fin, encargado, cerrada);
+
+CREATE TABLE IF NOT EXISTS entradas (
+    id            INTEGER PRIMARY KEY,
+    semana_id     INTEGER NOT NULL REFERENCES semanas(id) ON DELETE CASCADE,
+    fecha         TEXT NOT NULL,
+    trabajador_id INTEGER NOT NULL,      -- trabajadores(id) de la DB viva (el catálogo no se archiva)
+    trabajador    TEXT NOT NULL,
+    actividad     TEXT,
+    monto         REAL NOT NULL DEFAULT 0,
+    extra_sabado  INTEGER NOT NULL DEFAULT 0,
+    extra_monto   REAL NOT NULL DEFAULT 0,
+    dow           INTEGER NOT NULL,
+    UNIQUE (semana_id, trabajador_id, fecha)
+);
+CREATE INDEX IF NOT EXISTS idx_entradas_semana_trabid
+    ON entradas(semana_id, trabajador_id, fecha, dow, monto, extra_monto);
+
+CREATE TABLE IF NOT EXISTS totales_semana (
+    semana_id        INTEGER NOT NULL REFERENCES semanas(id) ON DELETE CASCADE,
+    trabajador_id    INTEGER NOT NULL,
+    dias             INTEGER NOT NULL DEFAULT 0,
+    monto_semana     REAL NOT NULL DEFAULT 0,
+    monto_adicional  REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (semana_id, trabajador_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS instantaneas (
+    semana_id  INTEGER PRIMARY KEY REFERENCES semanas(id) ON DELETE CASCADE,
+    creada     TEXT NOT NULL,
+    vista      BLOB NOT NULL,
+    montos     BLOB NOT NULL
+);
+"""
+
+COLUMNAS_ENTRADAS = "id, semana_id, fecha, trabajador_id, trabajador, actividad, monto, extra_sabado, extra_monto, dow"
+
+
+def crear_archivo(anio: int) -> Path:
+    """Crea (si falta) el archivo del año con su schema; devuelve su ruta."""
+    ruta = db.ruta_archivo(anio)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(ruta)
+    try:
+        conn.executescript(ESQUEMA_ARCHIVO)
+    finally:
+        conn.close()
+    return ruta
+
+
+def _restar_meses(d: date, meses: int) -> date:
+    anio, mes = divmod(d.year * 12 + d.month - 1 - meses, 12)
+    return date(anio, mes + 1, min(d.day, 28))
+
+
+def candidatas(meses: int = MESES_VIVOS, hoy: date | None = None) -> dict[int, list[int]]:
+    """Ids de las hojas cerradas de la DB viva que terminan antes del corte, por año de inicio."""
+    corte = _restar_meses(hoy or date.today(), meses)
+    with db.get_conn() as conn:
+        filas = conn.execute(
+            "SELECT id, semana_inicio FROM main.semanas WHERE cerrada=1 AND semana_fin < ? ORDER BY semana_inicio",
+            (corte.isoformat(),),
+        ).fetchall()
+    por_anio: dict[int, list[int]] = {}
+    for r in filas:
+        por_anio.setdefault(int(r["semana_inicio"][:4]), []).append(int(r["id"]))
+    return por_anio
+
+
+@escritura(tablas=("semanas",))
+def _copiar(conn, esquema: str, ids: list[int]) -> int:
+    """Copia las hojas (aún cerradas) al archivo `esquema`, reemplazando copias anteriores."""
+    ids = [r[0] for r in conn.execute(
+        "SELECT id FROM main.semanas WHERE id IN (SELECT value FROM json_each(?)) AND cerrada=1",
+        (json.dumps(ids),),
+    )]
+    # Toda hoja archivada se lee de su instantánea: se congelan las que cerraron antes de la v7
+    for sid in ids:
+        if conn.execute("SELECT 1 FROM main.instantaneas WHERE semana_id=?", (sid,)).fetchone() is None:
+            datos._congelar(conn, sid)
+    lista = (json.dumps(ids),)
+    en_lista = "IN (SELECT value FROM json_each(?))"
+    conn.execute(f"DELETE FROM {esquema}.semanas WHERE id {en_lista}", lista)  # copias viejas, en cascada
+    conn.execute(
+        f"INSERT INTO {esquema}.semanas(id, semana_inicio, semana_fin, encargado, cerrada) "
+        f"SELECT id, semana_inicio, semana_fin, encargado, cerrada FROM main.semanas WHERE id {en_lista}",
+        lista,
+    )
+    conn.execute(
+        f"INSERT INTO {esquema}.entradas({COLUMNAS_ENTRADAS}) "
+        f"SELECT {COLUMNAS_ENTRADAS} FROM main.entradas WHERE semana_id {en_lista}",
+        lista,
+    )
+    conn.execute(
+        f"INSERT INTO {esquema}.totales_semana SELECT * FROM main.totales_semana WHERE semana_id {en_lista}",
+        lista,
+    )
+    conn.execute(
+        f"INSERT INTO {esquema}.instantaneas(semana_id, creada, vista, montos) "
+        f"SELECT semana_id, creada, vista, montos FROM main.instantaneas WHERE semana_id {en_lista}",
+        lista,
+    )
+    return len(ids)
+
+
+@escritura(tablas=("semanas",))
+def _quitar(conn, esquema: str, ids: list[int]) -> int:
+    """
+    Borra de la DB viva las hojas cuya copia en `esquema` coincide (misma instantánea);
+    las que siguen vivas (p. ej. reabiertas entre la copia y el borrado) pierden su copia.
+    Archivar no es borrar: con el diario en silencio, los sitios que sincronizan no lo ven.
+    """
+    conn.execute("UPDATE sync_local SET valor='1' WHERE clave='silencio'")
+    movidas = conn.execute(
+        f"""
+        DELETE FROM main.semanas
+        WHERE id IN (SELECT value FROM json_each(?)) AND cerrada = 1
+          AND EXISTS (SELECT 1 FROM {esquema}.instantaneas a JOIN main.instantaneas m USING (semana_id)
+                      WHERE a.semana_id = semanas.id AND a.vista = m.vista AND a.montos = m.montos)
+        """,
+        (json.dumps(ids),),
+    ).rowcount
+    conn.execute("UPDATE sync_local SET valor='0' WHERE clave='silencio'")
+    conn.execute(f"DELETE FROM {esquema}.semanas WHERE id IN (SELECT id FROM main.semanas)")
+    return movidas
+
+
+def _bytes(ruta: Path) -> int:
+    return sum(p.stat().st_size for p in (ruta, Path(f"{ruta}-wal")) if p.exists())
+
+
+def compactar() -> tuple[int, int]:
+    """VACUUM de la DB viva y checkpoint del WAL; devuelve (bytes antes, bytes después)."""
+    ruta = db.ruta_actual()
+    antes = _bytes(ruta)
+    with db.get_conn() as conn:
+        conn.execute("VACUUM main")
+        conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)")
+    return antes, _bytes(ruta)
+
+
+def archivar(meses: int = MESES_VIVOS, hoy: date | None = None, compactar_db: bool = True) -> dict:
+    """
+    Mueve a su archivo anual las hojas cerradas que terminan antes de hace `meses` meses y
+    compacta la DB viva. Devuelve {'hojas', 'por_anio', 'sin_adjuntar', 'bytes_antes', 'bytes_despues'}.
+    Repetirlo es seguro: lo copiado y no borrado (corte a mitad) se completa en la próxima pasada.
+    """
+    por_anio = candidatas(meses, hoy)
+    for anio in por_anio:
+        if not db.ruta_archivo(anio).exists():
+            crear_archivo(anio)
+    db.refrescar_archivos()
+    with db.get_conn() as conn:
+        adjuntos = dict(conn.archivos)
+
+    res = {"hojas": 0, "por_anio": {}, "sin_adjuntar": [], "bytes_antes": 0, "bytes_despues": 0}
+    for anio, ids in por_anio.items():
+        esquema = f"archivo_{anio:04d}"
+        if esquema not in adjuntos:
+            # Más de ARCHIVOS_MAX años archivados: los más antiguos no se pueden adjuntar
+            res["sin_adjuntar"].append(anio)
+            continue
+        # Dos transacciones (copia, luego borrado): un COMMIT sobre dos archivos no es atómico
+        # en WAL; si se corta entre medio, la hoja queda en ambos y no se pierde nada.
+        _copiar(esquema, ids)
+        movidas = _quitar(esquema, ids)
+        res["por_anio"][anio] = movidas
+        res["hojas"] += movidas
+    if compactar_db and res["hojas"]:
+        res["bytes_antes"], res["bytes_despues"] = compactar()
+    return res
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--meses", type=int, default=MESES_VIVOS, help="antigüedad mínima (fin de hoja) para archivar")
+    p.add_argument("--db", type=Path, default=db.DB_PATH, help="DB viva (por defecto %(default)s)")
+    p.add_argument("--simular", action="store_true", help="solo muestra cuántas hojas se archivarían por año")
+    p.add_argument("--sin-compactar", action="store_true", help="no hace VACUUM al terminar")
+    args = p.parse_args(argv)
+
+    db.DB_PATH = args.db
+    db.init_db()
+    if args.simular:
+        por_anio = candidatas(args.meses)
+        for anio, ids in por_anio.items():
+            print(f"{anio}: {len(ids)} hoja(s) → {db.ruta_archivo(anio)}")
+        print(f"total: {sum(len(v) for v in por_anio.values())} hoja(s)")
+        return 0
+
+    res = archivar(args.meses, compactar_db=not args.sin_compactar)
+    for anio, n in res["por_anio"].items():
+        print(f"{anio}: {n} hoja(s) → {db.ruta_archivo(anio)}")
+    print(f"total: {res['hojas']} hoja(s) archivada(s)")
+    if res["bytes_antes"]:
+        print(f"DB viva: {res['bytes_antes'] / 2**20:.1f} MiB → {res['bytes_despues'] / 2**20:.1f} MiB")
+    if res["sin_adjuntar"]:
+        print(f"⚠️ sin archivar (más de {db.ARCHIVOS_MAX} años archivados): {res['sin_adjuntar']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
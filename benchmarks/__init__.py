@@ -0,0 +1,3 @@
+"""
+benchmarks — Datos sintéticos y medición de tiempos de las consultas y del rerun de app.py
+"""
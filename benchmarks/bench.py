@@ -0,0 +1,257 @@
+"""
+bench.py — Tiempos de cada consulta/render de app.py sobre datos sintéticos, con línea base en JSON
+
+    python -m benchmarks.bench --escalas chica,mediana --guardar benchmarks/linea_base.json
+    python -m benchmarks.bench --escalas chica,mediana --comparar benchmarks/linea_base.json
+
+Con --comparar, termina con código 1 si algún caso supera la línea base por más de --tolerancia.
+"""
+import argparse
+import json
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import archivo
+import cache
+import datos
+import db
+import historial
+import precarga
+import reportes
+from benchmarks import sinteticos
+
+APP = Path(__file__).resolve().parent.parent / "app.py"
+CLI = APP.parent / "cli.py"
+MIN_DIFERENCIA = 0.002  # s; por debajo de esto una "regresión" es ruido
+MESES_ARCHIVO = 3  # antigüedad de archivo en el bench: la hoja de mitad del historial queda archivada
+
+
+def _medir(fn, repeticiones: int, frio: bool = True) -> float:
+    """Mediana en segundos; `frio` vacía la caché de lecturas antes de cada corrida."""
+    tiempos = []
+    for _ in range(repeticiones):
+        if frio:
+            cache.CACHE.limpiar()
+        t0 = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - t0)
+    return statistics.median(tiempos)
+
+
+def _rerun_app(hoja_id: int, escritura: tuple, repeticiones: int) -> dict:
+    """
+    Rerun completo del script con el harness AppTest de Streamlit: frío, con caché, y justo
+    después de guardar un registro (semana_id, fecha, trabajador_id de `escritura`).
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP), default_timeout=120)
+    at.session_state["hoja_id"] = hoja_id
+    cache.CACHE.limpiar()
+    t0 = time.perf_counter()
+    at.run()
+    frio = time.perf_counter() - t0
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    tiempos = []
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        at.run()
+        tiempos.append(time.perf_counter() - t0)
+    tras_registro = []
+    for i in range(repeticiones):
+        semana_id, fecha, trabajador_id = escritura
+        datos.guardar_registro(semana_id, fecha, trabajador_id, "", "", "bench", 10.0 + i, 0, 0.0)
+        t0 = time.perf_counter()
+        at.run()
+        tras_registro.append(time.perf_counter() - t0)
+    return {
+        "rerun_app_frio": frio,
+        "rerun_app_caliente": statistics.median(tiempos),
+        "rerun_app_tras_registro": statistics.median(tras_registro),
+    }
+
+
+def _secciones_app(hoja_id: int, repeticiones: int) -> dict:
+    """
+    Duración de cada fragmento de app.py en reruns con caché (perfil SQL activo): es lo que
+    re-ejecuta una interacción dentro de ese fragmento, en vez del script entero.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(APP), default_timeout=120)
+    at.session_state["hoja_id"] = hoja_id
+    at.session_state["perfil_sql"] = True
+    at.run()
+    secciones: dict[str, list] = {}
+    for _ in range(repeticiones):
+        at.run()
+        linea = (db.DB_PATH.parent / "perfil_sql.jsonl").read_text(encoding="utf-8").splitlines()[-1]
+        for nombre, ms in json.loads(linea)["secciones_ms"].items():
+            secciones.setdefault(f"fragmento_{nombre}", []).append(ms / 1000)
+    return {caso: statistics.median(t) for caso, t in secciones.items()}
+
+
+def _cli(semana: date, repeticiones: int) -> dict:
+    """Arranque en frío de cli.py (proceso nuevo: intérprete + imports + consulta)."""
+    orden = [sys.executable, str(CLI), "--db", str(db.DB_PATH), "totales", semana.isoformat()]
+    return {"cli_totales": _medir(lambda: subprocess.run(orden, stdout=subprocess.DEVNULL, check=True), repeticiones)}
+
+
+def _navegacion(ini: date, repeticiones: int) -> dict:
+    """Lecturas de la hoja anterior al pulsar ◀ Ant.: en frío y después de la precarga de precarga.py."""
+    def vecina():
+        h = datos.hoja(datos.hoja_vecina(ini, -1))
+        for lectura in precarga.LECTURAS:
+            lectura(h)
+
+    def precargada():
+        tiempos = []
+        for _ in range(repeticiones):
+            cache.CACHE.limpiar()
+            precarga.pedir("bench", ini)
+            precarga.esperar("bench")
+            t0 = time.perf_counter()
+            vecina()
+            tiempos.append(time.perf_counter() - t0)
+        return statistics.median(tiempos)
+
+    return {"navegar_vecina": _medir(vecina, repeticiones), "navegar_vecina_precargada": precargada()}
+
+
+def _historial(trabajador_id: int, desde: date, hasta: date, repeticiones: int) -> dict:
+    """Caché columnar de historial.py: reconstrucción desde entradas y las agregaciones sobre ella."""
+    hist = historial.cache_actual()
+
+    def reconstruir():
+        with db.get_conn() as conn:
+            hist._reconstruir(conn)
+
+    hist.columnas()  # crea la caché en disco: las agregaciones miden solo el cálculo
+    return {
+        "historial_reconstruir": _medir(reconstruir, repeticiones),
+        "historial_serie": _medir(lambda: historial.serie(trabajador_id), repeticiones),
+        "historial_serie_semana": _medir(lambda: historial.serie(trabajador_id, desde, hasta, "semana"), repeticiones),
+        "historial_resumen": _medir(historial.resumen, repeticiones),
+        "historial_resumen_anio": _medir(lambda: historial.resumen(desde, hasta), repeticiones),
+    }
+
+
+def medir_escala(nombre: str, carpeta: Path, repeticiones: int) -> dict:
+    semanas, trabajadores, entradas = sinteticos.ESCALAS[nombre]
+    resumen = sinteticos.generar(carpeta / f"bench_{nombre}.db", semanas, trabajadores, entradas)
+
+    with db.get_conn() as conn:
+        # Hoja con datos a mitad del historial
+        hoja = conn.execute(
+            "SELECT id, semana_inicio, semana_fin FROM semanas ORDER BY semana_inicio LIMIT 1 OFFSET ?",
+            (resumen["semanas"] // 2,),
+        ).fetchone()
+        tid = conn.execute("SELECT trabajador_id FROM entradas WHERE semana_id=? LIMIT 1", (hoja["id"],)).fetchone()[0]
+        # Las hojas viejas del sintético están cerradas: las escrituras van a la última abierta
+        abierta = conn.execute(
+            "SELECT id, semana_inicio FROM semanas WHERE cerrada=0 ORDER BY semana_inicio DESC LIMIT 1"
+        ).fetchone()
+    sid, ini, fin = hoja["id"], date.fromisoformat(hoja["semana_inicio"]), date.fromisoformat(hoja["semana_fin"])
+    anio_ini, anio_fin = ini - timedelta(days=364), ini
+
+    escritura = (abierta["id"], date.fromisoformat(abierta["semana_inicio"]), tid)
+    casos = {
+        "ensure_semana": lambda: datos.ensure_semana(ini, fin),
+        "list_hojas": datos.list_hojas,
+        "hoja": lambda: datos.hoja(sid),
+        "hoja_vecina": lambda: (datos.hoja_vecina(ini, -1), datos.hoja_vecina(ini, +1)),
+        "hojas_del_anio": lambda: datos.hojas_del_anio(ini.year),
+        "contar_registros": lambda: datos.contar_registros(sid),
+        "trabajadores_activos": datos.trabajadores_activos,
+        "catalogo_trabajadores": datos.catalogo_trabajadores,
+        "buscar_trabajadores": lambda: (datos.buscar_trabajadores("a"), datos.buscar_trabajadores("jos mu")),
+        "registros_trabajador": lambda: datos.registros_trabajador(sid, tid),
+        "vista_semanal": lambda: datos.vista_semanal(sid, ini, fin),
+        "grilla_semana": lambda: datos.grilla_semana(sid),
+        "montos_semana": lambda: datos.montos_semana(sid),
+        "vista_semanal_abierta": lambda: datos.vista_semanal(*escritura[:2], escritura[1] + timedelta(days=5)),
+        "montos_semana_abierta": lambda: datos.montos_semana(escritura[0]),
+        "csv_hoja": lambda: datos.montos_semana(sid).to_csv(index=False).encode("utf-8"),
+        "csv_planilla_anio": lambda: reportes.exportar_csv(anio_ini, anio_fin, carpeta / "planilla.csv"),
+    }
+    tiempos = {caso: _medir(fn, repeticiones) for caso, fn in casos.items()}
+    tiempos["vista_semanal_cache"] = _medir(casos["vista_semanal"], repeticiones, frio=False)
+    tiempos.update(_historial(tid, anio_ini, anio_fin, repeticiones))
+    tiempos.update(_cli(ini, repeticiones))
+    tiempos.update(_navegacion(ini, repeticiones))
+    tiempos.update(_rerun_app(sid, escritura, repeticiones))
+    tiempos.update(_secciones_app(sid, repeticiones))
+
+    # Al final porque cambia la DB: archivo en frío y las mismas lecturas, ahora vía ATTACH
+    t0 = time.perf_counter()
+    resumen["archivadas"] = archivo.archivar(MESES_ARCHIVO)["hojas"]
+    tiempos["archivar"] = time.perf_counter() - t0
+    casos_archivo = {
+        "hoja_archivada": "hoja",
+        "hojas_del_anio_archivo": "hojas_del_anio",
+        "grilla_semana_archivada": "grilla_semana",
+        "vista_semanal_archivada": "vista_semanal",
+        "montos_semana_archivada": "montos_semana",
+        "csv_planilla_anio_archivo": "csv_planilla_anio",
+    }
+    tiempos.update({caso: _medir(casos[base], repeticiones) for caso, base in casos_archivo.items()})
+    return {"datos": resumen, "tiempos": tiempos}
+
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> list[str]:
+    """Lista de regresiones 'escala/caso: base → actual' (solo casos presentes en ambos)."""
+    regresiones = []
+    for escala, res in actual["escalas"].items():
+        ref = base.get("escalas", {}).get(escala, {}).get("tiempos", {})
+        for caso, t in res["tiempos"].items():
+            if caso in ref and t > ref[caso] * tolerancia and t - ref[caso] > MIN_DIFERENCIA:
+                regresiones.append(f"{escala}/{caso}: {ref[caso] * 1000:.1f} ms → {t * 1000:.1f} ms")
+    return regresiones
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--escalas", default="chica,mediana", help=f"de: {', '.join(sinteticos.ESCALAS)}")
+    p.add_argument("--repeticiones", type=int, default=5)
+    p.add_argument("--guardar", type=Path, help="escribe los resultados como línea base JSON")
+    p.add_argument("--comparar", type=Path, help="línea base JSON contra la que comparar")
+    p.add_argument("--tolerancia", type=float, default=1.5, help="factor permitido sobre la línea base")
+    args = p.parse_args(argv)
+
+    resultado = {
+        "entorno": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "maquina": platform.node(),
+        },
+        "escalas": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for escala in args.escalas.split(","):
+            print(f"== {escala}", flush=True)
+            res = medir_escala(escala.strip(), Path(tmp), args.repeticiones)
+            resultado["escalas"][escala] = res
+            for caso, t in res["tiempos"].items():
+                print(f"  {caso:<24} {t * 1000:9.2f} ms")
+        db.cerrar_conexiones()
+
+    if args.guardar:
+        args.guardar.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding="utf-8")
+    if args.comparar:
+        regresiones = comparar(resultado, json.loads(args.comparar.read_text(encoding="utf-8")), args.tolerancia)
+        for r in regresiones:
+            print(f"REGRESIÓN {r}")
+        return 1 if regresiones else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
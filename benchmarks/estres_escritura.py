@@ -0,0 +1,133 @@
+"""
+estres_escritura.py — Muchos hilos haciendo upserts a la vez, con lectores concurrentes
+
+    python -m benchmarks.estres_escritura --hilos 32 --escrituras 200
+    python -m benchmarks.estres_escritura --modo directo    # sin cola: cada hilo con su transacción
+
+Termina con código 1 si alguna escritura falló o si los totales/conteos no cuadran al final.
+"""
+import argparse
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import datos
+import db
+import escritor
+
+
+def _upsert_directo(semana_id, fecha, trabajador_id, nombre, monto) -> None:
+    # Lo que hacía app.py antes del hilo escritor: una conexión y un commit por escritura
+    with db.get_conn() as conn:
+        conn.execute(
+            """
+            INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, monto)
+            VALUES (?,?,?,?,?)
+            ON CONFLICT(semana_id, trabajador_id, fecha) DO UPDATE SET monto=excluded.monto
+            """,
+            (semana_id, fecha.isoformat(), trabajador_id, nombre, monto),
+        )
+
+
+def correr(hilos: int, escrituras: int, lectores: int, modo: str, semilla: int = 7) -> dict:
+    ini = date(2025, 1, 6)
+    semana_id, _, _ = datos.ensure_semana(ini, ini + timedelta(days=5))
+    with db.get_conn() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO trabajadores(nombre, cargo) VALUES (?, 'Operario')",
+            [(f"Trabajador {i:03d}",) for i in range(hilos)],
+        )
+        ids = [r["id"] for r in conn.execute("SELECT id FROM trabajadores ORDER BY nombre")]
+
+    errores: list[str] = []
+    esperado: dict[tuple, float] = {}
+    lock = threading.Lock()
+    fin_lectura = threading.Event()
+    lecturas = [0]
+
+    def escribir(n: int) -> None:
+        rnd = random.Random(semilla + n)
+        tid, nombre = ids[n], f"Trabajador {n:03d}"
+        for _ in range(escrituras):
+            fecha = ini + timedelta(days=rnd.randrange(6))
+            monto = float(rnd.randrange(1, 200))
+            try:
+                if modo == "cola":
+                    datos.guardar_registro(semana_id, fecha, tid, nombre, "", "", monto, 0, 0.0)
+                else:
+                    _upsert_directo(semana_id, fecha, tid, nombre, monto)
+            except Exception as e:
+                with lock:
+                    errores.append(f"{type(e).__name__}: {e}")
+                continue
+            with lock:
+                esperado[(tid, fecha.isoformat())] = monto  # cada hilo escribe solo sus filas
+
+    def leer() -> None:
+        while not fin_lectura.is_set():
+            with db.get_conn() as conn:
+                conn.execute("SELECT COUNT(*), TOTAL(monto_semana) FROM totales_semana WHERE semana_id=?",
+                             (semana_id,)).fetchone()
+            lecturas[0] += 1
+
+    lect = [threading.Thread(target=leer) for _ in range(lectores)]
+    escr = [threading.Thread(target=escribir, args=(n,)) for n in range(hilos)]
+    t0 = time.perf_counter()
+    for t in lect + escr:
+        t.start()
+    for t in escr:
+        t.join()
+    segundos = time.perf_counter() - t0
+    fin_lectura.set()
+    for t in lect:
+        t.join()
+
+    with db.get_conn() as conn:
+        filas = {(r["trabajador_id"], r["fecha"]): r["monto"] for r in conn.execute(
+            "SELECT trabajador_id, fecha, monto FROM entradas WHERE semana_id=?", (semana_id,))}
+    return {
+        "modo": modo,
+        "escrituras": hilos * escrituras,
+        "segundos": segundos,
+        "por_segundo": hilos * escrituras / segundos,
+        "lecturas": lecturas[0],
+        "errores": errores,
+        "filas_ok": filas == esperado,
+        "totales_ok": not db.verificar_totales(),
+        "escritor": escritor.stats(),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--hilos", type=int, default=32, help="hilos escritores (uno por trabajador)")
+    p.add_argument("--escrituras", type=int, default=200, help="upserts por hilo")
+    p.add_argument("--lectores", type=int, default=4, help="hilos leyendo totales mientras tanto")
+    p.add_argument("--modo", choices=("cola", "directo"), default="cola")
+    args = p.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "estres.db"
+        db.init_db()
+        res = correr(args.hilos, args.escrituras, args.lectores, args.modo)
+        escritor.detener()
+        db.cerrar_conexiones()
+
+    print(f"{res['modo']}: {res['escrituras']} escrituras en {res['segundos']:.2f} s "
+          f"({res['por_segundo']:.0f}/s) · {res['lecturas']} lecturas concurrentes")
+    if args.modo == "cola":
+        es = res["escritor"]
+        print(f"  {es['lotes']} transacciones, {es['por_lote']:.1f} escrituras por lote, {es['reintentos']} reintentos")
+    print(f"  errores: {len(res['errores'])}  filas: {'ok' if res['filas_ok'] else 'DISTINTAS'}  "
+          f"totales: {'ok' if res['totales_ok'] else 'DESCUADRADOS'}")
+    for e in sorted(set(res["errores"]))[:5]:
+        print(f"    {e}")
+    return 0 if not res["errores"] and res["filas_ok"] and res["totales_ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""
+sinteticos.py — Generador reproducible (semilla) de hojas, trabajadores y entradas sobre el schema de db.py
+"""
+import random
+from datetime import date, timedelta
+from pathlib import Path
+
+import datos
+import db
+
+NOMBRES = [
+    "José", "María", "Juan", "Rosa", "Luis", "Ana", "Carlos", "Lucía", "Jorge", "Milagros",
+    "Víctor", "Sofía", "Raúl", "Elena", "Óscar", "Inés", "Martín", "Noemí", "Iván", "Ángela",
+]
+APELLIDOS = [
+    "Quispe", "Flores", "Sánchez", "Rodríguez", "García", "Huamán", "Mamani", "Díaz", "Chávez",
+    "Ramírez", "Torres", "Vásquez", "Castillo", "Mendoza", "Rojas", "Gutiérrez", "Núñez", "Peña",
+]
+CARGOS = ["Operario", "Ayudante", "Capataz", "Cosechador", "Seleccionador", "Chofer"]
+
+# (semanas de historia, trabajadores en catálogo, entradas aproximadas)
+ESCALAS = {
+    "chica": (52, 60, 12_000),
+    "mediana": (156, 250, 120_000),
+    "grande": (260, 500, 500_000),
+}
+
+
+def generar(ruta: Path, semanas: int, trabajadores: int, entradas: int, semilla: int = 42) -> dict:
+    """
+    Crea (o reemplaza) la DB en `ruta` con `semanas` hojas consecutivas que terminan en la semana
+    actual, `trabajadores` en catálogo y ~`entradas` registros Lun–Sáb. Devuelve un resumen.
+    """
+    rnd = random.Random(semilla)
+    ruta = Path(ruta)
+    for sufijo in ("", "-wal", "-shm"):
+        Path(f"{ruta}{sufijo}").unlink(missing_ok=True)
+    for vieja in db.buscar_archivos(str(ruta)):  # hojas archivadas de una generación anterior
+        Path(vieja[1]).unlink()
+    db.DB_PATH = ruta
+    db.cerrar_conexiones()
+    db.init_db()
+
+    nombres: set[str] = set()
+    while len(nombres) < trabajadores:
+        n = f"{rnd.choice(NOMBRES)} {rnd.choice(APELLIDOS)} {rnd.choice(APELLIDOS)}"
+        if n in nombres:
+            n = f"{n} {len(nombres)}"
+        nombres.add(n)
+    catalogo = [(n, rnd.choice(CARGOS), int(rnd.random() > 0.15)) for n in sorted(nombres)]
+
+    hoy = date.today()
+    lunes_fin = hoy - timedelta(days=hoy.weekday())
+    lunes = [lunes_fin - timedelta(weeks=k) for k in range(semanas - 1, -1, -1)]
+    por_semana = max(1, min(trabajadores, round(entradas / semanas / 5.1)))
+
+    with db.get_conn() as conn:
+        conn.executemany("INSERT INTO trabajadores(nombre, cargo, activo) VALUES (?,?,?)", catalogo)
+        ids = [(r["id"], r["nombre"]) for r in conn.execute("SELECT id, nombre FROM trabajadores")]
+        conn.executemany(
+            "INSERT INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,?,?)",
+            [
+                (l.isoformat(), (l + timedelta(days=5)).isoformat(), rnd.choice(NOMBRES), int(l < lunes_fin - timedelta(weeks=2)))
+                for l in lunes
+            ],
+        )
+        hojas = conn.execute("SELECT id, semana_inicio FROM semanas ORDER BY semana_inicio").fetchall()
+
+        filas = []
+        for h in hojas:
+            ini = date.fromisoformat(h["semana_inicio"])
+            for tid, nombre in rnd.sample(ids, por_semana):
+                jornal = rnd.choice((40.0, 45.0, 50.0, 60.0, 80.0))
+                for dow in range(6):
+                    if rnd.random() < (0.5 if dow == 5 else 0.92):
+                        extra = rnd.choice((20.0, 30.0)) if dow == 5 and rnd.random() < 0.3 else 0.0
+                        filas.append((
+                            h["id"], (ini + timedelta(days=dow)).isoformat(), tid, nombre,
+                            rnd.choice(("Cosecha", "Riego", "Poda", "")), jornal, int(extra > 0), extra,
+                        ))
+            if len(filas) >= 50_000:
+                conn.executemany(_INSERT, filas)
+                filas.clear()
+        conn.executemany(_INSERT, filas)
+        total = conn.execute("SELECT COUNT(*) FROM entradas").fetchone()[0]
+    # Como en la app: las hojas cerradas tienen su instantánea
+    datos.verificar_instantaneas(reparar=True)
+    return {"semanas": len(hojas), "trabajadores": trabajadores, "entradas": total}
+
+
+_INSERT = """
+    INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, actividad, monto, extra_sabado, extra_monto)
+    VALUES (?,?,?,?,?,?,?,?)
+"""
@@ -0,0 +1,139 @@
+"""
+cache.py — Caché LRU de lecturas, invalidada por la generación de escritura de la DB
+Una LRU por DB (sitio): un sitio con mucho uso no desaloja lo de los demás, y los sitios que nadie
+usa se descartan enteros cuando hay más de SITIOS_MAX.
+Lo que guarda la precarga (precarga.py, dentro de precargando()) queda marcado: el primer acierto
+sobre eso cuenta como precarga aprovechada, y las lecturas de la precarga no cuentan en la tasa.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+import db
+
+CACHE_MAX = 256  # resultados guardados por sitio (DataFrames chicos: hojas, catálogo, reportes de una semana)
+SITIOS_MAX = 16  # sitios con caché a la vez; el menos usado se descarta entero
+
+_precargando: ContextVar[bool] = ContextVar("precargando", default=False)
+
+
+@contextmanager
+def precargando():
+    """Las lecturas cacheadas del with son de la precarga: se marcan y no cuentan como aciertos/fallos."""
+    token = _precargando.set(True)
+    try:
+        yield
+    finally:
+        _precargando.reset(token)
+
+
+class CacheLecturas:
+    """LRU acotado por sitio; cada valor guarda la generación de DB con la que se calculó."""
+
+    def __init__(self, maximo: int = CACHE_MAX, sitios: int = SITIOS_MAX):
+        self.maximo = maximo
+        self.sitios = sitios
+        self._datos: OrderedDict[str, OrderedDict] = OrderedDict()  # ruta de la DB → su LRU
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.sitios_descartados = 0
+        self.precargadas = 0  # resultados guardados por la precarga
+        self.precargas_usadas = 0  # de esos, los que después leyó alguien
+
+    def obtener(self, clave, generacion: int):
+        """Devuelve (True, valor) si hay un resultado vigente; (False, None) si no. clave[0] es la DB."""
+        precarga = _precargando.get()
+        with self._lock:
+            lru = self._datos.get(clave[0])
+            item = lru.get(clave) if lru is not None else None
+            if item is not None and item[0] == generacion:
+                if precarga:
+                    return True, item[1]
+                lru.move_to_end(clave)
+                self._datos.move_to_end(clave[0])
+                self.aciertos += 1
+                if item[2]:
+                    self.precargas_usadas += 1
+                    lru[clave] = (item[0], item[1], False)
+                return True, item[1]
+            if not precarga:
+                self.fallos += 1
+            return False, None
+
+    def guardar(self, clave, generacion: int, valor) -> None:
+        precarga = _precargando.get()
+        with self._lock:
+            lru = self._datos.get(clave[0])
+            if lru is None:
+                lru = self._datos[clave[0]] = OrderedDict()
+                while len(self._datos) > self.sitios:
+                    self._datos.popitem(last=False)
+                    self.sitios_descartados += 1
+            self._datos.move_to_end(clave[0])
+            lru[clave] = (generacion, valor, precarga)
+            lru.move_to_end(clave)
+            self.precargadas += precarga
+            while len(lru) > self.maximo:
+                lru.popitem(last=False)
+
+    def limpiar(self, ruta: str | None = None) -> None:
+        """Vacía la caché de la DB `ruta`, o toda (y los contadores) si no se da."""
+        with self._lock:
+            if ruta is not None:
+                self._datos.pop(str(ruta), None)
+                return
+            self._datos.clear()
+            self.aciertos = self.fallos = self.sitios_descartados = 0
+            self.precargadas = self.precargas_usadas = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "tasa_aciertos": (self.aciertos / total) if total else 0.0,
+                "entradas": sum(len(lru) for lru in self._datos.values()),
+                "maximo": self.maximo,
+                "sitios": len(self._datos),
+                "sitios_descartados": self.sitios_descartados,
+                "precargadas": self.precargadas,
+                "precargas_usadas": self.precargas_usadas,
+                "tasa_precarga": (self.precargas_usadas / self.precargadas) if self.precargadas else 0.0,
+            }
+
+
+CACHE = CacheLecturas()
+
+
+def _copia(valor):
+    # El llamador puede modificar el DataFrame/lista que recibe: nunca se entrega el guardado
+    return valor.copy() if hasattr(valor, "copy") else valor
+
+
+def cacheado(fn=None, *, tablas=None):
+    """
+    Decorador para lecturas puras: la clave es (DB, función, argumentos). Con `tablas`
+    (las que lee la consulta), solo la invalidan las escrituras que tocan esas tablas.
+    """
+    if fn is None:
+        return lambda f: cacheado(f, tablas=tablas)
+    nombre = f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def envoltura(*args):
+        clave = (str(db.ruta_actual()), nombre, args)
+        # La generación se lee ANTES de consultar: si alguien escribe durante la consulta,
+        # el resultado queda con la generación vieja y la próxima lectura lo recalcula.
+        gen = db.generacion(tablas)
+        ok, valor = CACHE.obtener(clave, gen)
+        if not ok:
+            valor = fn(*args)
+            CACHE.guardar(clave, gen, valor)
+        return valor if _precargando.get() else _copia(valor)
+
+    envoltura.tablas = tablas
+    return envoltura
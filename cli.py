@@ -0,0 +1,127 @@
+"""
+cli.py — Tareas de planilla sin Streamlit (y sin pandas): totales de una semana, exportar un rango, cerrar hojas
+Pensado para los trabajos nocturnos: solo importa db/datos/reportes, que cargan pandas únicamente
+en las funciones que devuelven DataFrames; el arranque en frío queda en decenas de ms.
+
+    python cli.py totales 2025-03-03                 # cualquier día de la semana; --csv para volcarla
+    python cli.py exportar 2025-01-01 2025-03-31     # data/exportes/planilla_<desde>_a_<hasta>.csv
+    python cli.py cerrar 2025-03-03                  # --abrir para reabrirla
+    python cli.py --sitio norte totales 2025-03-03   # la DB de otro sitio (sitios.py)
+"""
+import argparse
+import csv
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import datos
+import db
+import reportes
+import sitios
+
+
+def lunes(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def buscar_hoja(inicio: date):
+    """(id, cerrada, esquema) de la hoja que empieza en `inicio` (viva o archivada), o None."""
+    with db.get_conn() as conn:
+        return conn.execute(
+            "SELECT id, cerrada, esquema FROM todas_semanas WHERE semana_inicio=?", (inicio.isoformat(),)
+        ).fetchone()
+
+
+def _tabla(filas: list[tuple], salida) -> None:
+    """Columnas alineadas: texto a la izquierda, números a la derecha con 2 decimales."""
+    celdas = [reportes.COLUMNAS] + [
+        [f"{v:,.2f}" if isinstance(v, float) else str(v) for v in f] for f in filas
+    ]
+    anchos = [max(len(c[i]) for c in celdas) for i in range(len(reportes.COLUMNAS))]
+    numericas = {i for i, v in enumerate(filas[0]) if isinstance(v, (int, float))} if filas else set()
+    for fila in celdas:
+        salida.write("  ".join(
+            c.rjust(anchos[i]) if i in numericas else c.ljust(anchos[i]) for i, c in enumerate(fila)
+        ).rstrip() + "\n")
+
+
+def totales(semana: date, como_csv: bool = False, salida=None) -> int:
+    """Imprime la planilla de la semana con su total general; devuelve las filas de trabajadores."""
+    salida = salida or sys.stdout  # al llamar, no al importar: respeta redirect_stdout
+    ini = lunes(semana)
+    filas = list(reportes.iter_planilla_rango(ini, ini, totales=False))
+    if filas:
+        sumas = [sum(f[i] for f in filas) for i in range(4, 8)]
+        filas.append(("TOTAL GENERAL", "", ini.isoformat(), (ini + timedelta(days=5)).isoformat(), *sumas))
+    if como_csv:
+        w = csv.writer(salida)
+        w.writerow(reportes.COLUMNAS)
+        w.writerows(filas)
+    elif filas:
+        _tabla(filas, salida)
+    return max(len(filas) - 1, 0)
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--db", type=Path, default=db.DB_PATH, help="DB viva (por defecto %(default)s)")
+    p.add_argument("--sitio", help="usa la DB de este sitio (sitios.py) en vez de --db")
+    sub = p.add_subparsers(dest="orden", required=True)
+    t = sub.add_parser("totales", help="planilla de una semana (trabajador, días, montos y total)")
+    t.add_argument("semana", type=date.fromisoformat, help="cualquier día de la semana (AAAA-MM-DD)")
+    t.add_argument("--csv", action="store_true", help="CSV por la salida estándar en vez de tabla")
+    e = sub.add_parser("exportar", help="planilla de un rango de semanas a CSV/XLSX")
+    e.add_argument("desde", type=date.fromisoformat)
+    e.add_argument("hasta", type=date.fromisoformat)
+    e.add_argument("--formato", choices=("csv", "xlsx"), default="csv")
+    e.add_argument("--salida", type=Path, help="por defecto data/exportes/planilla_<desde>_a_<hasta>.<formato>")
+    c = sub.add_parser("cerrar", help="cierra la hoja de una semana (congela su instantánea)")
+    c.add_argument("semana", type=date.fromisoformat, help="cualquier día de la semana (AAAA-MM-DD)")
+    c.add_argument("--abrir", action="store_true", help="la reabre en vez de cerrarla")
+    args = p.parse_args(argv)
+
+    if args.sitio:
+        try:
+            args.db = sitios.ruta(args.sitio)
+        except ValueError as e:
+            print(e, file=sys.stderr)
+            return 2
+    db.DB_PATH = args.db
+    db.init_db()
+    t0 = time.perf_counter()
+    if args.orden == "totales":
+        n = totales(args.semana, args.csv)
+        if not n:
+            print(f"Sin registros en la semana del {lunes(args.semana)}.", file=sys.stderr)
+            return 1
+    elif args.orden == "exportar":
+        if args.desde > args.hasta:
+            print("El rango está invertido.", file=sys.stderr)
+            return 2
+        if args.salida is None:
+            destino, n = reportes.exportar_planilla(args.desde, args.hasta, args.formato)
+        else:
+            escribir = reportes.exportar_xlsx if args.formato == "xlsx" else reportes.exportar_csv
+            destino, n = args.salida, escribir(args.desde, args.hasta, args.salida)
+        print(f"{n} fila(s) → {destino} en {time.perf_counter() - t0:.2f} s")
+    elif args.orden == "cerrar":
+        ini = lunes(args.semana)
+        hoja = buscar_hoja(ini)
+        if hoja is None:
+            print(f"No hay hoja para la semana del {ini}.", file=sys.stderr)
+            return 1
+        if hoja["esquema"] != "main":
+            print(f"La hoja del {ini} está archivada (solo lectura).", file=sys.stderr)
+            return 1
+        cerrar = not args.abrir
+        if bool(hoja["cerrada"]) == cerrar:
+            print(f"La hoja del {ini} ya estaba {'cerrada' if cerrar else 'abierta'}.")
+            return 0
+        datos.cambiar_estado_hoja(hoja["id"], cerrar)
+        print(f"Hoja del {ini} {'cerrada' if cerrar else 'abierta'}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
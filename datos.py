@@ -0,0 +1,632 @@
+"""
+datos.py — Consultas de la app (hojas, catálogo y reportes) sobre db.py
+Las lecturas pasan por cache.cacheado: se sirven de memoria mientras nadie escriba.
+Las escrituras (@escritura) se ejecutan en el hilo escritor de escritor.py.
+Las hojas archivadas (archivo.py) se leen por las vistas temporales todas_* de db.py y el
+esquema de cada hoja (_esquema); las escrituras solo tocan la DB viva.
+pandas se importa dentro de las funciones que devuelven DataFrames: importar datos (cli.py,
+tareas por lotes) no lo carga si no se usa.
+"""
+from __future__ import annotations
+
+import json
+import re
+import zlib
+from datetime import date, timedelta
+from typing import TYPE_CHECKING
+
+from cache import cacheado
+from db import get_conn
+from escritor import escritura
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DIAS = ("Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado")  # índice = entradas.dow
+COL_ADICIONAL = "Adicional sábado"  # columna de la grilla semanal
+# entradas.dow calculado desde fecha (la misma expresión que la columna generada). SQLite da por
+# leídas todas las columnas de la tabla si la consulta nombra una generada, así que con e.dow
+# ningún índice la cubre; con fecha, idx_entradas_semana_trabid cubre la vista y la grilla.
+_DOW_SQL = "((CAST(strftime('%w', e.fecha) AS INTEGER) + 6) % 7)"
+
+# -------------------- Hojas (semanas) --------------------
+def ensure_semana(ini: date, fin: date, encargado: str | None = None):
+    """Crea semana si no existe (ni viva ni archivada); devuelve (id, encargado, cerrada)."""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT id, encargado, cerrada FROM todas_semanas WHERE semana_inicio=? AND semana_fin=?",
+            (ini.isoformat(), fin.isoformat()),
+        ).fetchone()
+    if row is None:
+        row = _crear_semana(ini.isoformat(), fin.isoformat(), (encargado or "").strip() or "—")
+    return row["id"], row["encargado"], int(row["cerrada"])
+
+
+@escritura(tablas=("semanas",))
+def _crear_semana(conn, ini: str, fin: str, encargado: str):
+    # OR IGNORE: otra sesión pudo crearla entre la lectura de ensure_semana y esta escritura
+    conn.execute(
+        "INSERT OR IGNORE INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,?,0)",
+        (ini, fin, encargado),
+    )
+    return conn.execute(
+        "SELECT id, encargado, cerrada FROM semanas WHERE semana_inicio=? AND semana_fin=?", (ini, fin)
+    ).fetchone()
+
+
+@escritura(tablas=("semanas",))
+def actualizar_encargado(conn, semana_id: int, encargado: str) -> None:
+    conn.execute("UPDATE semanas SET encargado=? WHERE id=?", (encargado.strip() or "—", int(semana_id)))
+
+
+@escritura(tablas=("semanas", "instantaneas"))
+def cambiar_estado_hoja(conn, semana_id: int, cerrada: bool) -> None:
+    """Cierra (True, congelando su instantánea) o abre (False, descartándola) una hoja."""
+    cur = conn.execute("UPDATE semanas SET cerrada=? WHERE id=?", (int(cerrada), int(semana_id)))
+    if cur.rowcount == 0:
+        raise ValueError("La hoja está archivada (solo lectura) o ya no existe.")
+    if cerrada:
+        _congelar(conn, semana_id)
+    else:
+        conn.execute("DELETE FROM instantaneas WHERE semana_id=?", (int(semana_id),))
+
+
+@cacheado(tablas=("semanas",))
+def list_hojas():
+    """Devuelve DataFrame de semanas (vivas y archivadas) como 'hojas' ordenadas desc por inicio."""
+    import pandas as pd
+    with get_conn() as conn:
+        df = pd.read_sql_query(
+            """
+            SELECT id, semana_inicio, semana_fin, encargado, cerrada
+            FROM todas_semanas
+            ORDER BY semana_inicio DESC
+            """,
+            conn,
+        )
+    if df.empty:
+        return pd.DataFrame(columns=["id","semana_inicio","semana_fin","encargado","cerrada"])
+    df["semana_inicio"] = pd.to_datetime(df["semana_inicio"]).dt.date
+    df["semana_fin"]    = pd.to_datetime(df["semana_fin"]).dt.date
+    return df
+
+
+def _hoja_dict(row) -> dict:
+    return {
+        "id": int(row["id"]),
+        "semana_inicio": date.fromisoformat(row["semana_inicio"]),
+        "semana_fin": date.fromisoformat(row["semana_fin"]),
+        "encargado": row["encargado"],
+        "cerrada": int(row["cerrada"]),
+        "archivada": row["esquema"] != "main",
+    }
+
+
+def _esquema(conn, semana_id: int) -> str:
+    """'main' o el archivo adjunto ('archivo_<año>') donde están las entradas de la hoja."""
+    if not conn.archivos:
+        return "main"
+    row = conn.execute("SELECT esquema FROM todas_semanas WHERE id=?", (int(semana_id),)).fetchone()
+    return row["esquema"] if row else "main"
+
+
+@cacheado(tablas=("semanas",))
+def hoja(semana_id: int) -> dict | None:
+    """Una hoja por id (búsqueda por clave primaria); None si no existe."""
+    with get_conn() as conn:
+        row = conn.execute(
+            "SELECT esquema, id, semana_inicio, semana_fin, encargado, cerrada FROM todas_semanas WHERE id=?",
+            (int(semana_id),),
+        ).fetchone()
+    return _hoja_dict(row) if row else None
+
+
+@cacheado(tablas=("semanas",))
+def hoja_vecina(semana_inicio: date, direccion: int) -> int | None:
+    """Id de la hoja anterior (direccion < 0) o siguiente (> 0) por fecha de inicio; una búsqueda por índice."""
+    sql = (
+        "SELECT id FROM todas_semanas WHERE semana_inicio < ? ORDER BY semana_inicio DESC LIMIT 1"
+        if direccion < 0 else
+        "SELECT id FROM todas_semanas WHERE semana_inicio > ? ORDER BY semana_inicio ASC LIMIT 1"
+    )
+    with get_conn() as conn:
+        row = conn.execute(sql, (semana_inicio.isoformat(),)).fetchone()
+    return int(row["id"]) if row else None
+
+
+@cacheado(tablas=("semanas",))
+def hoja_mas_reciente() -> int | None:
+    with get_conn() as conn:
+        row = conn.execute("SELECT id FROM todas_semanas ORDER BY semana_inicio DESC LIMIT 1").fetchone()
+    return int(row["id"]) if row else None
+
+
+@cacheado(tablas=("semanas",))
+def anios_con_hojas() -> list[int]:
+    """Años (desc) en los que empieza al menos una hoja, viva o archivada; opciones del selector."""
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT DISTINCT substr(semana_inicio, 1, 4) AS anio FROM todas_semanas ORDER BY anio DESC"
+        ).fetchall()
+    return [int(r["anio"]) for r in rows]
+
+
+@cacheado(tablas=("semanas",))
+def hojas_del_anio(anio: int) -> list[dict]:
+    """Hojas cuyo lunes cae en `anio` (≤ 53), desc por inicio; ventana del selector."""
+    with get_conn() as conn:
+        rows = conn.execute(
+            """
+            SELECT esquema, id, semana_inicio, semana_fin, encargado, cerrada
+            FROM todas_semanas
+            WHERE semana_inicio BETWEEN ? AND ?
+            ORDER BY semana_inicio DESC
+            """,
+            (f"{anio:04d}-01-01", f"{anio:04d}-12-31"),
+        ).fetchall()
+    return [_hoja_dict(r) for r in rows]
+
+
+@escritura(tablas=("semanas",))
+def delete_hoja(conn, semana_id: int):
+    """Elimina la hoja/semana; sus entradas y totales se borran en cascada."""
+    conn.execute("DELETE FROM semanas WHERE id=?", (int(semana_id),))
+
+
+@cacheado(tablas=("entradas",))
+def contar_registros(semana_id: int) -> int:
+    with get_conn() as conn:
+        return conn.execute(
+            f"SELECT COUNT(*) AS c FROM {_esquema(conn, semana_id)}.entradas WHERE semana_id=?", (int(semana_id),)
+        ).fetchone()["c"]
+
+
+@escritura(tablas=("entradas",))
+def eliminar_registros(conn, semana_id: int, trabajador_id: int, fechas: list[str] | None = None) -> int:
+    """Borra registros de un trabajador en la hoja: las `fechas` (ISO) dadas, o todos si es None."""
+    if fechas is None:
+        cur = conn.execute(
+            "DELETE FROM entradas WHERE semana_id=? AND trabajador_id=?",
+            (int(semana_id), int(trabajador_id)),
+        )
+    else:
+        cur = conn.executemany(
+            "DELETE FROM entradas WHERE semana_id=? AND trabajador_id=? AND fecha=?",
+            [(int(semana_id), int(trabajador_id), f) for f in fechas],
+        )
+    return cur.rowcount
+
+
+@escritura(tablas=("entradas", "trabajadores"))
+def guardar_registro(
+    conn, semana_id: int, fecha: date, trabajador_id: int | None, nombre: str, cargo: str,
+    actividad: str, monto: float, extra_sabado: int, extra_monto: float,
+) -> int:
+    """
+    Upsert de un día de un trabajador en la hoja. Sin `trabajador_id`, lo da de alta en el
+    catálogo (o toma el existente con ese nombre). Devuelve el trabajador_id usado.
+    """
+    row = conn.execute("SELECT cerrada FROM semanas WHERE id=?", (int(semana_id),)).fetchone()
+    if row is None or int(row["cerrada"]):
+        raise ValueError("La hoja está cerrada; no se guardó el registro.")
+    if trabajador_id is None:
+        conn.execute("INSERT OR IGNORE INTO trabajadores(nombre, cargo) VALUES (?, ?)", (nombre, cargo))
+        trabajador_id = conn.execute("SELECT id FROM trabajadores WHERE nombre=?", (nombre,)).fetchone()["id"]
+    conn.execute(
+        """
+        INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, actividad, monto, extra_sabado, extra_monto)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(semana_id, trabajador_id, fecha) DO UPDATE SET
+          actividad=excluded.actividad,
+          monto=excluded.monto,
+          extra_sabado=excluded.extra_sabado,
+          extra_monto=excluded.extra_monto
+        """,
+        (
+            int(semana_id), fecha.isoformat(), int(trabajador_id), nombre.strip(), actividad.strip(),
+            float(monto), int(extra_sabado), float(extra_monto),
+        ),
+    )
+    return int(trabajador_id)
+
+
+# -------------------- Gestión masiva de hojas (por rango de fechas) --------------------
+@cacheado(tablas=("semanas", "entradas"))
+def resumen_rango(desde: date, hasta: date) -> dict:
+    """Hojas con inicio en [desde, hasta]: total, cerradas y registros que contienen."""
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT COUNT(*) AS hojas,
+                   TOTAL(s.cerrada) AS cerradas,
+                   TOTAL((SELECT COUNT(*) FROM entradas e WHERE e.semana_id = s.id)) AS registros
+            FROM semanas s
+            WHERE s.semana_inicio BETWEEN ? AND ?
+            """,
+            (desde.isoformat(), hasta.isoformat()),
+        ).fetchone()
+    return {"hojas": int(row["hojas"]), "cerradas": int(row["cerradas"]), "registros": int(row["registros"])}
+
+
+@escritura(tablas=("semanas", "instantaneas"))
+def cerrar_hojas_rango(conn, desde: date, hasta: date, cerrada: bool = True) -> int:
+    """Cierra (o reabre) todas las hojas con inicio en [desde, hasta]; devuelve cuántas cambiaron."""
+    ids = [r["id"] for r in conn.execute(
+        "SELECT id FROM semanas WHERE semana_inicio BETWEEN ? AND ? AND cerrada<>?",
+        (desde.isoformat(), hasta.isoformat(), int(cerrada)),
+    )]
+    conn.executemany("UPDATE semanas SET cerrada=? WHERE id=?", [(int(cerrada), i) for i in ids])
+    if cerrada:
+        for i in ids:
+            _congelar(conn, i)
+    else:
+        conn.executemany("DELETE FROM instantaneas WHERE semana_id=?", [(i,) for i in ids])
+    return len(ids)
+
+
+@escritura(tablas=("semanas",))
+def eliminar_hojas_rango(conn, desde: date, hasta: date) -> int:
+    """Elimina las hojas con inicio en [desde, hasta] (entradas y totales en cascada), en una transacción."""
+    cur = conn.execute(
+        "DELETE FROM semanas WHERE semana_inicio BETWEEN ? AND ?",
+        (desde.isoformat(), hasta.isoformat()),
+    )
+    return cur.rowcount
+
+
+# -------------------- Catálogo de trabajadores --------------------
+@cacheado(tablas=("trabajadores",))
+def trabajadores_activos() -> list:
+    """Filas (id, nombre, cargo) de los trabajadores activos, por nombre."""
+    with get_conn() as conn:
+        return conn.execute(
+            "SELECT id, nombre, COALESCE(cargo, '') AS cargo FROM trabajadores WHERE activo=1 ORDER BY nombre"
+        ).fetchall()
+
+
+@cacheado(tablas=("trabajadores",))
+def catalogo_trabajadores() -> list:
+    """Filas (id, nombre, cargo, activo) de todo el catálogo, por nombre."""
+    with get_conn() as conn:
+        return conn.execute(
+            "SELECT id, nombre, COALESCE(cargo, '') AS cargo, activo FROM trabajadores ORDER BY nombre"
+        ).fetchall()
+
+
+@escritura(tablas=("trabajadores",))
+def actualizar_trabajador(conn, trabajador_id: int, nombre: str, cargo: str, activo: bool) -> None:
+    conn.execute(
+        "UPDATE trabajadores SET nombre=?, cargo=?, activo=? WHERE id=?",
+        (nombre.strip(), cargo.strip(), int(activo), int(trabajador_id)),
+    )
+
+
+@escritura(tablas=("trabajadores",))
+def desactivar_trabajador(conn, trabajador_id: int) -> None:
+    conn.execute("UPDATE trabajadores SET activo=0 WHERE id=?", (int(trabajador_id),))
+
+
+def _consulta_fts(texto: str) -> str:
+    """'jose mu' → '"jose"* "mu"*': cada palabra como prefijo, todas requeridas (AND implícito)."""
+    return " ".join(f'"{p}"*' for p in re.findall(r"\w+", texto))
+
+
+@cacheado(tablas=("trabajadores", "trabajadores_fts"))
+def buscar_trabajadores(texto: str, limite: int = 20, solo_activos: bool = True) -> list:
+    """
+    Hasta `limite` filas (id, nombre, cargo, activo) cuyo nombre o cargo empiezan por las palabras
+    de `texto`, sin distinguir tildes ni mayúsculas. Sin texto: los primeros por nombre.
+    """
+    consulta = _consulta_fts(texto or "")
+    with get_conn() as conn:
+        if not consulta:
+            return conn.execute(
+                """
+                SELECT id, nombre, COALESCE(cargo, '') AS cargo, activo
+                FROM trabajadores
+                WHERE activo=1 OR NOT ?
+                ORDER BY nombre
+                LIMIT ?
+                """,
+                (int(solo_activos), int(limite)),
+            ).fetchall()
+        return conn.execute(
+            """
+            SELECT t.id, t.nombre, COALESCE(t.cargo, '') AS cargo, t.activo
+            FROM trabajadores_fts f
+            JOIN trabajadores t ON t.id = f.rowid
+            WHERE trabajadores_fts MATCH ? AND (t.activo=1 OR NOT ?)
+            ORDER BY f.rank, t.nombre
+            LIMIT ?
+            """,
+            (consulta, int(solo_activos), int(limite)),
+        ).fetchall()
+
+
+@cacheado(tablas=("trabajadores",))
+def trabajador(trabajador_id: int):
+    """Fila (id, nombre, cargo, activo) por id; None si no existe."""
+    with get_conn() as conn:
+        return conn.execute(
+            "SELECT id, nombre, COALESCE(cargo, '') AS cargo, activo FROM trabajadores WHERE id=?",
+            (int(trabajador_id),),
+        ).fetchone()
+
+
+# -------------------- Reportes de una hoja --------------------
+@cacheado(tablas=("entradas",))
+def registros_trabajador(semana_id: int, trabajador_id: int) -> pd.DataFrame:
+    import pandas as pd
+    with get_conn() as conn:
+        return pd.read_sql_query(
+            f"""
+            SELECT fecha, actividad, monto, extra_monto
+            FROM {_esquema(conn, semana_id)}.entradas
+            WHERE semana_id=? AND trabajador_id=?
+            ORDER BY fecha
+            """,
+            conn,
+            params=(int(semana_id), int(trabajador_id)),
+        )
+
+
+@cacheado(tablas=("entradas", "trabajadores", "instantaneas"))
+def vista_semanal(semana_id: int, ini: date, fin: date) -> pd.DataFrame:
+    """
+    Pivot Lun–Sáb de la hoja en una sola consulta agregada: una fila por trabajador con
+    el monto de cada día, días trabajados, adicional de sábado y total de la semana.
+    Columnas: trabajador, cargo, <días con registros>, dias, Monto adicional, Total semana.
+    Hoja cerrada: se lee de su instantánea (una fila) en vez de agregar entradas.
+    """
+    with get_conn() as conn:
+        row = conn.execute(
+            """
+            SELECT vista FROM todas_instantaneas
+            WHERE semana_id=? AND semana_inicio=? AND semana_fin=?
+            """,
+            (int(semana_id), ini.isoformat(), fin.isoformat()),
+        ).fetchone()
+        if row is not None:
+            return _desempacar(row["vista"])
+        return _vista_semanal(conn, semana_id, ini, fin)
+
+
+def _vista_semanal(conn, semana_id: int, ini: date, fin: date) -> pd.DataFrame:
+    import pandas as pd
+    por_dia = ",\n".join(
+        f'SUM(CASE WHEN {_DOW_SQL}={i} THEN e.monto END) AS "{dia}"' for i, dia in enumerate(DIAS)
+    )
+    df = pd.read_sql_query(
+        f"""
+        SELECT t.nombre AS trabajador,
+               COALESCE(t.cargo, '') AS cargo,
+               {por_dia},
+               COUNT(*) AS dias,  -- UNIQUE(semana_id, trabajador_id, fecha): una fila por día
+               TOTAL(CASE WHEN {_DOW_SQL} = 5 THEN e.extra_monto END) AS "Monto adicional",
+               TOTAL(CASE WHEN {_DOW_SQL} < 6 THEN e.monto END)
+                 + TOTAL(CASE WHEN {_DOW_SQL} = 5 THEN e.extra_monto END) AS "Total semana"
+        FROM {_esquema(conn, semana_id)}.entradas e
+        JOIN trabajadores t ON t.id = e.trabajador_id
+        WHERE e.semana_id=? AND e.fecha BETWEEN ? AND ?
+        GROUP BY e.trabajador_id
+        ORDER BY t.nombre
+        """,
+        conn,
+        params=(int(semana_id), ini.isoformat(), fin.isoformat()),
+    )
+    # Como el pivot: solo columnas de días con algún registro en la hoja; huecos en 0
+    cols_dias = [d for d in DIAS if df[d].notna().any()]
+    df[cols_dias] = df[cols_dias].astype(float).fillna(0.0)
+    df["dias"] = df["dias"].astype(int)
+    return df[["trabajador", "cargo"] + cols_dias + ["dias", "Monto adicional", "Total semana"]]
+
+
+@cacheado(tablas=("totales_semana", "trabajadores", "instantaneas"))
+def montos_semana(semana_id: int) -> pd.DataFrame:
+    """
+    Días, monto Lun–Sáb y adicional de sábado por trabajador (de totales_semana, sin recorrer
+    entradas). Hoja cerrada: de su instantánea.
+    """
+    with get_conn() as conn:
+        row = conn.execute("SELECT montos FROM todas_instantaneas WHERE semana_id=?", (int(semana_id),)).fetchone()
+        if row is not None:
+            return _desempacar(row["montos"])
+        return _montos_semana(conn, semana_id)
+
+
+def _montos_semana(conn, semana_id: int) -> pd.DataFrame:
+    import pandas as pd
+    return pd.read_sql_query(
+        f"""
+        SELECT t.nombre AS trabajador,
+               COALESCE(t.cargo, '') AS cargo,
+               s.dias,
+               s.monto_semana,
+               s.monto_adicional
+        FROM {_esquema(conn, semana_id)}.totales_semana s
+        JOIN trabajadores t ON t.id = s.trabajador_id
+        WHERE s.semana_id=?
+        ORDER BY t.nombre
+        """,
+        conn,
+        params=(int(semana_id),),
+    )
+
+
+# -------------------- Instantáneas de hojas cerradas --------------------
+def _empacar(df: pd.DataFrame) -> bytes:
+    """DataFrame → zlib(JSON) por columnas, con sus tipos (se reconstruye idéntico)."""
+    return zlib.compress(json.dumps({
+        "tipos": {c: str(t) for c, t in df.dtypes.items()},
+        "columnas": {c: df[c].tolist() for c in df.columns},
+    }, ensure_ascii=False).encode("utf-8"))
+
+
+def _desempacar(blob: bytes) -> pd.DataFrame:
+    import pandas as pd
+    d = json.loads(zlib.decompress(blob))
+    df = pd.DataFrame(d["columnas"])
+    # La inferencia ya acierta casi siempre (str, int64, float64); solo se convierte lo que no
+    distintos = {c: t for c, t in d["tipos"].items() if str(df[c].dtype) != t}
+    return df.astype(distintos) if distintos else df
+
+
+def _congelar(conn, semana_id: int) -> None:
+    """Guarda (o reemplaza) la instantánea de la hoja con lo que hay ahora en entradas/totales."""
+    row = conn.execute("SELECT semana_inicio, semana_fin FROM semanas WHERE id=?", (int(semana_id),)).fetchone()
+    ini, fin = date.fromisoformat(row["semana_inicio"]), date.fromisoformat(row["semana_fin"])
+    conn.execute(
+        "INSERT OR REPLACE INTO instantaneas(semana_id, vista, montos) VALUES (?,?,?)",
+        (int(semana_id), _empacar(_vista_semanal(conn, semana_id, ini, fin)), _empacar(_montos_semana(conn, semana_id))),
+    )
+
+
+def _iguales(a: pd.DataFrame, b: pd.DataFrame) -> bool:
+    import pandas as pd
+    try:
+        pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False)
+    except AssertionError:
+        return False
+    return True
+
+
+def verificar_instantaneas(reparar: bool = False) -> list[dict]:
+    """
+    Compara cada instantánea con los datos vivos. Devuelve los problemas (semana_id, problema):
+    'falta' (hoja cerrada sin instantánea), 'hoja abierta', 'vista distinta', 'montos distintos'.
+    Con `reparar`, recongela las cerradas y borra las de hojas abiertas.
+    """
+    problemas = []
+    with get_conn() as conn:
+        hojas = conn.execute(
+            """
+            SELECT s.id, s.semana_inicio, s.semana_fin, s.cerrada, i.vista, i.montos
+            FROM semanas s LEFT JOIN instantaneas i ON i.semana_id = s.id
+            WHERE s.cerrada = 1 OR i.semana_id IS NOT NULL
+            ORDER BY s.semana_inicio
+            """
+        ).fetchall()
+        for h in hojas:
+            sid = int(h["id"])
+            if not h["cerrada"]:
+                problemas.append({"semana_id": sid, "problema": "hoja abierta"})
+            elif h["vista"] is None:
+                problemas.append({"semana_id": sid, "problema": "falta"})
+            else:
+                ini, fin = date.fromisoformat(h["semana_inicio"]), date.fromisoformat(h["semana_fin"])
+                if not _iguales(_desempacar(h["vista"]), _vista_semanal(conn, sid, ini, fin)):
+                    problemas.append({"semana_id": sid, "problema": "vista distinta"})
+                if not _iguales(_desempacar(h["montos"]), _montos_semana(conn, sid)):
+                    problemas.append({"semana_id": sid, "problema": "montos distintos"})
+    if problemas and reparar:
+        _reparar_instantaneas(sorted({p["semana_id"] for p in problemas}))
+    return problemas
+
+
+@escritura(tablas=("instantaneas",))
+def _reparar_instantaneas(conn, ids: list[int]) -> None:
+    for sid in ids:
+        row = conn.execute("SELECT cerrada FROM semanas WHERE id=?", (sid,)).fetchone()
+        if row is None:
+            continue
+        if row["cerrada"]:
+            _congelar(conn, sid)
+        else:
+            conn.execute("DELETE FROM instantaneas WHERE semana_id=?", (sid,))
+
+
+# -------------------- Carga por grilla semanal --------------------
+@cacheado(tablas=("entradas", "trabajadores"))
+def grilla_semana(semana_id: int) -> pd.DataFrame:
+    """
+    Grilla trabajador × Lunes..Sábado (+ adicional de sábado) de la hoja, para st.data_editor.
+    Filas: trabajadores activos más los que ya tienen registros en la hoja. Celda vacía = sin registro.
+    """
+    import pandas as pd
+    por_dia = ",\n".join(
+        f'SUM(CASE WHEN {_DOW_SQL}={i} THEN e.monto END) AS "{dia}"' for i, dia in enumerate(DIAS)
+    )
+    with get_conn() as conn:
+        df = pd.read_sql_query(
+            f"""
+            SELECT t.id AS trabajador_id,
+                   t.nombre AS trabajador,
+                   COALESCE(t.cargo, '') AS cargo,
+                   {por_dia},
+                   SUM(CASE WHEN {_DOW_SQL} = 5 AND e.extra_monto > 0 THEN e.extra_monto END) AS "{COL_ADICIONAL}"
+            FROM trabajadores t
+            LEFT JOIN {_esquema(conn, semana_id)}.entradas e ON e.trabajador_id = t.id AND e.semana_id = ?
+            WHERE t.activo = 1 OR e.id IS NOT NULL
+            GROUP BY t.id
+            ORDER BY t.nombre
+            """,
+            conn,
+            params=(int(semana_id),),
+        )
+    cols = list(DIAS) + [COL_ADICIONAL]
+    df[cols] = df[cols].astype(float)
+    return df
+
+
+def guardar_grilla(semana_id: int, ini: date, original: pd.DataFrame, editada: pd.DataFrame) -> tuple[int, int]:
+    """
+    Aplica solo las celdas que cambiaron entre `original` (grilla_semana) y `editada`
+    en una escritura (hilo escritor): un executemany de upserts y otro de borrados.
+    Celda vacía = sin registro; el adicional va en el registro del sábado (que se crea
+    con monto 0 si hace falta). Devuelve (guardados, eliminados).
+    """
+    import pandas as pd
+    cols = list(DIAS) + [COL_ADICIONAL]
+    antes = original.set_index("trabajador_id")[cols]
+    despues = editada.set_index("trabajador_id")[cols].reindex(antes.index).astype(float)
+    if (despues.fillna(0) < 0).to_numpy().any():
+        raise ValueError("Los montos no pueden ser negativos.")
+
+    distinto = ~((antes == despues) | (antes.isna() & despues.isna()))
+    cambios = distinto[list(DIAS)].copy()
+    cambios["Sábado"] |= distinto[COL_ADICIONAL]
+    celdas = cambios.stack()
+    celdas = celdas[celdas].index  # pares (trabajador_id, día)
+    if celdas.empty:
+        return 0, 0
+
+    nombres = original.set_index("trabajador_id")["trabajador"]
+    upserts, borrados = [], []
+    for tid, dia in celdas:
+        dow = DIAS.index(dia)
+        fecha = (ini + timedelta(days=dow)).isoformat()
+        monto = despues.at[tid, dia]
+        extra = despues.at[tid, COL_ADICIONAL] if dow == 5 else float("nan")
+        extra = 0.0 if pd.isna(extra) else float(extra)
+        if pd.isna(monto) and extra == 0:
+            borrados.append((int(semana_id), int(tid), fecha))
+        else:
+            monto = 0.0 if pd.isna(monto) else float(monto)
+            upserts.append((int(semana_id), fecha, int(tid), nombres.at[tid], monto, int(extra > 0), extra))
+
+    return _aplicar_grilla(semana_id, upserts, borrados)
+
+
+@escritura(tablas=("entradas",))
+def _aplicar_grilla(conn, semana_id: int, upserts: list, borrados: list) -> tuple[int, int]:
+    row = conn.execute("SELECT cerrada FROM semanas WHERE id=?", (int(semana_id),)).fetchone()
+    if row is None or int(row["cerrada"]):
+        raise ValueError("La hoja está cerrada; no se guardaron cambios.")
+    conn.executemany(
+        "DELETE FROM entradas WHERE semana_id=? AND trabajador_id=? AND fecha=?", borrados
+    )
+    conn.executemany(
+        """
+        INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, monto, extra_sabado, extra_monto)
+        VALUES (?,?,?,?,?,?,?)
+        ON CONFLICT(semana_id, trabajador_id, fecha) DO UPDATE SET
+          monto=excluded.monto,
+          extra_sabado=excluded.extra_sabado,
+          extra_monto=excluded.extra_monto
+        """,
+        upserts,
+    )
+    return len(upserts), len(borrados)
+
+
+guardar_grilla.tablas = _aplicar_grilla.tablas  # lo que escribe (ver escritor.escritura)
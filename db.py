@@ -1,27 +1,407 @@
 """
 db.py — Conexión y schema SQLite (Lun–Sáb, cierre de semana y catálogo de trabajadores con cargo)
+La DB de cada llamada es ruta_actual(): la del contexto (un sitio, ver sitios.py) o DB_PATH.
 """
+import re
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 
+import perfil
+
 # La DB se crea en runtime aquí:
 DB_PATH = Path("data/registro.db")
 DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
+# Se aplican una sola vez, al abrir cada conexión del pool
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA mmap_size=268435456",   # 256 MiB
+    "PRAGMA cache_size=-16384",     # 16 MiB
+    "PRAGMA temp_store=MEMORY",
+)
+POOL_MAX = 8  # conexiones libres que se conservan por archivo
+POOLS_ABIERTOS = 12  # pools con conexiones abiertas a la vez; al pasarse se cierran las del menos usado
+VIGIA_INTERVALO = 2.0  # segundos entre consultas de PRAGMA data_version (escrituras de otros procesos)
+CARPETA_ARCHIVO = "archivo"  # hojas archivadas: <carpeta de la DB>/archivo/<nombre>_<año>.db (archivo.py)
+ARCHIVOS_MAX = 10  # límite de ATTACH por conexión de SQLite (SQLITE_MAX_ATTACHED por defecto)
+
+# Tablas que cambian solas (triggers, ON DELETE CASCADE, índice FTS) al escribir en la de la clave
+TABLAS_DERIVADAS = {
+    "semanas": ("entradas", "instantaneas", "cambios"),
+    "entradas": ("totales_semana", "cambios"),
+    "trabajadores": ("entradas", "trabajadores_fts", "cambios"),
+}
+
+
+# DB del contexto (hilo/sesión); None = DB_PATH. Los hilos nuevos empiezan sin valor.
+_ruta_contexto: ContextVar[Path | None] = ContextVar("ruta_db", default=None)
+
+
+def ruta_actual() -> Path:
+    """DB de este contexto (fijada con usar/fijar_ruta) o, si no hay, DB_PATH."""
+    return _ruta_contexto.get() or DB_PATH
+
+
+def fijar_ruta(ruta) -> None:
+    """Fija la DB del contexto actual hasta que se cambie (None vuelve a DB_PATH)."""
+    _ruta_contexto.set(None if ruta is None else Path(ruta))
+
 
 @contextmanager
-def get_conn():
-    """Devuelve una conexión SQLite con row_factory tipo dict."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+def usar(ruta):
+    """Dentro del with, ruta_actual() es `ruta` (pools, cachés, escritor e init_db la siguen)."""
+    token = _ruta_contexto.set(Path(ruta))
     try:
-        yield conn
-        conn.commit()
+        yield
     finally:
+        _ruta_contexto.reset(token)
+
+
+def tablas_afectadas(tablas) -> frozenset:
+    """`tablas` más todas las que cambian por arrastre (cierre de TABLAS_DERIVADAS)."""
+    pendientes, vistas = list(tablas), set()
+    while pendientes:
+        t = pendientes.pop()
+        if t not in vistas:
+            vistas.add(t)
+            pendientes.extend(TABLAS_DERIVADAS.get(t, ()))
+    return frozenset(vistas)
+
+
+class _CursorPerfilado(sqlite3.Cursor):
+    """Cursor que anota en perfil.py cada execute/executemany y las filas que se leen."""
+
+    _reg = None
+
+    def _medir(self, metodo, sql, params, forma):
+        p0, t0 = perfil.pasos(), time.perf_counter()
+        metodo(sql, params)
+        self._reg = perfil.registrar(sql, forma, time.perf_counter() - t0, self.rowcount, perfil.pasos() - p0)
+        return self
+
+    def execute(self, sql, parameters=(), /):
+        return self._medir(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        filas = seq_of_parameters if isinstance(seq_of_parameters, (list, tuple)) else list(seq_of_parameters)
+        forma = f"executemany[{len(filas)}×{len(filas[0]) if filas else 0}]"
+        return self._medir(super().executemany, sql, filas, forma)
+
+    def _fetch(self, metodo, *args):
+        p0, t0 = perfil.pasos(), time.perf_counter()
+        filas = metodo(*args)
+        if self._reg is not None:
+            n = (filas is not None) if not isinstance(filas, list) else len(filas)
+            perfil.sumar_fetch(self._reg, int(n), time.perf_counter() - t0, perfil.pasos() - p0)
+        return filas
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+
+class _Conexion(sqlite3.Connection):
+    """Conexión del pool: con el perfil activo en el hilo, los cursores (y execute) se miden."""
+
+    archivos = None  # (esquema, ruta) adjuntos; None = aún sin vistas de lectura (ver _adjuntar)
+
+    def cursor(self, factory=sqlite3.Cursor):
+        if factory is sqlite3.Cursor and perfil.activo():
+            factory = _CursorPerfilado
+        return super().cursor(factory)
+
+    # Connection.execute/executemany crean su cursor sin pasar por cursor()
+    def execute(self, sql, parameters=(), /):
+        if perfil.activo():
+            return self.cursor().execute(sql, parameters)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters, /):
+        if perfil.activo():
+            return self.cursor().executemany(sql, seq_of_parameters)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class _Pool:
+    """Conexiones reutilizables hacia un archivo SQLite (compartidas entre hilos)."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._libres: list[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        # Generación de escritura: sube con cada commit que cambió filas. Si el commit declaró
+        # sus tablas, solo suben las de esas tablas; si no (u otro proceso escribió), la general.
+        self._gen = 0
+        self._gen_tablas: dict[str, int] = {}
+        self._vigia: sqlite3.Connection | None = None
+        self._data_version = None
+        self._vigia_visto = 0.0
+        self._archivos: tuple = ()
+        self._archivos_visto = float("-inf")
+        self.usado = time.monotonic()  # último préstamo (para elegir qué pool cerrar, ver _acotar_pools)
+
+    def _abrir(self) -> sqlite3.Connection:
+        # uri=True: los archivos se adjuntan con mode=rw (un ATTACH normal crearía uno vacío)
+        conn = sqlite3.connect(self.ruta, check_same_thread=False, factory=_Conexion, uri=True)
+        conn.row_factory = sqlite3.Row
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def abierto(self) -> bool:
+        return bool(self._libres) or self._vigia is not None
+
+    def tomar(self) -> sqlite3.Connection:
+        self.usado = time.monotonic()
+        archivos = self.archivos()
+        with self._lock:
+            conn = self._libres.pop() if self._libres else None
+        if conn is None:
+            _acotar_pools(self)
+            conn = self._abrir()
+        if conn.archivos != archivos:
+            _adjuntar(conn, archivos)
+        return conn
+
+    def archivos(self) -> tuple:
+        """(esquema, ruta) de los archivos de hojas archivadas; el directorio se relee cada VIGIA_INTERVALO."""
+        ahora = time.monotonic()
+        if ahora - self._archivos_visto >= VIGIA_INTERVALO:
+            encontrados = buscar_archivos(self.ruta)
+            with self._lock:
+                if encontrados != self._archivos:
+                    self._archivos = encontrados
+                    self._gen += 1  # las lecturas cacheadas no veían (o ya no deben ver) esas hojas
+                self._archivos_visto = ahora
+        return self._archivos
+
+    def refrescar_archivos(self) -> None:
+        """Fuerza releer el directorio de archivos en el próximo préstamo (tras archivar)."""
+        self._archivos_visto = float("-inf")
+
+    def devolver(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if len(self._libres) < POOL_MAX:
+                self._libres.append(conn)
+                return
         conn.close()
 
+    def cerrar(self) -> None:
+        with self._lock:
+            libres, self._libres = self._libres, []
+            vigia, self._vigia = self._vigia, None
+        for conn in libres:
+            conn.close()
+        if vigia is not None:
+            vigia.close()
+
+    def antes_de_confirmar(self, conn: sqlite3.Connection) -> int | None:
+        """
+        Justo antes del COMMIT de `conn` (que ya escribió: tiene el lock de escritura y nadie más
+        puede confirmar). Si el vigía ya ve otra data_version, otro proceso escribió desde la
+        última consulta: invalida todo. Devuelve la data_version de `conn` para marcar_escritura.
+        """
+        with self._lock:
+            if self._vigia is None:
+                return None
+            version = self._vigia.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                self._gen += 1
+        return conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def marcar_escritura(self, tablas=None, conn: sqlite3.Connection | None = None, version=None) -> None:
+        with self._lock:
+            if self._vigia is not None:
+                # El commit propio también cambia data_version en el vigía: se toma como base para
+                # que generacion() solo cuente los de otros procesos (y no invalide todo)
+                self._data_version = self._vigia.execute("PRAGMA data_version").fetchone()[0]
+            if version is not None and conn.execute("PRAGMA data_version").fetchone()[0] != version:
+                # La de `conn` no cambia con sus propios commits: otro confirmó entre nuestro COMMIT
+                # y la lectura del vigía, y esa base ya lo incluye
+                self._gen += 1
+            if tablas is None:
+                self._gen += 1
+                return
+            for t in tablas_afectadas(tablas):
+                self._gen_tablas[t] = self._gen_tablas.get(t, 0) + 1
+
+    def generacion(self, tablas=None) -> int:
+        """
+        Número que cambia cada vez que la DB pudo cambiar (o, con `tablas`, cada vez que
+        pudieron cambiar esas tablas). Los commits de este proceso la suben al instante (y
+        fijan la base de data_version, ver marcar_escritura); los de otros procesos se detectan con PRAGMA data_version como mucho cada
+        VIGIA_INTERVALO segundos (entre medio no se toca SQLite).
+        """
+        ahora = time.monotonic()
+        if ahora - self._vigia_visto >= VIGIA_INTERVALO:
+            if self._vigia is None:
+                _acotar_pools(self)
+            with self._lock:
+                if self._vigia is None:
+                    self._vigia = self._abrir()
+                version = self._vigia.execute("PRAGMA data_version").fetchone()[0]
+                if version != self._data_version:
+                    self._data_version = version
+                    self._gen += 1
+                self._vigia_visto = ahora
+        # Los contadores solo crecen: la suma cambia si cambia cualquiera de ellos
+        if tablas is None:
+            return self._gen + sum(self._gen_tablas.values())
+        return self._gen + sum(self._gen_tablas.get(t, 0) for t in tablas)
+
+
+# -------------------- Archivo (lectura transparente de hojas archivadas) --------------------
+# Vistas temporales de cada conexión del pool: una rama por esquema (main + archivos adjuntos).
+# Los WHERE sobre la vista bajan a cada rama, así que siguen usando los índices de cada archivo.
+VISTAS_LECTURA = {
+    # Todas las hojas; `esquema` dice en qué archivo están sus entradas
+    "todas_semanas": "SELECT '{e}' AS esquema, id, semana_inicio, semana_fin, encargado, cerrada FROM {e}.semanas",
+    "todas_instantaneas": (
+        "SELECT i.semana_id, s.semana_inicio, s.semana_fin, i.vista, i.montos "
+        "FROM {e}.instantaneas i JOIN {e}.semanas s ON s.id = i.semana_id"
+    ),
+    # Lo mínimo del historial por trabajador (historial.py reconstruye su caché desde aquí)
+    "todas_entradas": "SELECT trabajador_id, fecha, monto, extra_monto FROM {e}.entradas",
+    "todos_totales": (
+        "SELECT s.id AS semana_id, s.semana_inicio, s.semana_fin, t.trabajador_id, "
+        "t.dias, t.monto_semana, t.monto_adicional "
+        "FROM {e}.semanas s JOIN {e}.totales_semana t ON t.semana_id = s.id"
+    ),
+}
+
+
+def ruta_archivo(anio: int, ruta: str | None = None) -> Path:
+    """Archivo de las hojas archivadas de `anio` para la DB `ruta` (por defecto, la actual)."""
+    base = Path(ruta or ruta_actual())
+    return base.parent / CARPETA_ARCHIVO / f"{base.stem}_{anio:04d}.db"
+
+
+def buscar_archivos(ruta: str) -> tuple:
+    """(esquema, ruta) de los archivos de `ruta` en disco, por año; solo los ARCHIVOS_MAX más recientes."""
+    base = Path(ruta)
+    carpeta = base.parent / CARPETA_ARCHIVO
+    if not carpeta.is_dir():
+        return ()
+    patron = re.compile(rf"{re.escape(base.stem)}_(\d{{4}})")
+    anios = sorted(int(m.group(1)) for p in carpeta.glob("*.db") if (m := patron.fullmatch(p.stem)))
+    return tuple((f"archivo_{a}", str(ruta_archivo(a, ruta))) for a in anios[-ARCHIVOS_MAX:])
+
+
+def _adjuntar(conn: sqlite3.Connection, archivos: tuple) -> None:
+    """Deja adjuntos en `conn` exactamente esos archivos y rehace sus vistas de lectura."""
+    antes = dict(conn.archivos or ())
+    ahora = dict(archivos)
+    for esquema, ruta in antes.items():
+        if ahora.get(esquema) != ruta:
+            conn.execute(f"DETACH DATABASE {esquema}")
+    for esquema, ruta in archivos:
+        if antes.get(esquema) != ruta:
+            conn.execute(f"ATTACH DATABASE ? AS {esquema}", (f"{Path(ruta).resolve().as_uri()}?mode=rw",))
+    esquemas = ["main", *ahora]
+    for vista, rama in VISTAS_LECTURA.items():
+        conn.execute(f"DROP VIEW IF EXISTS temp.{vista}")
+        conn.execute(f"CREATE TEMP VIEW {vista} AS " + " UNION ALL ".join(rama.format(e=e) for e in esquemas))
+    conn.archivos = archivos
+
+
+_pools: dict[str, _Pool] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool_actual(ruta: str | None = None) -> _Pool:
+    ruta = ruta or str(ruta_actual())
+    pool = _pools.get(ruta)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(ruta, _Pool(ruta))
+    return pool
+
+
+def _acotar_pools(nuevo: _Pool) -> None:
+    """
+    Antes de que `nuevo` abra una conexión: si ya hay POOLS_ABIERTOS pools con conexiones
+    abiertas, cierra las libres de los menos usados. El pool sigue existiendo (sus generaciones
+    no vuelven atrás) y reabre al próximo préstamo; las prestadas se cierran al devolverse de
+    más (POOL_MAX) o quedan para la próxima. Así un proceso con decenas de sitios mantiene a lo
+    sumo POOLS_ABIERTOS × (POOL_MAX + 1) conexiones libres, cada una con su cache_size.
+    """
+    with _pools_lock:
+        abiertos = sorted((p for p in _pools.values() if p is not nuevo and p.abierto()), key=lambda p: p.usado)
+    for pool in abiertos[:max(len(abiertos) - POOLS_ABIERTOS + 1, 0)]:
+        pool.cerrar()
+
+
+def generacion(tablas=None, ruta: str | None = None) -> int:
+    """Generación de escritura de la DB actual (o `ruta`), o de esas `tablas` (ver _Pool.generacion)."""
+    return _pool_actual(ruta).generacion(tablas)
+
+
+def refrescar_archivos(ruta: str | None = None) -> None:
+    """Tras crear o quitar un archivo: las conexiones lo adjuntan (o sueltan) en su próximo préstamo."""
+    _pool_actual(ruta).refrescar_archivos()
+
 
+def cerrar_conexiones() -> None:
+    """Cierra las conexiones libres de todos los pools (p. ej. antes de reemplazar el archivo)."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.cerrar()
+
+
+@contextmanager
+def get_conn(ruta: str | None = None, tablas=None):
+    """
+    Presta una conexión del pool (row_factory tipo dict); commit al salir, rollback si hay error.
+    `ruta` fija el archivo (por defecto, ruta_actual() en el momento de la llamada). `tablas`, si se
+    da, son las únicas en las que se escribe: el commit invalida solo las lecturas de esas.
+    """
+    pool = _pool_actual(ruta)
+    conn = pool.tomar()
+    cambios = conn.total_changes
+    medir = perfil.activo()
+    if medir:
+        conn.set_progress_handler(perfil.contar_pasos, perfil.PASOS_POR_AVISO)
+    try:
+        yield conn
+        escribio = conn.total_changes != cambios
+        version = pool.antes_de_confirmar(conn) if escribio else None
+        conn.commit()
+        if escribio:
+            pool.marcar_escritura(tablas, conn, version)
+    except BaseException:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            raise
+        if medir:
+            conn.set_progress_handler(None, 0)
+        pool.devolver(conn)
+        raise
+    else:
+        if medir:
+            conn.set_progress_handler(None, 0)
+        pool.devolver(conn)
+
+
+# Schema de la versión 1 (lo ejecuta _m001_esquema_base); los cambios posteriores van en MIGRACIONES.
 SCHEMA_SQL = """
 CREATE TABLE IF NOT EXISTS semanas (
     id             INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -66,12 +446,531 @@ def _ensure_column(conn: sqlite3.Connection, table: str, col_def: str) -> None:
         conn.execute(f"ALTER TABLE {table} ADD COLUMN {col_def}")
 
 
-def init_db() -> None:
-    """Crea tablas si no existen y migra columnas nuevas sin perder datos."""
+def _sentencias(script: str) -> list[str]:
+    """Divide un script en sentencias completas (los ';' dentro de triggers no cortan)."""
+    sentencias, buf = [], ""
+    for trozo in script.split(";"):
+        buf += trozo + ";"
+        if sqlite3.complete_statement(buf):
+            if buf.strip().rstrip(";").strip():
+                sentencias.append(buf.strip())
+            buf = ""
+    return sentencias
+
+
+def _ejecutar(conn: sqlite3.Connection, script: str) -> None:
+    """Como executescript, pero sin el COMMIT implícito (corre dentro de la migración)."""
+    for sql in _sentencias(script):
+        conn.execute(sql)
+
+
+def reconstruir_tabla(conn: sqlite3.Connection, table: str, columnas_sql: str, recrear: bool = True) -> None:
+    """
+    Reconstruye `table` con una nueva definición (procedimiento de 12 pasos de SQLite).
+    columnas_sql: cuerpo del CREATE TABLE, ej. '(id INTEGER PRIMARY KEY, ...)'.
+    Copia las columnas comunes a ambas versiones y, si `recrear`, vuelve a crear
+    los índices y triggers propios de la tabla. Debe llamarse dentro de una migración.
+    """
+    nueva = f"_nueva_{table}"
+    objetos = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE tbl_name=? AND type IN ('index','trigger') AND sql IS NOT NULL",
+        (table,),
+    ).fetchall()
+    conn.execute(f"CREATE TABLE {nueva} {columnas_sql}")
+    # table_xinfo marca las columnas generadas con hidden 2/3: no se copian
+    nuevas = {r["name"] for r in conn.execute(f"PRAGMA table_xinfo({nueva})") if r["hidden"] == 0}
+    comunes = [r["name"] for r in conn.execute(f"PRAGMA table_xinfo({table})") if r["hidden"] == 0 and r["name"] in nuevas]
+    cols = ", ".join(comunes)
+    conn.execute(f"INSERT INTO {nueva} ({cols}) SELECT {cols} FROM {table}")
+    conn.execute(f"DROP TABLE {table}")
+    # Con legacy_alter_table el RENAME no revalida triggers de otras tablas que apuntan a `table`
+    conn.execute("PRAGMA legacy_alter_table=ON")
+    try:
+        conn.execute(f"ALTER TABLE {nueva} RENAME TO {table}")
+    finally:
+        conn.execute("PRAGMA legacy_alter_table=OFF")
+    if recrear:
+        for r in objetos:
+            conn.execute(r["sql"])
+
+
+# -------------------- Migraciones (PRAGMA user_version) --------------------
+def _m001_esquema_base(conn: sqlite3.Connection) -> None:
+    """Tablas base; completa columnas de DBs creadas antes del control de versiones."""
+    _ejecutar(conn, SCHEMA_SQL)
+    _ensure_column(conn, "trabajadores", "cargo TEXT")
+    _ensure_column(conn, "semanas", "cerrada INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(conn, "entradas", "extra_sabado INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(conn, "entradas", "extra_monto REAL NOT NULL DEFAULT 0")
+
+
+def _m002_fechas_indexables(conn: sqlite3.Connection) -> None:
+    """Fechas ISO puras, día de la semana almacenado e índices para las consultas de app.py."""
+    # Fechas con hora u otro formato: se normalizan; si chocan con una ya normalizada (misma hoja y
+    # trabajador), se queda la normalizada. Las que chocaron y las que date() no entiende (nunca
+    # salieron en la vista semanal ni sumaron montos) no se borran: pasan a entradas_cuarentena.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS entradas_cuarentena (
+            id           INTEGER PRIMARY KEY,  -- el que tenía en entradas
+            semana_id    INTEGER,
+            fecha        TEXT,
+            trabajador   TEXT,
+            actividad    TEXT,
+            monto        REAL,
+            extra_sabado INTEGER,
+            extra_monto  REAL,
+            motivo       TEXT NOT NULL,
+            movida       TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    _m002_hojas_repetidas(conn)
+    conn.execute("UPDATE OR IGNORE entradas SET fecha=date(fecha) WHERE fecha <> date(fecha)")
+    conn.execute("""
+        INSERT INTO entradas_cuarentena(id, semana_id, fecha, trabajador, actividad, monto, extra_sabado, extra_monto, motivo)
+        SELECT id, semana_id, fecha, trabajador, actividad, monto, extra_sabado, extra_monto,
+               CASE WHEN date(fecha) IS NULL THEN 'fecha inválida' ELSE 'repetida al normalizar la fecha' END
+        FROM entradas WHERE date(fecha) IS NULL OR fecha <> date(fecha)
+    """)
+    conn.execute("DELETE FROM entradas WHERE date(fecha) IS NULL OR fecha <> date(fecha)")
+    reconstruir_tabla(conn, "entradas", """(
+        id           INTEGER PRIMARY KEY AUTOINCREMENT,
+        semana_id    INTEGER NOT NULL,
+        fecha        TEXT NOT NULL CHECK (fecha = date(fecha)),  -- YYYY-MM-DD
+        trabajador   TEXT NOT NULL,        -- texto; se asocia por nombre al catálogo
+        actividad    TEXT,
+        monto        REAL NOT NULL DEFAULT 0,
+        extra_sabado INTEGER NOT NULL DEFAULT 0, -- 0/1, solo válido si fecha es sábado
+        extra_monto  REAL NOT NULL DEFAULT 0,    -- monto adicional del sábado
+        -- 0: Lunes … 5: Sábado, 6: Domingo (mismos índices que label_dow)
+        dow          INTEGER GENERATED ALWAYS AS ((CAST(strftime('%w', fecha) AS INTEGER) + 6) % 7) STORED,
+        UNIQUE(semana_id, fecha, trabajador),
+        FOREIGN KEY (semana_id) REFERENCES semanas(id)
+    )""")
+    _ejecutar(conn, """
+    -- Vista semanal, montos y registros por trabajador (cubre filtro, orden y sumas)
+    CREATE INDEX IF NOT EXISTS idx_entradas_semana_trab
+        ON entradas(semana_id, trabajador, fecha, dow, monto, extra_monto);
+    -- Lista de hojas ordenada por inicio
+    CREATE INDEX IF NOT EXISTS idx_semanas_hojas
+        ON semanas(semana_inicio, semana_fin, encargado, cerrada);
+    -- Selector de trabajadores activos y catálogo completo
+    CREATE INDEX IF NOT EXISTS idx_trabajadores_activos
+        ON trabajadores(activo, nombre, cargo);
+    CREATE INDEX IF NOT EXISTS idx_trabajadores_catalogo
+        ON trabajadores(nombre, cargo, activo);
+    """)
+
+
+def _m002_hojas_repetidas(conn: sqlite3.Connection) -> None:
+    """
+    Normaliza las fechas de las hojas. Una que choca con otra ya normalizada (mismo inicio y fin) se
+    une a ella: sus entradas pasan a la otra (las que ya estaban ahí, a entradas_cuarentena) y la hoja
+    va a semanas_cuarentena. Las de fecha que date() no entiende van enteras a cuarentena.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS semanas_cuarentena (
+            id            INTEGER PRIMARY KEY,  -- el que tenía en semanas
+            semana_inicio TEXT,
+            semana_fin    TEXT,
+            encargado     TEXT,
+            cerrada       INTEGER,
+            unida_a       INTEGER,              -- hoja que recibió sus entradas (NULL: ninguna)
+            motivo        TEXT NOT NULL,
+            movida        TEXT NOT NULL DEFAULT (datetime('now'))
+        )
+    """)
+    conn.execute(
+        "UPDATE OR IGNORE semanas SET semana_inicio=date(semana_inicio), semana_fin=date(semana_fin) "
+        "WHERE semana_inicio <> date(semana_inicio) OR semana_fin <> date(semana_fin)"
+    )
+    sin_normalizar = (
+        "date(semana_inicio) IS NULL OR date(semana_fin) IS NULL "
+        "OR semana_inicio <> date(semana_inicio) OR semana_fin <> date(semana_fin)"
+    )
+    conn.execute(f"""
+        INSERT INTO semanas_cuarentena(id, semana_inicio, semana_fin, encargado, cerrada, unida_a, motivo)
+        SELECT s.id, s.semana_inicio, s.semana_fin, s.encargado, s.cerrada,
+               (SELECT d.id FROM semanas d
+                WHERE d.semana_inicio = date(s.semana_inicio) AND d.semana_fin = date(s.semana_fin)),
+               CASE WHEN date(s.semana_inicio) IS NULL OR date(s.semana_fin) IS NULL
+                    THEN 'fecha inválida' ELSE 'repetida al normalizar la fecha' END
+        FROM semanas s WHERE {sin_normalizar}
+    """)
+    conn.execute("""
+        UPDATE OR IGNORE entradas
+        SET semana_id = (SELECT q.unida_a FROM semanas_cuarentena q WHERE q.id = entradas.semana_id)
+        WHERE semana_id IN (SELECT id FROM semanas_cuarentena WHERE unida_a IS NOT NULL)
+    """)
+    conn.execute("""
+        INSERT INTO entradas_cuarentena(id, semana_id, fecha, trabajador, actividad, monto, extra_sabado, extra_monto, motivo)
+        SELECT e.id, e.semana_id, e.fecha, e.trabajador, e.actividad, e.monto, e.extra_sabado, e.extra_monto,
+               CASE WHEN q.unida_a IS NULL THEN 'hoja con fecha inválida' ELSE 'repetida al unir hojas' END
+        FROM entradas e JOIN semanas_cuarentena q ON q.id = e.semana_id
+    """)
+    conn.execute("DELETE FROM entradas WHERE semana_id IN (SELECT id FROM semanas_cuarentena)")
+    conn.execute(f"DELETE FROM semanas WHERE {sin_normalizar}")
+
+
+def _m003_trabajador_id(conn: sqlite3.Connection) -> None:
+    """entradas.trabajador_id → trabajadores(id); el nombre en entradas queda como copia sincronizada."""
+    # Nombres que solo existen en entradas (p. ej. renombrados antes de esta versión): al catálogo, inactivos
+    conn.execute("INSERT OR IGNORE INTO trabajadores(nombre, activo) SELECT DISTINCT trabajador, 0 FROM entradas")
+    # ADD COLUMN no reescribe la tabla: el costo de la migración es el backfill indexado
+    conn.execute("ALTER TABLE entradas ADD COLUMN trabajador_id INTEGER REFERENCES trabajadores(id)")
+    conn.execute(
+        "UPDATE entradas SET trabajador_id = (SELECT t.id FROM trabajadores t WHERE t.nombre = entradas.trabajador)"
+    )
+    _ejecutar(conn, """
+    DROP INDEX IF EXISTS idx_entradas_semana_trab;
+    -- Clave de upsert por id
+    CREATE UNIQUE INDEX IF NOT EXISTS ux_entradas_semana_trabid_fecha
+        ON entradas(semana_id, trabajador_id, fecha);
+    -- Vista semanal, montos y registros por trabajador
+    CREATE INDEX IF NOT EXISTS idx_entradas_semana_trabid
+        ON entradas(semana_id, trabajador_id, fecha, dow, monto, extra_monto);
+    CREATE INDEX IF NOT EXISTS idx_entradas_trabajador_id
+        ON entradas(trabajador_id);
+    -- Renombrar en el catálogo ya no deja huérfano el historial
+    CREATE TRIGGER IF NOT EXISTS trg_trabajadores_renombrar
+    AFTER UPDATE OF nombre ON trabajadores
+    BEGIN
+        UPDATE entradas SET trabajador = NEW.nombre WHERE trabajador_id = NEW.id;
+    END;
+    """)
+
+
+# Totales por hoja y trabajador recalculados desde cero (backfill y verificación)
+TOTALES_DESDE_ENTRADAS = """
+    SELECT semana_id, trabajador_id,
+           COUNT(*) AS dias,
+           TOTAL(CASE WHEN dow < 6 THEN monto END) AS monto_semana,
+           TOTAL(CASE WHEN dow = 5 THEN extra_monto END) AS monto_adicional
+    FROM entradas
+    WHERE trabajador_id IS NOT NULL
+    GROUP BY semana_id, trabajador_id
+"""
+
+
+def _m004_totales_semana(conn: sqlite3.Connection) -> None:
+    """Totales de pago por hoja y trabajador, mantenidos por triggers sobre entradas."""
+    _ejecutar(conn, """
+    CREATE TABLE IF NOT EXISTS totales_semana (
+        semana_id        INTEGER NOT NULL REFERENCES semanas(id) ON DELETE CASCADE,
+        trabajador_id    INTEGER NOT NULL REFERENCES trabajadores(id),
+        dias             INTEGER NOT NULL DEFAULT 0,  -- días con registro (incluye domingos antiguos)
+        monto_semana     REAL NOT NULL DEFAULT 0,     -- montos Lun–Sáb
+        monto_adicional  REAL NOT NULL DEFAULT 0,     -- adicional de sábado
+        PRIMARY KEY (semana_id, trabajador_id)
+    ) WITHOUT ROWID;
+
+    CREATE TRIGGER IF NOT EXISTS trg_totales_insert
+    AFTER INSERT ON entradas
+    BEGIN
+        INSERT INTO totales_semana(semana_id, trabajador_id, dias, monto_semana, monto_adicional)
+        SELECT NEW.semana_id, NEW.trabajador_id, 1,
+               CASE WHEN NEW.dow < 6 THEN NEW.monto ELSE 0 END,
+               CASE WHEN NEW.dow = 5 THEN NEW.extra_monto ELSE 0 END
+        WHERE NEW.trabajador_id IS NOT NULL
+        ON CONFLICT(semana_id, trabajador_id) DO UPDATE SET
+            dias            = dias + 1,
+            monto_semana    = monto_semana + excluded.monto_semana,
+            monto_adicional = monto_adicional + excluded.monto_adicional;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_totales_delete
+    AFTER DELETE ON entradas
+    BEGIN
+        UPDATE totales_semana SET
+            dias            = dias - 1,
+            monto_semana    = monto_semana - CASE WHEN OLD.dow < 6 THEN OLD.monto ELSE 0 END,
+            monto_adicional = monto_adicional - CASE WHEN OLD.dow = 5 THEN OLD.extra_monto ELSE 0 END
+        WHERE semana_id = OLD.semana_id AND trabajador_id = OLD.trabajador_id;
+        DELETE FROM totales_semana
+        WHERE semana_id = OLD.semana_id AND trabajador_id = OLD.trabajador_id AND dias <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_totales_update
+    AFTER UPDATE OF semana_id, trabajador_id, fecha, monto, extra_monto ON entradas
+    BEGIN
+        UPDATE totales_semana SET
+            dias            = dias - 1,
+            monto_semana    = monto_semana - CASE WHEN OLD.dow < 6 THEN OLD.monto ELSE 0 END,
+            monto_adicional = monto_adicional - CASE WHEN OLD.dow = 5 THEN OLD.extra_monto ELSE 0 END
+        WHERE semana_id = OLD.semana_id AND trabajador_id = OLD.trabajador_id;
+        DELETE FROM totales_semana
+        WHERE semana_id = OLD.semana_id AND trabajador_id = OLD.trabajador_id AND dias <= 0;
+        INSERT INTO totales_semana(semana_id, trabajador_id, dias, monto_semana, monto_adicional)
+        SELECT NEW.semana_id, NEW.trabajador_id, 1,
+               CASE WHEN NEW.dow < 6 THEN NEW.monto ELSE 0 END,
+               CASE WHEN NEW.dow = 5 THEN NEW.extra_monto ELSE 0 END
+        WHERE NEW.trabajador_id IS NOT NULL
+        ON CONFLICT(semana_id, trabajador_id) DO UPDATE SET
+            dias            = dias + 1,
+            monto_semana    = monto_semana + excluded.monto_semana,
+            monto_adicional = monto_adicional + excluded.monto_adicional;
+    END;
+    """)
+    conn.execute("DELETE FROM totales_semana")
+    conn.execute(f"INSERT INTO totales_semana {TOTALES_DESDE_ENTRADAS}")
+
+
+def _m005_borrado_en_cascada(conn: sqlite3.Connection) -> None:
+    """entradas con ON DELETE CASCADE hacia semanas y clave única por trabajador_id."""
+    # Filas que aún no tengan id (escritas por versiones anteriores de la app)
+    conn.execute("INSERT OR IGNORE INTO trabajadores(nombre, activo) SELECT DISTINCT trabajador, 0 FROM entradas WHERE trabajador_id IS NULL")
+    conn.execute(
+        "UPDATE entradas SET trabajador_id = (SELECT t.id FROM trabajadores t WHERE t.nombre = entradas.trabajador) "
+        "WHERE trabajador_id IS NULL"
+    )
+    reconstruir_tabla(conn, "entradas", """(
+        id            INTEGER PRIMARY KEY AUTOINCREMENT,
+        semana_id     INTEGER NOT NULL REFERENCES semanas(id) ON DELETE CASCADE,
+        fecha         TEXT NOT NULL CHECK (fecha = date(fecha)),  -- YYYY-MM-DD
+        trabajador_id INTEGER NOT NULL REFERENCES trabajadores(id),
+        trabajador    TEXT NOT NULL,        -- copia del nombre (trg_trabajadores_renombrar)
+        actividad     TEXT,
+        monto         REAL NOT NULL DEFAULT 0,
+        extra_sabado  INTEGER NOT NULL DEFAULT 0, -- 0/1, solo válido si fecha es sábado
+        extra_monto   REAL NOT NULL DEFAULT 0,    -- monto adicional del sábado
+        -- 0: Lunes … 5: Sábado, 6: Domingo (mismos índices que datos.DIAS)
+        dow           INTEGER GENERATED ALWAYS AS ((CAST(strftime('%w', fecha) AS INTEGER) + 6) % 7) STORED,
+        UNIQUE (semana_id, trabajador_id, fecha)
+    )""")
+    # La restricción UNIQUE de la tabla reemplaza al índice único de la v3
+    conn.execute("DROP INDEX IF EXISTS ux_entradas_semana_trabid_fecha")
+
+
+def _m006_busqueda_trabajadores(conn: sqlite3.Connection) -> None:
+    """Índice FTS5 de nombre y cargo para buscar trabajadores por prefijo, sin tildes ni mayúsculas."""
+    # Tabla de contenido externo: el texto vive solo en trabajadores; los triggers mantienen el índice.
+    # unicode61 con remove_diacritics 2 pliega "Muñoz"/"munoz" y "José"/"jose"; prefix='2 3'
+    # indexa los prefijos cortos que se escriben al empezar a buscar.
+    _ejecutar(conn, """
+    CREATE VIRTUAL TABLE IF NOT EXISTS trabajadores_fts USING fts5(
+        nombre, cargo,
+        content='trabajadores', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS trg_trabajadores_fts_insert
+    AFTER INSERT ON trabajadores
+    BEGIN
+        INSERT INTO trabajadores_fts(rowid, nombre, cargo) VALUES (NEW.id, NEW.nombre, NEW.cargo);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_trabajadores_fts_delete
+    AFTER DELETE ON trabajadores
+    BEGIN
+        INSERT INTO trabajadores_fts(trabajadores_fts, rowid, nombre, cargo)
+        VALUES ('delete', OLD.id, OLD.nombre, OLD.cargo);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_trabajadores_fts_update
+    AFTER UPDATE OF nombre, cargo ON trabajadores
+    BEGIN
+        INSERT INTO trabajadores_fts(trabajadores_fts, rowid, nombre, cargo)
+        VALUES ('delete', OLD.id, OLD.nombre, OLD.cargo);
+        INSERT INTO trabajadores_fts(rowid, nombre, cargo) VALUES (NEW.id, NEW.nombre, NEW.cargo);
+    END;
+    """)
+    conn.execute("INSERT INTO trabajadores_fts(trabajadores_fts) VALUES ('rebuild')")
+
+
+def _m007_instantaneas(conn: sqlite3.Connection) -> None:
+    """Instantánea de cada hoja cerrada: vista semanal y montos congelados al cerrar (ver datos.py)."""
+    # Las hojas que ya estaban cerradas no se congelan aquí (el pivot vive en datos.py):
+    # se leen en vivo hasta que datos.verificar_instantaneas(reparar=True) las cree.
+    _ejecutar(conn, """
+    CREATE TABLE IF NOT EXISTS instantaneas (
+        semana_id  INTEGER PRIMARY KEY REFERENCES semanas(id) ON DELETE CASCADE,
+        creada     TEXT NOT NULL DEFAULT (datetime('now')),
+        vista      BLOB NOT NULL,   -- zlib(JSON) de datos.vista_semanal
+        montos     BLOB NOT NULL    -- zlib(JSON) de datos.montos_semana
+    );
+    """)
+
+
+# Fila de cada tabla sincronizada como JSON con claves naturales (los ids son locales de cada sitio)
+_JSON_CAMBIO = {
+    "semanas": "json_object('semana_inicio', {f}.semana_inicio, 'semana_fin', {f}.semana_fin, "
+               "'encargado', {f}.encargado, 'cerrada', {f}.cerrada)",
+    "trabajadores": "json_object('nombre', {f}.nombre, 'cargo', {f}.cargo, 'activo', {f}.activo)",
+    "entradas": "(SELECT json_object('semana_inicio', s.semana_inicio, 'semana_fin', s.semana_fin, "
+                "'fecha', {f}.fecha, 'trabajador', {f}.trabajador, 'actividad', {f}.actividad, "
+                "'monto', {f}.monto, 'extra_sabado', {f}.extra_sabado, 'extra_monto', {f}.extra_monto) "
+                "FROM semanas s WHERE s.id = {f}.semana_id)",
+}
+# UPDATE que no cambia nada de lo sincronizado no se anota. En entradas, un cambio solo de
+# `trabajador` con el mismo trabajador_id es el arrastre de un renombre (ya anotado en trabajadores).
+_CAMBIO_REAL = {
+    "semanas": "OLD.semana_inicio IS NOT NEW.semana_inicio OR OLD.semana_fin IS NOT NEW.semana_fin "
+               "OR OLD.encargado IS NOT NEW.encargado OR OLD.cerrada IS NOT NEW.cerrada",
+    "trabajadores": "OLD.nombre IS NOT NEW.nombre OR OLD.cargo IS NOT NEW.cargo OR OLD.activo IS NOT NEW.activo",
+    "entradas": "OLD.semana_id IS NOT NEW.semana_id OR OLD.fecha IS NOT NEW.fecha "
+                "OR OLD.trabajador_id IS NOT NEW.trabajador_id OR OLD.actividad IS NOT NEW.actividad "
+                "OR OLD.monto IS NOT NEW.monto OR OLD.extra_sabado IS NOT NEW.extra_sabado "
+                "OR OLD.extra_monto IS NOT NEW.extra_monto",
+}
+_SIN_SILENCIO = "(SELECT valor FROM sync_local WHERE clave = 'silencio') = '0'"
+
+
+def _m008_diario_cambios(conn: sqlite3.Connection) -> None:
+    """Diario de cambios (solo agregar) de semanas, trabajadores y entradas para sincronizar sitios."""
+    _ejecutar(conn, """
+    CREATE TABLE IF NOT EXISTS cambios (
+        seq      INTEGER PRIMARY KEY AUTOINCREMENT,  -- no se reusa (tampoco tras podar)
+        tabla    TEXT NOT NULL,
+        op       TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+        antes    TEXT,   -- JSON de la fila antes del cambio (NULL en I)
+        despues  TEXT,   -- JSON de la fila después (NULL en D)
+        creado   TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f', 'now'))
+    );
+
+    -- 'origen': id de este sitio en los deltas, 'silencio' = '1' apaga los triggers (archivo.py)
+    CREATE TABLE IF NOT EXISTS sync_local (
+        clave  TEXT PRIMARY KEY,
+        valor  TEXT NOT NULL
+    ) WITHOUT ROWID;
+    INSERT OR IGNORE INTO sync_local VALUES ('origen', lower(hex(randomblob(8))));
+    INSERT OR IGNORE INTO sync_local VALUES ('silencio', '0');
+
+    -- Hasta qué seq se aplicó el diario de cada sitio (sincronizacion.py)
+    CREATE TABLE IF NOT EXISTS sync_origenes (
+        origen      TEXT PRIMARY KEY,
+        ultimo_seq  INTEGER NOT NULL,
+        aplicado    TEXT NOT NULL DEFAULT (datetime('now'))
+    ) WITHOUT ROWID;
+
+    CREATE TABLE IF NOT EXISTS sync_conflictos (
+        id          INTEGER PRIMARY KEY,
+        origen      TEXT NOT NULL,
+        seq         INTEGER NOT NULL,
+        tabla       TEXT NOT NULL,
+        op          TEXT NOT NULL,
+        local       TEXT,   -- JSON de la fila de aquí cuando llegó el cambio
+        remoto      TEXT,   -- JSON esperado por el cambio ('despues')
+        resolucion  TEXT NOT NULL,  -- 'remoto' (se aplicó), 'local' (se conservó), 'archivada', 'error: ...'
+        creado      TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    """)
+    # Borrar una hoja borra antes sus entradas una por una (en vez de la cascada, que no deja
+    # ver la hoja a sus triggers): cada entrada queda anotada con su clave natural y la central,
+    # que junta varios sitios en la misma hoja, borra solo las de este sitio.
+    _ejecutar(conn, f"""
+    CREATE TRIGGER IF NOT EXISTS trg_cambios_semanas_vaciar
+    BEFORE DELETE ON semanas WHEN {_SIN_SILENCIO}
+    BEGIN
+        DELETE FROM entradas WHERE semana_id = OLD.id;
+    END;
+    """)
+    for tabla, fila in _JSON_CAMBIO.items():
+        _ejecutar(conn, f"""
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{tabla}_insert
+        AFTER INSERT ON {tabla} WHEN {_SIN_SILENCIO}
+        BEGIN
+            INSERT INTO cambios(tabla, op, despues) VALUES ('{tabla}', 'I', {fila.format(f="NEW")});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{tabla}_update
+        AFTER UPDATE ON {tabla} WHEN {_SIN_SILENCIO} AND ({_CAMBIO_REAL[tabla]})
+        BEGIN
+            INSERT INTO cambios(tabla, op, antes, despues)
+            VALUES ('{tabla}', 'U', {fila.format(f="OLD")}, {fila.format(f="NEW")});
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_cambios_{tabla}_delete
+        AFTER DELETE ON {tabla} WHEN {_SIN_SILENCIO}
+        BEGIN
+            INSERT INTO cambios(tabla, op, antes) VALUES ('{tabla}', 'D', {fila.format(f="OLD")});
+        END;
+        """)
+
+
+# Orden estricto: la versión del schema es la posición (1-based) en esta lista.
+# Solo se agregan migraciones al final; nunca se editan las ya publicadas.
+MIGRACIONES = [
+    _m001_esquema_base,
+    _m002_fechas_indexables,
+    _m003_trabajador_id,
+    _m004_totales_semana,
+    _m005_borrado_en_cascada,
+    _m006_busqueda_trabajadores,
+    _m007_instantaneas,
+    _m008_diario_cambios,
+]
+
+_migradas: set[str] = set()
+_migradas_lock = threading.Lock()
+
+
+def version_schema(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _migrar(conn: sqlite3.Connection) -> None:
+    conn.commit()
+    # foreign_keys no se puede cambiar dentro de una transacción (necesario para reconstruir tablas)
+    conn.execute("PRAGMA foreign_keys=OFF")
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            actual = version_schema(conn)  # otro proceso pudo migrar mientras esperábamos el lock
+            for version, migracion in enumerate(MIGRACIONES[actual:], start=actual + 1):
+                migracion(conn)
+                conn.execute(f"PRAGMA user_version={version}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute("PRAGMA foreign_keys=ON")
+
+
+def init_db(ruta: str | None = None) -> None:
+    """Aplica las migraciones pendientes a la DB actual (o `ruta`); una sola vez por proceso y DB."""
+    ruta = str(ruta or ruta_actual())
+    if ruta in _migradas:
+        return
+    with _migradas_lock:
+        if ruta in _migradas:
+            return
+        Path(ruta).parent.mkdir(parents=True, exist_ok=True)
+        with get_conn(ruta) as conn:
+            if version_schema(conn) < len(MIGRACIONES):
+                _migrar(conn)
+                _pool_actual(ruta).marcar_escritura()
+        _migradas.add(ruta)
+
+
+# -------------------- Mantenimiento --------------------
+def verificar_totales(reparar: bool = False) -> list[dict]:
+    """
+    Compara totales_semana con un recálculo desde entradas. Devuelve las diferencias
+    (una por hoja y trabajador, con valores 'tabla' y 'real'); si `reparar`, la reconstruye.
+    """
     with get_conn() as conn:
-        conn.executescript(SCHEMA_SQL)
-        # Migraciones por si la DB ya existía
-        _ensure_column(conn, "trabajadores", "cargo TEXT")
-        _ensure_column(conn, "semanas", "cerrada INTEGER NOT NULL DEFAULT 0")
-        _ensure_column(conn, "entradas", "extra_sabado INTEGER NOT NULL DEFAULT 0")
-        _ensure_column(conn, "entradas", "extra_monto REAL NOT NULL DEFAULT 0")
+        filas = conn.execute(f"""
+            WITH real AS ({TOTALES_DESDE_ENTRADAS})
+            SELECT r.semana_id, r.trabajador_id,
+                   t.dias AS dias_tabla, r.dias AS dias_real,
+                   t.monto_semana AS monto_semana_tabla, r.monto_semana AS monto_semana_real,
+                   t.monto_adicional AS monto_adicional_tabla, r.monto_adicional AS monto_adicional_real
+            FROM real r
+            LEFT JOIN totales_semana t
+                   ON t.semana_id = r.semana_id AND t.trabajador_id = r.trabajador_id
+            WHERE t.semana_id IS NULL
+               OR t.dias <> r.dias
+               OR abs(t.monto_semana - r.monto_semana) > 1e-6
+               OR abs(t.monto_adicional - r.monto_adicional) > 1e-6
+            UNION ALL
+            SELECT t.semana_id, t.trabajador_id,
+                   t.dias, NULL, t.monto_semana, NULL, t.monto_adicional, NULL
+            FROM totales_semana t
+            WHERE NOT EXISTS (SELECT 1 FROM real r
+                              WHERE r.semana_id = t.semana_id AND r.trabajador_id = t.trabajador_id)
+        """).fetchall()
+        if filas and reparar:
+            conn.execute("DELETE FROM totales_semana")
+            conn.execute(f"INSERT INTO totales_semana {TOTALES_DESDE_ENTRADAS}")
+    return [dict(r) for r in filas]
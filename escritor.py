@@ -0,0 +1,218 @@
+"""
+escritor.py — Todas las escrituras del proceso pasan por un único hilo escritor (uno por archivo)
+Lo que se encola mientras se confirma un lote va en la transacción siguiente: un BEGIN IMMEDIATE
+y un COMMIT por lote, un SAVEPOINT por escritura (si una falla, solo se deshace la suya; una
+escritura sola en su lote va sin SAVEPOINT).
+Los lectores siguen en paralelo con sus propias conexiones del pool (WAL).
+"""
+import queue
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from functools import wraps
+
+import db
+
+LOTE_MAX = 64       # escrituras por transacción
+REINTENTOS = 5      # reintentos del lote ante SQLITE_BUSY (otro proceso con el lock de escritura)
+ESPERA_BASE = 0.05  # segundos; backoff exponencial con jitter entre reintentos
+
+_local = threading.local()  # conexión de la transacción en curso (solo en el hilo escritor)
+
+
+def _ocupada(e: BaseException) -> bool:
+    return isinstance(e, sqlite3.OperationalError) and (
+        "locked" in str(e) or "busy" in str(e)
+    )
+
+
+class _Escritor:
+    """Hilo escritor de un archivo SQLite; recibe (fn, args, kwargs, future) por una cola."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self._cola: queue.SimpleQueue = queue.SimpleQueue()
+        self.lotes = 0
+        self.escrituras = 0
+        self.reintentos = 0
+        self._hilo = threading.Thread(target=self._bucle, name=f"escritor[{ruta}]", daemon=True)
+        self._hilo.start()
+
+    def enviar(self, fn, args: tuple, kwargs: dict) -> Future:
+        fut = Future()
+        self._cola.put((fn, args, kwargs, fut))
+        return fut
+
+    def detener(self) -> None:
+        """Termina el hilo después de vaciar lo que ya estaba encolado."""
+        self._cola.put(None)
+        self._hilo.join()
+
+    def _bucle(self) -> None:
+        db.fijar_ruta(self.ruta)  # lo que las escrituras lean sin conn (get_conn()) va a su DB
+        while True:
+            item = self._cola.get()
+            if item is None:
+                return
+            lote = [item]
+            while len(lote) < LOTE_MAX:
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._cola.put(None)  # se atiende después de este lote
+                    break
+                lote.append(item)
+            lote = [it for it in lote if it[3].set_running_or_notify_cancel()]
+            if lote:
+                self._ejecutar(lote)
+
+    def _ejecutar(self, lote: list) -> None:
+        for intento in range(REINTENTOS + 1):
+            try:
+                resultados = self._transaccion(lote)
+                break
+            except Exception as e:
+                if _ocupada(e) and intento < REINTENTOS:
+                    self.reintentos += 1
+                    time.sleep(ESPERA_BASE * (2 ** intento) * (0.5 + random.random()))
+                    continue
+                for *_, fut in lote:
+                    fut.set_exception(e)
+                return
+        self.lotes += 1
+        self.escrituras += len(lote)
+        # Los futures se resuelven después del COMMIT: quien espera ya ve sus cambios
+        for (*_, fut), (ok, valor) in zip(lote, resultados):
+            if ok:
+                fut.set_result(valor)
+            else:
+                fut.set_exception(valor)
+
+    def _transaccion(self, lote: list) -> list:
+        resultados = []
+        # Tablas declaradas por las escrituras del lote (None si alguna no declaró): el commit
+        # invalida solo las lecturas cacheadas de esas tablas. Las escrituras anidadas agregan
+        # las suyas a este mismo conjunto, que get_conn lee al confirmar.
+        tablas = set()
+        for fn, *_ in lote:
+            if tablas is not None:
+                tablas = None if getattr(fn, "tablas", None) is None else tablas | set(fn.tablas)
+        with db.get_conn(self.ruta, tablas) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            _local.conn = conn
+            _local.tablas = tablas
+            try:
+                if len(lote) == 1:
+                    # Sola en su lote no necesita SAVEPOINT (si falla se deshace la transacción
+                    # entera). Además lo evita a propósito: con temp_store=MEMORY el subjournal del
+                    # savepoint vuelve cuadráticas las escrituras masivas (importador.py).
+                    fn, args, kwargs, _ = lote[0]
+                    try:
+                        resultados.append((True, fn(conn, *args, **kwargs)))
+                    except Exception as e:
+                        if _ocupada(e):
+                            raise
+                        conn.rollback()
+                        resultados.append((False, e))
+                    return resultados
+                for fn, args, kwargs, _ in lote:
+                    conn.execute("SAVEPOINT escritura")
+                    try:
+                        valor = fn(conn, *args, **kwargs)
+                    except Exception as e:
+                        if _ocupada(e):
+                            raise  # se reintenta el lote entero
+                        conn.execute("ROLLBACK TO escritura")
+                        resultados.append((False, e))
+                    else:
+                        resultados.append((True, valor))
+                    conn.execute("RELEASE escritura")
+            finally:
+                _local.conn = _local.tablas = None
+        return resultados
+
+
+_escritores: dict[str, _Escritor] = {}
+_escritores_lock = threading.Lock()
+
+
+def escritor_actual() -> _Escritor:
+    ruta = str(db.ruta_actual())
+    esc = _escritores.get(ruta)
+    if esc is None:
+        with _escritores_lock:
+            esc = _escritores.get(ruta)
+            if esc is None:
+                esc = _escritores[ruta] = _Escritor(ruta)
+    return esc
+
+
+def enviar(fn, *args, **kwargs) -> Future:
+    """Encola fn(conn, *args, **kwargs) para el hilo escritor de la DB actual; devuelve su Future."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        # Escritura anidada (desde otra escritura): corre en la misma transacción, sin encolar
+        if _local.tablas is not None:
+            if getattr(fn, "tablas", None) is None:
+                # No declaró tablas: el commit del lote debe invalidar todas
+                _local.tablas.update(r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'"))
+            else:
+                _local.tablas.update(fn.tablas)
+        fut = Future()
+        try:
+            fut.set_result(fn(conn, *args, **kwargs))
+        except Exception as e:
+            fut.set_exception(e)
+        return fut
+    return escritor_actual().enviar(fn, args, kwargs)
+
+
+def escribir(fn, *args, **kwargs):
+    """Como enviar, pero espera el resultado (o relanza la excepción de fn)."""
+    return enviar(fn, *args, **kwargs).result()
+
+
+def escritura(fn=None, *, tablas=None):
+    """
+    Decorador para funciones fn(conn, ...) que escriben: llamarla como fn(...) (sin conn) la
+    ejecuta en el hilo escritor y devuelve su resultado. fn no debe hacer commit ni BEGIN.
+    `tablas` son las que modifica (sin contar triggers/cascadas, ver db.TABLAS_DERIVADAS);
+    sin ellas, su commit invalida todas las lecturas cacheadas.
+    """
+    if fn is None:
+        return lambda f: escritura(f, tablas=tablas)
+    fn.tablas = tablas
+
+    @wraps(fn)
+    def envoltura(*args, **kwargs):
+        return escribir(fn, *args, **kwargs)
+
+    envoltura.enviar = lambda *args, **kwargs: enviar(fn, *args, **kwargs)
+    envoltura.tablas = tablas
+    return envoltura
+
+
+def detener() -> None:
+    """Detiene los hilos escritores (vaciando sus colas); se vuelven a crear al escribir."""
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+        _escritores.clear()
+    for esc in escritores:
+        esc.detener()
+
+
+def stats() -> dict:
+    with _escritores_lock:
+        escritores = list(_escritores.values())
+    lotes = sum(e.lotes for e in escritores)
+    escrituras = sum(e.escrituras for e in escritores)
+    return {
+        "lotes": lotes,
+        "escrituras": escrituras,
+        "por_lote": (escrituras / lotes) if lotes else 0.0,
+        "reintentos": sum(e.reintentos for e in escritores),
+    }
@@ -0,0 +1,302 @@
+"""
+historial.py — Historial de cada trabajador entre semanas sobre una caché columnar (NumPy + memmap)
+La caché tiene una fila por entrada con trabajador_id, fecha (ordinal), peso (+1/-1), monto y
+adicional ya filtrados como en totales_semana (monto Lun–Sáb, adicional solo sábado). Vive en
+data/historial/<db>_<seq>/<columna>.npy y se abre con mmap (los procesos comparten las páginas);
+<db>.json apunta a la versión vigente y se reemplaza de forma atómica.
+
+Se refresca de forma incremental con el diario de cambios (tabla cambios) desde su marca (seq):
+un insert agrega una fila +1, un delete una -1 con los montos en negativo y un update ambas, así
+que las sumas (bincount) dan lo mismo que sobre las filas vivas. Cuando las filas sobrantes pasan
+de COMPACTAR, se agrupan por (trabajador, fecha) con reduceat. Si el diario no alcanza (podado,
+restauración, nombre que ya no se puede resolver) o el delta es muy grande, se reconstruye desde
+entradas (vivas y archivadas).
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import db
+
+CARPETA_HISTORIAL = "historial"
+COLUMNAS = {"trabajador": np.int32, "fecha": np.int32, "peso": np.int8, "monto": np.float64, "adicional": np.float64}
+COMPACTAR = 1.5       # compacta cuando las filas guardadas superan 1.5 × las vivas
+DELTA_MAX = 0.5       # un delta de más de la mitad de las filas vivas: se reconstruye (es más barato)
+ORDINAL_1970 = date(1970, 1, 1).toordinal()
+JULIANO_ORDINAL = 1721424.5  # julianday(fecha) - esto = date.toordinal()
+
+
+class _Reconstruir(Exception):
+    """El diario no alcanza para refrescar de forma incremental."""
+
+
+def _vacias() -> dict:
+    return {c: np.empty(0, dtype=t) for c, t in COLUMNAS.items()}
+
+
+def _columnas(trabajador, fecha, peso, monto, extra) -> dict:
+    """Columnas de la caché desde filas crudas: aplica las reglas de totales_semana por día de la semana."""
+    fecha = np.asarray(fecha, dtype=np.int32)
+    dow = (fecha - 1) % 7  # ordinal 1 (0001-01-01) fue lunes: 0 = lunes … 6 = domingo
+    peso = np.asarray(peso, dtype=np.int8)
+    return {
+        "trabajador": np.asarray(trabajador, dtype=np.int32),
+        "fecha": fecha,
+        "peso": peso,
+        "monto": np.where(dow < 6, np.asarray(monto, dtype=np.float64), 0.0) * peso,
+        "adicional": np.where(dow == 5, np.asarray(extra, dtype=np.float64), 0.0) * peso,
+    }
+
+
+def _compactar(cols: dict) -> dict:
+    """Una fila por (trabajador, fecha) con la suma de sus filas; descarta las que se anulan."""
+    if not len(cols["peso"]):
+        return cols
+    orden = np.lexsort((cols["fecha"], cols["trabajador"]))
+    trab, fecha = cols["trabajador"][orden], cols["fecha"][orden]
+    clave = trab.astype(np.int64) << 32 | fecha.astype(np.int64)
+    inicios = np.flatnonzero(np.r_[True, clave[1:] != clave[:-1]])
+    sumas = {c: np.add.reduceat(cols[c][orden].astype(np.float64), inicios) for c in ("peso", "monto", "adicional")}
+    vivas = sumas["peso"] != 0
+    return {
+        "trabajador": trab[inicios][vivas],
+        "fecha": fecha[inicios][vivas],
+        "peso": sumas["peso"][vivas].astype(np.int8),
+        "monto": sumas["monto"][vivas],
+        "adicional": sumas["adicional"][vivas],
+    }
+
+
+class _Cache:
+    """Caché columnar de una DB; `columnas()` la refresca (si la DB cambió) y la devuelve."""
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        base = Path(ruta)
+        self.carpeta = base.parent / CARPETA_HISTORIAL
+        self.puntero = self.carpeta / f"{base.stem}.json"
+        self.cols: dict | None = None
+        self.meta: dict = {}
+        self._gen = None
+        self._lock = threading.Lock()
+        self.refrescos = {"incremental": 0, "reconstruccion": 0, "ultimo_ms": 0.0}
+
+    def columnas(self) -> dict:
+        gen = db.generacion(("cambios",), self.ruta)
+        if self.cols is not None and gen == self._gen:
+            return self.cols
+        with self._lock:
+            if self.cols is None or gen != self._gen:
+                t0 = time.perf_counter()
+                self._refrescar()
+                self.refrescos["ultimo_ms"] = (time.perf_counter() - t0) * 1000
+                self._gen = gen
+        return self.cols
+
+    # ----- disco -----
+    def _cargar(self) -> bool:
+        try:
+            meta = json.loads(self.puntero.read_text(encoding="utf-8"))
+            d = self.carpeta / meta["version"]
+            cols = {c: np.load(d / f"{c}.npy", mmap_mode="r") for c in COLUMNAS}
+        except (OSError, ValueError, KeyError):
+            return False
+        if any(len(v) != meta["filas"] for v in cols.values()):
+            return False
+        self.cols, self.meta = cols, meta
+        return True
+
+    def _guardar(self, cols: dict, meta: dict) -> None:
+        version = f"{Path(self.ruta).stem}_{meta['seq']}_{time.time_ns()}"
+        tmp = self.carpeta / f".{version}.tmp"
+        tmp.mkdir(parents=True)
+        for c, t in COLUMNAS.items():
+            np.save(tmp / f"{c}.npy", np.ascontiguousarray(cols[c], dtype=t))
+        tmp.rename(self.carpeta / version)
+        meta = {**meta, "version": version, "filas": int(len(cols["peso"]))}
+        puntero_tmp = self.puntero.with_suffix(f".{os.getpid()}.tmp")
+        puntero_tmp.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(puntero_tmp, self.puntero)
+        anterior = self.meta.get("version")
+        self.meta = meta
+        self.cols = {c: np.load(self.carpeta / version / f"{c}.npy", mmap_mode="r") for c in COLUMNAS}
+        # Las versiones viejas se borran; un lector con mmap abierto las sigue viendo hasta soltarlas
+        if anterior and anterior != version:
+            shutil.rmtree(self.carpeta / anterior, ignore_errors=True)
+
+    # ----- refresco -----
+    def _estado_diario(self, conn) -> dict:
+        local = dict(conn.execute("SELECT clave, valor FROM sync_local").fetchall())
+        return {
+            "seq": conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0],
+            "podado": int(local.get("podado") or 0),
+            "restaurado": local.get("restaurado"),
+        }
+
+    def _refrescar(self) -> None:
+        if self.cols is None:
+            self._cargar()
+        with db.get_conn(self.ruta) as conn:
+            conn.execute("BEGIN")  # una sola foto: marca del diario y filas leídas coinciden
+            diario = self._estado_diario(conn)
+            meta = self.meta
+            if self.cols is not None and meta.get("seq") == diario["seq"] and meta.get("restaurado") == diario["restaurado"]:
+                return
+            try:
+                if (
+                    self.cols is None
+                    or meta.get("restaurado") != diario["restaurado"]
+                    or diario["podado"] > meta["seq"]
+                    or diario["seq"] < meta["seq"]
+                ):
+                    raise _Reconstruir
+                delta = self._delta(conn, meta["seq"], diario["seq"])
+            except _Reconstruir:
+                cols = self._reconstruir(conn)
+                self.refrescos["reconstruccion"] += 1
+            else:
+                cols = {c: np.concatenate([self.cols[c], delta[c]]) for c in COLUMNAS}
+                if len(cols["peso"]) > COMPACTAR * max(int(cols["peso"].sum(dtype=np.int64)), 1) + 1000:
+                    cols = _compactar(cols)
+                self.refrescos["incremental"] += 1
+        self._guardar(cols, {"seq": diario["seq"], "restaurado": diario["restaurado"]})
+
+    def _reconstruir(self, conn) -> dict:
+        cur = conn.cursor()
+        cur.row_factory = None  # tuplas: fromiter las vuelca directo al arreglo
+        filas = np.fromiter(
+            cur.execute(
+                f"SELECT trabajador_id, CAST(julianday(fecha) - {JULIANO_ORDINAL} AS INTEGER), monto, extra_monto "
+                "FROM todas_entradas"
+            ),
+            dtype=[("trabajador", "i4"), ("fecha", "i4"), ("monto", "f8"), ("extra", "f8")],
+        )
+        return _columnas(filas["trabajador"], filas["fecha"], np.ones(len(filas)), filas["monto"], filas["extra"])
+
+    def _ids(self, conn, desde: int) -> dict:
+        """nombre → trabajador_id, incluidos los nombres viejos de los renombrados después de `desde`."""
+        ids = {r[1]: r[0] for r in conn.execute("SELECT id, nombre FROM trabajadores")}
+        cambios = conn.execute(
+            "SELECT op, json_extract(antes, '$.nombre'), json_extract(despues, '$.nombre') FROM cambios "
+            "WHERE tabla='trabajadores' AND seq > ? AND op <> 'I' ORDER BY seq DESC",
+            (desde,),
+        ).fetchall()
+        for op, antes, despues in cambios:
+            if op == "D" or (antes in ids and antes != despues):
+                raise _Reconstruir  # borrado o nombre reusado: el nombre ya no dice de quién era
+            if antes != despues:
+                ids[antes] = ids[despues]
+        return ids
+
+    def _delta(self, conn, desde: int, hasta: int) -> dict:
+        n = conn.execute(
+            "SELECT COUNT(*) FROM cambios WHERE tabla='entradas' AND seq > ? AND seq <= ?", (desde, hasta)
+        ).fetchone()[0]
+        if n > DELTA_MAX * max(len(self.cols["peso"]), 1) and n > 1000:
+            raise _Reconstruir
+        campos = ", ".join(
+            f"json_extract({lado}, '$.trabajador'), CAST(julianday(json_extract({lado}, '$.fecha')) - {JULIANO_ORDINAL} AS INTEGER), "
+            f"json_extract({lado}, '$.monto'), json_extract({lado}, '$.extra_monto')"
+            for lado in ("antes", "despues")
+        )
+        df = pd.DataFrame(
+            conn.execute(f"SELECT {campos} FROM cambios WHERE tabla='entradas' AND seq > ? AND seq <= ?", (desde, hasta)).fetchall(),
+            columns=["t0", "f0", "m0", "e0", "t1", "f1", "m1", "e1"],
+        )
+        if df.empty:
+            return _vacias()
+        ids = self._ids(conn, desde)
+        # Updates que no tocan nada de lo que se suma (p. ej. solo la actividad): no dejan filas
+        igual = (df["t0"] == df["t1"]) & (df["f0"] == df["f1"]) & (df["m0"] == df["m1"]) & (df["e0"] == df["e1"])
+        df = df[~igual]
+        partes = []
+        for lado, peso in (("0", -1), ("1", 1)):
+            p = df[df[f"t{lado}"].notna()]
+            trab = p[f"t{lado}"].map(ids)
+            if trab.isna().any():
+                raise _Reconstruir
+            partes.append(_columnas(trab.to_numpy(), p[f"f{lado}"].to_numpy(), np.full(len(p), peso),
+                                    p[f"m{lado}"].to_numpy(), p[f"e{lado}"].to_numpy()))
+        return {c: np.concatenate([partes[0][c], partes[1][c]]) for c in COLUMNAS}
+
+
+_caches: dict[str, _Cache] = {}
+_caches_lock = threading.Lock()
+
+
+def cache_actual() -> _Cache:
+    ruta = str(db.ruta_actual())
+    c = _caches.get(ruta)
+    if c is None:
+        with _caches_lock:
+            c = _caches.setdefault(ruta, _Cache(ruta))
+    return c
+
+
+# -------------------- Agregaciones (vectorizadas) --------------------
+def _rango(cols: dict, desde: date | None, hasta: date | None):
+    if desde is None and hasta is None:
+        return slice(None)  # todo el historial: sin máscara (ni copias)
+    m = np.ones(len(cols["fecha"]), dtype=bool)
+    if desde is not None:
+        m &= cols["fecha"] >= desde.toordinal()
+    if hasta is not None:
+        m &= cols["fecha"] <= hasta.toordinal()
+    return m
+
+
+def _sumas(indice: np.ndarray, cols: dict, m: np.ndarray, n: int) -> dict:
+    peso = cols["peso"][m].astype(np.float64)
+    return {
+        "dias": np.bincount(indice, weights=peso, minlength=n).round().astype(np.int64),
+        "monto": np.bincount(indice, weights=cols["monto"][m], minlength=n),
+        "adicional": np.bincount(indice, weights=cols["adicional"][m], minlength=n),
+        # Sábados con adicional: la fila -1 de un adicional borrado resta el suyo
+        "sabados_adicional": np.bincount(indice, weights=peso * (cols["adicional"][m] != 0), minlength=n).round().astype(np.int64),
+    }
+
+
+def serie(trabajador_id: int, desde: date | None = None, hasta: date | None = None, periodo: str = "mes") -> pd.DataFrame:
+    """
+    Por mes (o semana, lunes) en que trabajó: dias, monto, adicional, total y sabados_adicional.
+    Índice: primer día del periodo.
+    """
+    cols = cache_actual().columnas()
+    m = cols["trabajador"] == int(trabajador_id)
+    if desde is not None or hasta is not None:
+        m &= _rango(cols, desde, hasta)
+    fechas = cols["fecha"][m].astype(np.int64)
+    if periodo == "semana":
+        inicio = fechas - (fechas - 1) % 7
+    else:
+        dias = (fechas - ORDINAL_1970).astype("datetime64[D]")
+        inicio = dias.astype("datetime64[M]").astype("datetime64[D]").astype(np.int64) + ORDINAL_1970
+    periodos, indice = np.unique(inicio, return_inverse=True)
+    s = _sumas(indice, cols, m, len(periodos))
+    df = pd.DataFrame(s, index=pd.Index([date.fromordinal(int(p)) for p in periodos], name="periodo"))
+    df["total"] = df["monto"] + df["adicional"]
+    return df[df["dias"] != 0][["dias", "monto", "adicional", "total", "sabados_adicional"]]
+
+
+def resumen(desde: date | None = None, hasta: date | None = None) -> pd.DataFrame:
+    """Por trabajador (índice trabajador_id) en el rango: dias, monto, adicional, total, sabados_adicional."""
+    cols = cache_actual().columnas()
+    m = _rango(cols, desde, hasta)
+    trab = cols["trabajador"][m]
+    n = int(trab.max()) + 1 if len(trab) else 0
+    s = _sumas(trab, cols, m, n)
+    df = pd.DataFrame(s, index=pd.RangeIndex(n, name="trabajador_id"))
+    df["total"] = df["monto"] + df["adicional"]
+    return df[df["dias"] != 0][["dias", "monto", "adicional", "total", "sabados_adicional"]]
+
+
+def filas() -> int:
+    """Filas de la caché (incluye las -1 pendientes de compactar)."""
+    return len(cache_actual().columnas()["peso"])
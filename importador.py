@@ -0,0 +1,360 @@
+"""
+importador.py — Carga masiva de registros históricos desde CSV/Excel (validación vectorizada)
+Acepta dos formas de archivo:
+  · registros: una fila por día y trabajador (fecha, trabajador, cargo, actividad, monto,
+    extra_monto), como los registros de la app; semana_inicio es opcional.
+  · grilla: una fila por trabajador con columnas Lunes..Sábado y "Adicional sábado", como la
+    grilla semanal; la hoja sale de la columna semana_inicio o de --semana.
+Las hojas (semanas) y los trabajadores que falten se crean en bloque; las entradas se
+insertan/actualizan con executemany en transacciones de LOTE filas (hilo escritor). Las filas
+inválidas no se cargan: van al reporte de errores con su número de fila en el archivo.
+
+    python importador.py historico.csv
+    python importador.py grilla.xlsx --semana 2024-03-04 --errores errores.csv
+"""
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import db
+from datos import COL_ADICIONAL, DIAS
+from escritor import escritura
+
+LOTE = 50_000  # entradas por transacción (entre lote y lote pasan las demás escrituras)
+
+# Encabezados aceptados (sin distinguir mayúsculas) → nombre interno
+ALIAS = {
+    "fecha": "fecha",
+    "trabajador": "trabajador", "nombre": "trabajador",
+    "cargo": "cargo",
+    "actividad": "actividad",
+    "monto": "monto", "monto del día": "monto", "monto del día (s/)": "monto",
+    "extra_monto": "extra_monto", "monto adicional": "extra_monto", COL_ADICIONAL.lower(): "extra_monto",
+    "semana_inicio": "semana_inicio", "semana": "semana_inicio",
+    **{d.lower(): d for d in DIAS},
+}
+COLUMNAS_ERRORES = ["fila", "error"]
+
+
+# -------------------- Lectura --------------------
+def leer(origen, nombre: str | None = None) -> pd.DataFrame:
+    """CSV o Excel (por extensión de `nombre` o de la ruta) como texto, con encabezados normalizados."""
+    nombre = str(nombre or origen)
+    if nombre.lower().endswith((".xlsx", ".xlsm", ".xls")):
+        try:
+            df = pd.read_excel(origen, dtype=object)
+        except ImportError as e:
+            raise RuntimeError("Para importar Excel instala openpyxl (pip install openpyxl).") from e
+    else:
+        df = pd.read_csv(origen, dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    df.columns = [ALIAS.get(str(c).strip().lower(), str(c).strip()) for c in df.columns]
+    df.index = pd.RangeIndex(2, len(df) + 2)  # número de fila en el archivo (1 = encabezado)
+    return df
+
+
+# -------------------- Validación (vectorizada) --------------------
+def _fechas(col: pd.Series) -> pd.Series:
+    """ISO (o fecha de Excel) primero; lo que no, como dd/mm/aaaa. Inválidas → NaT."""
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.normalize()
+    texto = col.astype(str).str.strip()
+    fechas = pd.to_datetime(texto, format="ISO8601", errors="coerce")
+    faltan = fechas.isna() & texto.ne("")
+    if faltan.any():
+        fechas[faltan] = pd.to_datetime(texto[faltan], format="%d/%m/%Y", errors="coerce")
+    return fechas.dt.normalize()
+
+
+def _montos(df: pd.DataFrame, col: str) -> pd.Series:
+    """Columna numérica; vacía o ausente → NaN (texto no numérico queda marcado aparte)."""
+    if col not in df:
+        return pd.Series(np.nan, index=df.index)
+    valores = df[col]
+    if valores.dtype == object or pd.api.types.is_string_dtype(valores):
+        valores = valores.astype(str).str.strip().str.replace(",", ".", regex=False).replace({"": None, "nan": None})
+    return pd.to_numeric(valores, errors="coerce")
+
+
+def _texto(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df:
+        return pd.Series("", index=df.index, dtype=object)
+    return df[col].fillna("").astype(str).str.strip()
+
+
+def _no_numerico(df: pd.DataFrame, col: str, montos: pd.Series) -> pd.Series:
+    """Celdas con texto que no es número (las vacías no cuentan)."""
+    if col not in df:
+        return pd.Series(False, index=df.index)
+    texto = _texto(df, col).str.lower()
+    return montos.isna() & texto.ne("") & texto.ne("nan")
+
+
+def _de_grilla(df: pd.DataFrame, semana: date | None) -> tuple[pd.DataFrame, list]:
+    """Grilla (trabajador × Lunes..Sábado) → una fila por celda con monto o adicional."""
+    if "semana_inicio" in df:
+        inicio = _fechas(df["semana_inicio"])
+    elif semana is not None:
+        inicio = pd.Series(pd.Timestamp(semana), index=df.index)
+    else:
+        raise ValueError("La grilla no tiene columna semana_inicio: indica la semana (lunes) de la hoja.")
+    # Como monday_of_week: cualquier día de la semana apunta a su lunes
+    inicio = inicio - pd.to_timedelta(inicio.dt.weekday, unit="D")
+
+    dias = [d for d in DIAS if d in df]
+    montos = pd.DataFrame({d: _montos(df, d) for d in dias}, index=df.index)
+    extra = _montos(df, "extra_monto")
+    no_numerico = pd.concat(
+        [_no_numerico(df, d, montos[d]) for d in dias] + [_no_numerico(df, "extra_monto", extra)], axis=1
+    ).any(axis=1)
+    errores = [(df.index[inicio.isna()], "semana_inicio inválida"), (df.index[no_numerico], "monto no numérico")]
+    ok = inicio.notna() & ~no_numerico
+
+    # Una fila por celda con valor; el adicional va en el registro del sábado (monto 0 si está vacío)
+    montos = montos.reindex(columns=list(DIAS))[ok]
+    largo = montos.stack(future_stack=True).rename("monto").reset_index()
+    largo.columns = ["fila", "dia", "monto"]
+    dow = largo["dia"].map({d: i for i, d in enumerate(DIAS)}).to_numpy()
+    filas = largo["fila"].to_numpy()
+    largo["extra_monto"] = np.where(dow == 5, extra.reindex(filas).to_numpy(), np.nan)
+    con_valor = (largo["monto"].notna() | (largo["extra_monto"].fillna(0) > 0)).to_numpy()
+    filas, dow = filas[con_valor], dow[con_valor]
+    largo = largo[con_valor]
+    return pd.DataFrame({
+        "fila": filas,
+        "semana_inicio": inicio.reindex(filas).to_numpy(),
+        "fecha": inicio.reindex(filas).to_numpy() + pd.to_timedelta(dow, unit="D").to_numpy(),
+        "trabajador": _texto(df, "trabajador").reindex(filas).to_numpy(),
+        "cargo": _texto(df, "cargo").reindex(filas).to_numpy(),
+        "actividad": "",
+        "monto": largo["monto"].fillna(0.0).to_numpy(),
+        "extra_monto": largo["extra_monto"].fillna(0.0).to_numpy(),
+    }, index=filas), errores
+
+
+def _de_registros(df: pd.DataFrame) -> tuple[pd.DataFrame, list]:
+    """Una fila por día y trabajador (como los registros de la app)."""
+    if "fecha" not in df:
+        raise ValueError("El archivo no tiene columna 'fecha' ni columnas Lunes..Sábado.")
+    fecha = _fechas(df["fecha"])
+    monto, extra = _montos(df, "monto"), _montos(df, "extra_monto")
+    no_numerico = _no_numerico(df, "monto", monto) | _no_numerico(df, "extra_monto", extra)
+    reglas = [
+        (fecha.isna(), "fecha inválida"),
+        (monto.isna() & ~no_numerico, "monto vacío"),
+        (no_numerico, "monto no numérico"),
+    ]
+    if "semana_inicio" in df:
+        # La hoja declarada en el archivo debe contener la fecha (Lun–Sáb de esa semana)
+        declarada = _fechas(df["semana_inicio"])
+        fuera = declarada.notna() & fecha.notna() & ((fecha < declarada) | (fecha > declarada + pd.Timedelta(days=5)))
+        reglas.append((fuera, "fecha fuera de la hoja (Lun–Sáb de semana_inicio)"))
+    ok = pd.Series(True, index=df.index)
+    for mascara, _ in reglas:
+        ok &= ~mascara
+    return pd.DataFrame({
+        "fila": df.index,
+        "semana_inicio": fecha - pd.to_timedelta(fecha.dt.weekday, unit="D"),
+        "fecha": fecha,
+        "trabajador": _texto(df, "trabajador"),
+        "cargo": _texto(df, "cargo"),
+        "actividad": _texto(df, "actividad"),
+        "monto": monto,
+        "extra_monto": extra.fillna(0.0),
+    }, index=df.index)[ok], [(df.index[m], t) for m, t in reglas]
+
+
+def validar(df: pd.DataFrame, semana: date | None = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Normaliza `df` (de leer) a una fila por día y trabajador y la valida entera con operaciones
+    de columna. Devuelve (válidas, errores): válidas con fila, semana_inicio, semana_fin, fecha
+    (ISO), trabajador, cargo, actividad, monto, extra_monto; errores con fila y error.
+    """
+    largo, errores = _de_grilla(df, semana) if any(d in df for d in DIAS) else _de_registros(df)
+
+    dow = largo["fecha"].dt.weekday
+    reglas = [
+        (largo["trabajador"].eq(""), "trabajador vacío"),
+        (dow.eq(6), "domingo: la hoja es de Lunes a Sábado"),
+        ((largo["monto"] < 0) | (largo["extra_monto"] < 0), "monto negativo"),
+        (dow.ne(5) & (largo["extra_monto"] > 0), "adicional fuera de sábado"),
+    ]
+    malas = pd.Series(False, index=largo.index)
+    for mascara, texto in reglas:
+        errores.append((largo.index[mascara], texto))
+        malas |= mascara
+    largo = largo[~malas.to_numpy()]
+
+    # Repetidas (misma hoja, trabajador y día): gana la última del archivo
+    repetida = largo.duplicated(["fecha", "trabajador"], keep="last")
+    errores.append((largo.index[repetida.to_numpy()], "repetida (se usa la última fila con ese trabajador y fecha)"))
+    largo = largo[~repetida.to_numpy()].copy()
+
+    largo["semana_fin"] = (largo["semana_inicio"] + pd.Timedelta(days=5)).dt.strftime("%Y-%m-%d")
+    largo["semana_inicio"] = largo["semana_inicio"].dt.strftime("%Y-%m-%d")
+    largo["fecha"] = largo["fecha"].dt.strftime("%Y-%m-%d")
+    return largo.reset_index(drop=True), _errores(errores)
+
+
+def _errores(errores: list) -> pd.DataFrame:
+    partes = [pd.DataFrame({"fila": np.asarray(filas, dtype=int), "error": texto}) for filas, texto in errores if len(filas)]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_ERRORES)
+    # Una fila de la grilla puede fallar en varias celdas: un error por fila y motivo
+    return pd.concat(partes, ignore_index=True).drop_duplicates().sort_values("fila", kind="stable").reset_index(drop=True)
+
+
+# -------------------- Escritura en bloque --------------------
+# La hoja de cada lunes se busca solo por semana_inicio: las antiguas terminan en domingo (Lun–Dom)
+# y también contienen los días Lun–Sáb del archivo. Si hay las dos, MIN(semana_fin) elige la
+# Lun–Sáb (en SQLite, las demás columnas de un SELECT con MIN() salen de la fila del mínimo).
+def _hojas_existentes(inicios: list[str]) -> pd.DataFrame:
+    """Hojas (vivas y archivadas) de esos lunes: semana_inicio, cerrada, archivada."""
+    with db.get_conn() as conn:
+        filas = conn.execute(
+            """
+            SELECT semana_inicio, cerrada, esquema <> 'main' AS archivada, MIN(semana_fin)
+            FROM todas_semanas
+            WHERE semana_inicio IN (SELECT value FROM json_each(?))
+            GROUP BY semana_inicio
+            """,
+            (json.dumps(inicios),),
+        ).fetchall()
+    return pd.DataFrame([tuple(r)[:3] for r in filas], columns=["semana_inicio", "cerrada", "archivada"])
+
+
+@escritura(tablas=("semanas", "trabajadores"))
+def _crear_hojas_y_trabajadores(conn, semanas: list, trabajadores: list) -> tuple[dict, dict, int, int]:
+    """Crea lo que falte; devuelve ({lunes: semana_id}, {nombre: trabajador_id}, hojas creadas, trabajadores creados)."""
+    lunes = (json.dumps([s[0] for s in semanas]),)
+    nombres = (json.dumps([t[0] for t in trabajadores]),)
+    sql_hojas = (
+        "SELECT id, semana_inicio, MIN(semana_fin) FROM semanas "
+        "WHERE semana_inicio IN (SELECT value FROM json_each(?)) GROUP BY semana_inicio"
+    )
+    sql_ids = "SELECT id, nombre FROM trabajadores WHERE nombre IN (SELECT value FROM json_each(?))"
+    hojas_antes = {r["semana_inicio"] for r in conn.execute(sql_hojas, lunes)}
+    ids_antes = len(conn.execute(sql_ids, nombres).fetchall())
+    conn.executemany(
+        "INSERT OR IGNORE INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,'—',0)",
+        [h for h in semanas if h[0] not in hojas_antes],
+    )
+    conn.executemany("INSERT OR IGNORE INTO trabajadores(nombre, cargo) VALUES (?,?)", trabajadores)
+    hojas = {r["semana_inicio"]: r["id"] for r in conn.execute(sql_hojas, lunes)}
+    ids = {r["nombre"]: r["id"] for r in conn.execute(sql_ids, nombres)}
+    return hojas, ids, len(hojas) - len(hojas_antes), len(ids) - ids_antes
+
+
+@escritura(tablas=("entradas",))
+def _upsert_entradas(conn, filas: list) -> tuple[int, list[int]]:
+    """
+    Upsert de un lote; omite las filas de hojas que se cerraron desde la validación.
+    Devuelve (importadas, posiciones en el lote de las omitidas).
+    """
+    cerradas = {r[0] for r in conn.execute(
+        "SELECT id FROM semanas WHERE cerrada=1 AND id IN (SELECT value FROM json_each(?))",
+        (json.dumps(sorted({f[0] for f in filas})),),
+    )}
+    omitidas = [i for i, f in enumerate(filas) if f[0] in cerradas]
+    if omitidas:
+        filas = [f for f in filas if f[0] not in cerradas]
+    conn.executemany(
+        """
+        INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, actividad, monto, extra_sabado, extra_monto)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(semana_id, trabajador_id, fecha) DO UPDATE SET
+          actividad=excluded.actividad,
+          monto=excluded.monto,
+          extra_sabado=excluded.extra_sabado,
+          extra_monto=excluded.extra_monto
+        """,
+        filas,
+    )
+    return len(filas), omitidas
+
+
+def importar(df: pd.DataFrame, semana: date | None = None, lote: int = LOTE) -> dict:
+    """
+    Valida `df` (de leer) y carga las filas válidas. Las de hojas cerradas o archivadas se
+    rechazan. Devuelve {'filas', 'importadas', 'hojas_creadas', 'trabajadores_creados',
+    'errores' (DataFrame fila/error), 'segundos'}.
+    """
+    t0 = time.perf_counter()
+    validas, errores = validar(df, semana)
+
+    existentes = _hojas_existentes(sorted(validas["semana_inicio"].unique()))
+    estado = validas[["semana_inicio"]].merge(existentes, on="semana_inicio", how="left")
+    archivada = estado["archivada"].fillna(0).astype(bool).to_numpy()
+    cerrada = estado["cerrada"].fillna(0).astype(bool).to_numpy() & ~archivada
+    errores = pd.concat([
+        errores,
+        pd.DataFrame({"fila": validas["fila"][archivada], "error": "hoja archivada (solo lectura)"}),
+        pd.DataFrame({"fila": validas["fila"][cerrada], "error": "hoja cerrada"}),
+    ], ignore_index=True).drop_duplicates().sort_values("fila", kind="stable").reset_index(drop=True)
+    validas = validas[~(archivada | cerrada)]
+
+    res = {"filas": len(df), "importadas": 0, "hojas_creadas": 0, "trabajadores_creados": 0}
+    if not validas.empty:
+        semanas = validas[["semana_inicio", "semana_fin"]].drop_duplicates()
+        # Cargo de un trabajador nuevo: el de su primera fila con cargo (los existentes no cambian)
+        trabajadores = (validas.assign(vacio=validas["cargo"].eq(""))
+                        .sort_values(["trabajador", "vacio"], kind="stable")
+                        .drop_duplicates("trabajador")[["trabajador", "cargo"]])
+        hojas, ids, res["hojas_creadas"], res["trabajadores_creados"] = _crear_hojas_y_trabajadores(
+            list(semanas.itertuples(index=False, name=None)), list(trabajadores.itertuples(index=False, name=None)),
+        )
+        extra = validas["extra_monto"].astype(float)
+        filas = list(zip(
+            validas["semana_inicio"].map(hojas).astype(int).tolist(),
+            validas["fecha"].tolist(),
+            validas["trabajador"].map(ids).astype(int).tolist(),
+            validas["trabajador"].tolist(),
+            validas["actividad"].tolist(),
+            validas["monto"].astype(float).tolist(),
+            (extra > 0).astype(int).tolist(),
+            extra.tolist(),
+        ))
+        omitidas = []
+        for i in range(0, len(filas), lote):
+            n, pos = _upsert_entradas(filas[i:i + lote])
+            res["importadas"] += n
+            omitidas += [i + j for j in pos]
+        if omitidas:
+            # Hojas que alguien cerró entre la validación y la carga
+            errores = pd.concat([
+                errores, pd.DataFrame({"fila": validas["fila"].iloc[omitidas], "error": "hoja cerrada"}),
+            ], ignore_index=True).sort_values("fila", kind="stable").reset_index(drop=True)
+    res["errores"] = errores
+    res["segundos"] = time.perf_counter() - t0
+    return res
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("archivo", type=Path, help="CSV o Excel (registros o grilla)")
+    p.add_argument("--semana", type=date.fromisoformat, help="lunes de la hoja, para grillas sin semana_inicio")
+    p.add_argument("--errores", type=Path, help="CSV con las filas rechazadas (por defecto <archivo>_errores.csv)")
+    p.add_argument("--db", type=Path, default=db.DB_PATH, help="DB viva (por defecto %(default)s)")
+    args = p.parse_args(argv)
+
+    db.DB_PATH = args.db
+    db.init_db()
+    res = importar(leer(args.archivo), args.semana)
+    print(f"{res['importadas']} de {res['filas']} fila(s) importada(s) en {res['segundos']:.1f} s · "
+          f"{res['hojas_creadas']} hoja(s) y {res['trabajadores_creados']} trabajador(es) nuevo(s)")
+    if not res["errores"].empty:
+        destino = args.errores or args.archivo.with_name(f"{args.archivo.stem}_errores.csv")
+        res["errores"].to_csv(destino, index=False)
+        print(f"{len(res['errores'])} error(es) → {destino}")
+        print(res["errores"]["error"].value_counts().to_string())
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
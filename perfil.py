@@ -0,0 +1,103 @@
+"""
+perfil.py — Perfil de consultas SQL por rerun (opt-in): texto, forma de parámetros, filas y tiempo
+Apagado (lo normal) cuesta una lectura de atributo por cursor; el estado es por hilo, así que
+activarlo en una sesión de Streamlit no afecta a las demás.
+"""
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+# QUALISEM_PERFIL=1 lo activa por defecto en todas las sesiones
+POR_DEFECTO = os.environ.get("QUALISEM_PERFIL", "") not in ("", "0")
+PASOS_POR_AVISO = 1000  # granularidad del progress handler (instrucciones de la VM de SQLite)
+
+_local = threading.local()
+_archivo_lock = threading.Lock()
+
+
+def activo() -> bool:
+    return getattr(_local, "activo", False)
+
+
+def iniciar(activar: bool) -> None:
+    """Empieza un rerun nuevo en este hilo (descarta lo medido antes)."""
+    _local.activo = bool(activar)
+    _local.consultas = []
+    _local.pasos = 0
+    _local.secciones = {}
+    _local.t0 = time.perf_counter()
+
+
+@contextmanager
+def seccion(nombre: str):
+    """Mide una parte del script (un fragmento); guarda su última duración en el rerun en curso."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        if activo():
+            _local.secciones[nombre] = (time.perf_counter() - t0) * 1000
+
+
+def contar_pasos() -> int:
+    """Callback para Connection.set_progress_handler; 0 = no interrumpir."""
+    _local.pasos = getattr(_local, "pasos", 0) + 1
+    return 0
+
+
+def pasos() -> int:
+    return getattr(_local, "pasos", 0)
+
+
+def _forma(params) -> str:
+    if params is None:
+        return "-"
+    try:
+        return f"{type(params).__name__}[{len(params)}]"
+    except TypeError:
+        return type(params).__name__
+
+
+def registrar(sql: str, params, segundos: float, filas: int, pasos_vm: int) -> dict:
+    """Agrega una consulta al rerun en curso; devuelve el registro para sumarle filas/tiempo de fetch."""
+    reg = {
+        "sql": re.sub(r"\s+", " ", sql).strip()[:500],
+        "params": params if isinstance(params, str) else _forma(params),
+        "filas": max(filas, 0),
+        "ms": segundos * 1000,
+        "pasos_vm": pasos_vm * PASOS_POR_AVISO,
+    }
+    if activo():
+        _local.consultas.append(reg)
+    return reg
+
+
+def sumar_fetch(reg: dict, filas: int, segundos: float, pasos_vm: int) -> None:
+    reg["filas"] += filas
+    reg["ms"] += segundos * 1000
+    reg["pasos_vm"] += pasos_vm * PASOS_POR_AVISO
+
+
+def resumen(top: int = 10) -> dict:
+    """Totales del rerun en curso: tiempo en DB, cantidad de consultas y las `top` más lentas."""
+    consultas = list(getattr(_local, "consultas", []))
+    return {
+        "rerun_ms": (time.perf_counter() - getattr(_local, "t0", time.perf_counter())) * 1000,
+        "db_ms": sum(c["ms"] for c in consultas),
+        "consultas": len(consultas),
+        "secciones_ms": dict(getattr(_local, "secciones", {})),
+        "mas_lentas": sorted(consultas, key=lambda c: c["ms"], reverse=True)[:top],
+    }
+
+
+def volcar(ruta: Path, extra: dict | None = None) -> dict:
+    """Agrega el resumen del rerun como una línea JSON a `ruta`; lo devuelve."""
+    res = resumen()
+    linea = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), **(extra or {}), **res}
+    with _archivo_lock, open(ruta, "a", encoding="utf-8") as fh:
+        fh.write(json.dumps(linea, ensure_ascii=False) + "\n")
+    return res
@@ -0,0 +1,128 @@
+"""
+precarga.py — Precarga en segundo plano de las hojas vecinas (navegación ◀ Ant. / Sig. ▶)
+Cuando una hoja termina de mostrarse, app.py pide precargar la anterior y la siguiente: un pool
+de HILOS hilos llama a las mismas lecturas cacheadas de datos.py que usa la página (LECTURAS),
+así que los resultados quedan en cache.CACHE con la clave de siempre (DB, función, argumentos)
+y la generación de datos vigente. Ir a la vecina es un acierto de caché; una escritura posterior
+la invalida como a cualquier otra lectura (y el próximo pedido la vuelve a calcular).
+Cada sesión tiene un solo pedido vivo: uno nuevo cancela lo que el anterior tenía en cola, y las
+tareas que ya corren dejan de leer en cuanto terminan la lectura en curso.
+"""
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import date
+
+import cache
+import datos
+import db
+
+HILOS = 2  # las lecturas sueltan el GIL en SQLite; más hilos compiten con las sesiones
+VECINAS = (-1, +1)  # hoja anterior y siguiente (por fecha de inicio)
+
+# Lo que se muestra de cada hoja al navegar, con los mismos argumentos que usa app.py
+LECTURAS = (
+    lambda h: datos.contar_registros(h["id"]),
+    lambda h: datos.grilla_semana(h["id"]),
+    lambda h: datos.vista_semanal(h["id"], h["semana_inicio"], h["semana_fin"]),
+    lambda h: datos.montos_semana(h["id"]),
+)
+
+
+class _Precargador:
+    def __init__(self, hilos: int = HILOS):
+        self._pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="precarga")
+        self._pedidos: dict[str, tuple[int, list[Future]]] = {}  # sesión → (número de pedido, tareas)
+        self._numeros = itertools.count(1)
+        self._lock = threading.Lock()
+        self.pedidos = 0
+        self.hojas = 0  # hojas vecinas precargadas enteras
+        self.canceladas = 0  # tareas descartadas por un pedido más nuevo de la misma sesión
+        self.errores = 0
+        self.segundos = 0.0
+
+    def pedir(self, sesion: str, semana_inicio: date) -> None:
+        """Precarga las vecinas de la hoja que empieza en `semana_inicio` (en la DB actual)."""
+        ruta = db.ruta_actual()
+        with self._lock:
+            numero = next(self._numeros)
+            anterior = self._pedidos.get(sesion)
+            if anterior is not None:
+                self.canceladas += sum(f.cancel() for f in anterior[1])
+            tareas = []
+            self._pedidos[sesion] = (numero, tareas)  # antes de encolar: las tareas lo consultan al empezar
+            tareas += [self._pool.submit(self._precargar, ruta, sesion, numero, semana_inicio, d) for d in VECINAS]
+            # Las sesiones que ya no piden nada no se acumulan
+            for s in [s for s, (_, ts) in self._pedidos.items() if s != sesion and all(t.done() for t in ts)]:
+                del self._pedidos[s]
+            self.pedidos += 1
+
+    def esperar(self, sesion: str, timeout: float | None = None) -> None:
+        """Espera las tareas del último pedido de `sesion` (benchmarks, pruebas)."""
+        pedido = self._pedidos.get(sesion)
+        if pedido is not None:
+            wait(pedido[1], timeout)
+
+    def _vigente(self, sesion: str, numero: int) -> bool:
+        pedido = self._pedidos.get(sesion)
+        return pedido is not None and pedido[0] == numero
+
+    def _precargar(self, ruta, sesion: str, numero: int, semana_inicio: date, direccion: int) -> None:
+        t0 = time.perf_counter()
+        resultado = None
+        try:
+            with db.usar(ruta), cache.precargando():
+                sid = datos.hoja_vecina(semana_inicio, direccion)
+                if sid is not None:
+                    h = datos.hoja(sid)
+                    resultado = "hojas"
+                    for lectura in LECTURAS:
+                        if not self._vigente(sesion, numero):
+                            resultado = "canceladas"
+                            break
+                        lectura(h)
+        except Exception:  # la precarga es opcional: la página leerá (y mostrará el error) al navegar
+            resultado = "errores"
+        with self._lock:
+            if resultado is not None:
+                setattr(self, resultado, getattr(self, resultado) + 1)
+            self.segundos += time.perf_counter() - t0
+
+    def stats(self) -> dict:
+        cs = cache.CACHE.stats()
+        return {
+            "pedidos": self.pedidos,
+            "hojas": self.hojas,
+            "canceladas": self.canceladas,
+            "errores": self.errores,
+            "ms_por_hoja": (self.segundos * 1000 / self.hojas) if self.hojas else 0.0,
+            "precargadas": cs["precargadas"],
+            "usadas": cs["precargas_usadas"],
+            "tasa_aciertos": cs["tasa_precarga"],
+        }
+
+
+_precargador: _Precargador | None = None
+_precargador_lock = threading.Lock()
+
+
+def _actual() -> _Precargador:
+    global _precargador
+    if _precargador is None:
+        with _precargador_lock:
+            if _precargador is None:
+                _precargador = _Precargador()
+    return _precargador
+
+
+def pedir(sesion: str, semana_inicio: date) -> None:
+    _actual().pedir(sesion, semana_inicio)
+
+
+def esperar(sesion: str, timeout: float | None = None) -> None:
+    _actual().esperar(sesion, timeout)
+
+
+def stats() -> dict:
+    return _actual().stats()
@@ -0,0 +1,115 @@
+"""
+reportes.py — Planilla de pagos por rango de fechas (trabajador × semana), exportada en streaming
+Las filas salen de SQLite en bloques (fetchmany) directo al escritor CSV/XLSX: la memoria no
+crece con el rango (trimestre, año...).
+"""
+import csv
+import os
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+import db
+from db import get_conn
+
+BLOQUE = 5000  # filas por fetchmany
+
+COLUMNAS = [
+    "trabajador", "cargo", "semana_inicio", "semana_fin",
+    "dias", "monto_semana", "Monto adicional", "Total a pagar",
+]
+
+
+def iter_planilla_rango(desde: date, hasta: date, totales: bool = True, bloque: int = BLOQUE) -> Iterator[tuple]:
+    """
+    Una fila por trabajador y hoja con inicio en [desde, hasta], ordenadas por trabajador y semana.
+    Si `totales`, agrega un subtotal al terminar cada trabajador y el total general al final.
+    """
+    acum = None  # [nombre, cargo, dias, monto, adicional, total] del trabajador en curso
+    general = [0, 0.0, 0.0, 0.0]
+    with get_conn() as conn:
+        cur = conn.execute(
+            """
+            SELECT t.id, t.nombre, COALESCE(t.cargo, '') AS cargo,
+                   ts.semana_inicio, ts.semana_fin,
+                   ts.dias, ts.monto_semana, ts.monto_adicional,
+                   ts.monto_semana + ts.monto_adicional AS total
+            FROM todos_totales ts  -- hojas vivas y archivadas (db.VISTAS_LECTURA)
+            JOIN trabajadores t ON t.id = ts.trabajador_id
+            WHERE ts.semana_inicio BETWEEN ? AND ?
+            ORDER BY t.nombre, ts.semana_inicio
+            """,
+            (desde.isoformat(), hasta.isoformat()),
+        )
+        while True:
+            filas = cur.fetchmany(bloque)
+            if not filas:
+                break
+            for tid, nombre, cargo, ini, fin, dias, monto, adicional, total in filas:
+                if totales:
+                    if acum is not None and acum[0] != tid:
+                        yield (f"TOTAL {acum[1]}", acum[2], "", "", *acum[3:])
+                        acum = None
+                    if acum is None:
+                        acum = [tid, nombre, cargo, 0, 0.0, 0.0, 0.0]
+                    acum[3] += dias
+                    acum[4] += monto
+                    acum[5] += adicional
+                    acum[6] += total
+                    for i, v in enumerate((dias, monto, adicional, total)):
+                        general[i] += v
+                yield (nombre, cargo, ini, fin, dias, monto, adicional, total)
+    if totales and acum is not None:
+        yield (f"TOTAL {acum[1]}", acum[2], "", "", *acum[3:])
+        yield ("TOTAL GENERAL", "", desde.isoformat(), hasta.isoformat(), *general)
+
+
+def exportar_csv(desde: date, hasta: date, destino: Path) -> int:
+    """Escribe la planilla del rango en `destino` (CSV UTF-8); devuelve filas escritas."""
+    n = 0
+    with open(destino, "w", newline="", encoding="utf-8") as fh:
+        w = csv.writer(fh)
+        w.writerow(COLUMNAS)
+        for fila in iter_planilla_rango(desde, hasta):
+            w.writerow(fila)
+            n += 1
+    return n
+
+
+def exportar_xlsx(desde: date, hasta: date, destino: Path) -> int:
+    """Como exportar_csv, en XLSX (openpyxl en modo write_only; dependencia opcional)."""
+    try:
+        from openpyxl import Workbook
+    except ImportError as e:
+        raise RuntimeError("Para exportar a Excel instala openpyxl (pip install openpyxl).") from e
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Planilla")
+    ws.append(COLUMNAS)
+    n = 0
+    for fila in iter_planilla_rango(desde, hasta):
+        ws.append(list(fila))
+        n += 1
+    wb.save(destino)
+    return n
+
+
+def exportar_planilla(desde: date, hasta: date, formato: str = "csv") -> tuple[Path, int]:
+    """
+    Genera data/exportes/planilla_<desde>_a_<hasta>.<formato>; devuelve (ruta, filas).
+    Se escribe en un temporal propio de la misma carpeta y se renombra al terminar (os.replace,
+    atómico): dos sesiones que exportan el mismo rango no se pisan ni descargan un archivo a medias.
+    """
+    carpeta = db.ruta_actual().parent / "exportes"
+    carpeta.mkdir(parents=True, exist_ok=True)
+    destino = carpeta / f"planilla_{desde}_a_{hasta}.{formato}"
+    escribir = exportar_xlsx if formato == "xlsx" else exportar_csv
+    with tempfile.NamedTemporaryFile(dir=carpeta, prefix=f".{destino.stem}_", suffix=".tmp", delete=False) as fh:
+        temporal = Path(fh.name)
+    try:
+        n = escribir(desde, hasta, temporal)
+        os.replace(temporal, destino)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+    return destino, n
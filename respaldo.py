@@ -0,0 +1,384 @@
+"""
+respaldo.py — Respaldos en caliente (API de backup de SQLite) con rotación, verificación y restauración
+Cada respaldo es una carpeta data/respaldos/<nombre>_<AAAAMMDD-HHMMSS>/ con la misma forma que data/
+(la DB viva y archivo/<nombre>_<año>.db), más respaldo.json. Se copia de a PAGINAS_POR_PASO páginas
+dentro de una sola transacción de lectura: en WAL los escritores siguen trabajando y la copia es una
+foto consistente del momento en que empezó. Retención: el último de cada uno de los DIARIOS días y
+de cada una de las SEMANALES semanas más recientes.
+
+    python respaldo.py crear
+    python respaldo.py listar
+    python respaldo.py restaurar registro_20250301-030000   # o: restaurar --antes-de 2025-03-01T12:00
+    python respaldo.py programar --cada-horas 6              # en primer plano (la app usa un hilo)
+"""
+import argparse
+import json
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+import db
+
+CARPETA_RESPALDOS = "respaldos"
+PAGINAS_POR_PASO = 1024  # páginas por paso de backup (4 MiB con páginas de 4 KiB)
+PAUSA_PASO = 0.005       # segundos entre pasos: deja correr a los demás hilos
+DIARIOS = 7              # retención: último respaldo de cada uno de los 7 días más recientes
+SEMANALES = 4            # ... y de cada una de las 4 semanas (ISO) más recientes
+INTERVALO_HORAS = 24.0   # respaldo programado (hilo de la app)
+MANIFIESTO = "respaldo.json"
+FORMATO_FECHA = "%Y%m%d-%H%M%S"
+
+
+def carpeta(ruta: str | None = None) -> Path:
+    base = Path(ruta or db.ruta_actual())
+    return base.parent / CARPETA_RESPALDOS
+
+
+def _fecha(nombre: str) -> datetime | None:
+    try:
+        return datetime.strptime(nombre.rsplit("_", 1)[-1], FORMATO_FECHA)
+    except ValueError:
+        return None
+
+
+def listar(ruta: str | None = None) -> list[dict]:
+    """Respaldos completos de la DB (los que tienen manifiesto), del más reciente al más antiguo."""
+    base = Path(ruta or db.ruta_actual())
+    res = []
+    for d in carpeta(ruta).glob(f"{base.stem}_*"):
+        creado = _fecha(d.name)
+        if creado is None or not (d / MANIFIESTO).is_file():
+            continue
+        info = json.loads((d / MANIFIESTO).read_text(encoding="utf-8"))
+        res.append({**info, "nombre": d.name, "ruta": d, "creado": creado})
+    return sorted(res, key=lambda r: r["creado"], reverse=True)
+
+
+def elegir(antes_de: datetime | None = None, ruta: str | None = None) -> dict | None:
+    """El respaldo más reciente (o el más reciente creado hasta `antes_de`: punto en el tiempo)."""
+    for r in listar(ruta):
+        if antes_de is None or r["creado"] <= antes_de:
+            return r
+    return None
+
+
+# -------------------- Copia --------------------
+def _copiar(origen: sqlite3.Connection, destino: Path, esquema: str, pausa: float) -> None:
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    dst = sqlite3.connect(destino)
+    try:
+        origen.backup(
+            dst, pages=PAGINAS_POR_PASO, name=esquema,
+            progress=(lambda *_: time.sleep(pausa)) if pausa else None,
+        )
+        # La copia hereda WAL del original: un respaldo es un solo archivo, sin -wal ni -shm
+        dst.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        dst.close()
+
+
+def _integridad(ruta: Path) -> str:
+    conn = sqlite3.connect(f"{ruta.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        filas = [r[0] for r in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return "ok" if filas == ["ok"] else "; ".join(filas[:5])
+
+
+def _depurar(ruta_db: Path, archivos: tuple) -> None:
+    """
+    En la copia, quita de los archivos las hojas que también están en la DB viva: un archivado
+    cortado entre copia y borrado (archivo.py) deja la hoja en ambos; la de la viva manda.
+    """
+    conn = sqlite3.connect(ruta_db)
+    try:
+        conn.execute("PRAGMA foreign_keys=ON")
+        for esquema, ruta in archivos:
+            conn.execute(f"ATTACH DATABASE ? AS {esquema}", (str(ruta),))
+            conn.execute(f"DELETE FROM {esquema}.semanas WHERE id IN (SELECT id FROM main.semanas)")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def crear(ruta: str | None = None, pausa: float = PAUSA_PASO) -> dict:
+    """
+    Respalda la DB viva y sus archivos (hojas archivadas) sin bloquear a los escritores; verifica
+    la copia con integrity_check. Devuelve la entrada del respaldo (como en listar()).
+    """
+    t0 = time.perf_counter()
+    base = Path(ruta or db.ruta_actual())
+    creado = datetime.now().replace(microsecond=0)
+    nombre = f"{base.stem}_{creado.strftime(FORMATO_FECHA)}"
+    final = carpeta(ruta) / nombre
+    if final.exists():
+        raise ValueError(f"Ya existe el respaldo {nombre}.")
+    # Se arma en una carpeta temporal y se renombra al final: listar() nunca ve uno a medias
+    tmp = carpeta(ruta) / f".{nombre}.tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        archivos = db.buscar_archivos(str(base))
+        origen = sqlite3.connect(str(base), timeout=30)
+        try:
+            for esquema, r in archivos:
+                origen.execute(f"ATTACH DATABASE ? AS {esquema}", (f"{Path(r).resolve().as_uri()}?mode=ro",))
+            # Una transacción de lectura sobre todos los esquemas: la foto no cambia durante la copia
+            origen.execute("BEGIN")
+            for esquema in ["main", *dict(archivos)]:
+                origen.execute(f"SELECT COUNT(*) FROM {esquema}.sqlite_master").fetchone()
+            version = origen.execute("PRAGMA main.user_version").fetchone()[0]
+            destinos = {"main": tmp / base.name}
+            for esquema, r in archivos:
+                destinos[esquema] = tmp / db.CARPETA_ARCHIVO / Path(r).name
+            for esquema, destino in destinos.items():
+                _copiar(origen, destino, esquema, pausa)
+            origen.rollback()
+        finally:
+            origen.close()
+        copias = tuple((e, d) for e, d in destinos.items() if e != "main")
+        _depurar(destinos["main"], copias)
+        problemas = {str(d.relative_to(tmp)): i for d in destinos.values() if (i := _integridad(d)) != "ok"}
+        if problemas:
+            raise RuntimeError(f"La copia no pasó integrity_check: {problemas}")
+        info = {
+            "db": base.name,
+            "version_schema": version,
+            "archivos": [d.name for _, d in copias],
+            "bytes": sum(d.stat().st_size for d in destinos.values()),
+            "segundos": round(time.perf_counter() - t0, 3),
+            "integridad": "ok",
+        }
+        (tmp / MANIFIESTO).write_text(json.dumps(info, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.rename(final)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return {**info, "nombre": nombre, "ruta": final, "creado": creado}
+
+
+def verificar(nombre: str, ruta: str | None = None) -> dict[str, str]:
+    """integrity_check de cada archivo del respaldo: {archivo: 'ok' o el problema}."""
+    d = carpeta(ruta) / nombre
+    return {str(p.relative_to(d)): _integridad(p) for p in sorted(d.rglob("*.db"))}
+
+
+def rotar(diarios: int = DIARIOS, semanales: int = SEMANALES, ruta: str | None = None) -> list[str]:
+    """Borra los respaldos fuera de la retención diaria/semanal; devuelve sus nombres."""
+    respaldos = listar(ruta)  # del más reciente al más antiguo: el primero de cada día/semana se queda
+    dias, semanas, conservar = [], [], set()
+    for r in respaldos:
+        dia = r["creado"].date()
+        semana = r["creado"].isocalendar()[:2]
+        if dia not in dias and len(dias) < diarios:
+            dias.append(dia)
+            conservar.add(r["nombre"])
+        if semana not in semanas and len(semanas) < semanales:
+            semanas.append(semana)
+            conservar.add(r["nombre"])
+    borrados = [r["nombre"] for r in respaldos if r["nombre"] not in conservar]
+    for n in borrados:
+        shutil.rmtree(carpeta(ruta) / n, ignore_errors=True)
+    return borrados
+
+
+# -------------------- Restauración --------------------
+def _volcar(origen: Path, destino: Path) -> None:
+    """Reemplaza el contenido de `destino` por el de `origen` en un solo paso (atómico para los lectores)."""
+    src = sqlite3.connect(f"{origen.resolve().as_uri()}?mode=ro", uri=True)
+    dst = sqlite3.connect(destino, timeout=30)
+    try:
+        dst.execute("PRAGMA journal_mode=WAL")
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def _seq_cambios(ruta: Path) -> int:
+    conn = sqlite3.connect(ruta, timeout=30)
+    try:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name='cambios'").fetchone()
+    except sqlite3.OperationalError:  # DB sin diario de cambios (schema < 8)
+        row = None
+    finally:
+        conn.close()
+    return row[0] if row else 0
+
+
+def _seguir_seq_cambios(ruta: Path, seq: int) -> None:
+    """
+    El diario de cambios (sincronizacion.py) no retrocede con la restauración: los cambios nuevos
+    siguen después del último seq anterior, que la central pudo haber aplicado ya. Queda anotada
+    la restauración (sync_local 'restaurado'): lo derivado del diario (historial.py) se rehace.
+    """
+    conn = sqlite3.connect(ruta, timeout=30)
+    try:
+        with conn:
+            conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name='cambios'", (seq,))
+            conn.execute(
+                "INSERT INTO sqlite_sequence(name, seq) SELECT 'cambios', ? "
+                "WHERE ? > 0 AND NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name='cambios')",
+                (seq, seq),
+            )
+            conn.execute("INSERT OR REPLACE INTO sync_local VALUES ('restaurado', ?)", (datetime.now().isoformat(),))
+    except sqlite3.OperationalError:
+        pass  # DB sin diario de cambios (schema < 8)
+    finally:
+        conn.close()
+
+
+def restaurar(nombre: str, ruta: str | None = None, respaldar_antes: bool = True) -> dict:
+    """
+    Vuelve la DB viva (y sus archivos) al estado del respaldo `nombre`. Antes respalda el estado
+    actual (salvo `respaldar_antes=False`) y verifica la integridad del elegido. Devuelve
+    {'restaurado', 'respaldo_previo'}. Las escrituras que lleguen mientras tanto esperan el lock.
+    La restauración no se anota en el diario de cambios: los sitios que sincronizan no la ven.
+    """
+    base = Path(ruta or db.ruta_actual())
+    d = carpeta(ruta) / nombre
+    if not (d / MANIFIESTO).is_file():
+        raise ValueError(f"No existe el respaldo {nombre}.")
+    problemas = {k: v for k, v in verificar(nombre, ruta).items() if v != "ok"}
+    if problemas:
+        raise RuntimeError(f"El respaldo {nombre} está dañado: {problemas}")
+    previo = crear(ruta)["nombre"] if respaldar_antes else None
+
+    seq = _seq_cambios(base)
+    _volcar(d / base.name, base)
+    en_respaldo = {p.name for p in (d / db.CARPETA_ARCHIVO).glob("*.db")}
+    for p in sorted((d / db.CARPETA_ARCHIVO).glob("*.db")):
+        _volcar(p, base.parent / db.CARPETA_ARCHIVO / p.name)
+    # Archivos creados después del respaldo: sus hojas ya están en la DB restaurada
+    db.cerrar_conexiones()
+    for _, r in db.buscar_archivos(str(base)):
+        if Path(r).name not in en_respaldo:
+            Path(r).unlink()
+    db.refrescar_archivos(str(base))
+    db._pool_actual(str(base)).marcar_escritura()  # todo lo cacheado quedó viejo
+    # Un respaldo de una versión anterior del schema se migra al abrirlo
+    db._migradas.discard(str(base))
+    db.init_db(str(base))
+    _seguir_seq_cambios(base, seq)
+    return {"restaurado": nombre, "respaldo_previo": previo}
+
+
+# -------------------- Programado --------------------
+class _Programador:
+    """Hilo que respalda cada `intervalo_horas` (según la fecha del último respaldo en disco) y rota."""
+
+    def __init__(self, ruta: str, intervalo_horas: float):
+        self.ruta = ruta
+        self.intervalo = intervalo_horas * 3600
+        self.ultimo: dict | None = None
+        self.ultimo_error: str | None = None
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, name=f"respaldo[{ruta}]", daemon=True)
+        self._hilo.start()
+
+    def _bucle(self) -> None:
+        while not self._parar.is_set():
+            ultimo = elegir(ruta=self.ruta)
+            edad = (datetime.now() - ultimo["creado"]).total_seconds() if ultimo else float("inf")
+            if edad >= self.intervalo:
+                try:
+                    self.ultimo = crear(self.ruta)
+                    rotar(ruta=self.ruta)
+                    self.ultimo_error = None
+                except Exception as e:  # se reintenta en la próxima vuelta
+                    self.ultimo_error = f"{type(e).__name__}: {e}"
+                    edad = self.intervalo - 300  # reintento en 5 minutos
+                else:
+                    edad = 0
+            self._parar.wait(min(max(self.intervalo - edad, 1.0), 3600))
+
+    def detener(self) -> None:
+        self._parar.set()
+        self._hilo.join()
+
+
+_programadores: dict[str, _Programador] = {}
+_programadores_lock = threading.Lock()
+
+
+def iniciar_programado(intervalo_horas: float = INTERVALO_HORAS, ruta: str | None = None) -> _Programador:
+    """Arranca (una vez por proceso y DB) el hilo de respaldos programados; devuelve el existente si ya corre."""
+    ruta = str(ruta or db.ruta_actual())
+    with _programadores_lock:
+        prog = _programadores.get(ruta)
+        if prog is None:
+            prog = _programadores[ruta] = _Programador(ruta, intervalo_horas)
+    return prog
+
+
+def detener_programados() -> None:
+    with _programadores_lock:
+        programadores = list(_programadores.values())
+        _programadores.clear()
+    for prog in programadores:
+        prog.detener()
+
+
+# -------------------- CLI --------------------
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--db", type=Path, default=db.DB_PATH, help="DB viva (por defecto %(default)s)")
+    sub = p.add_subparsers(dest="orden", required=True)
+    sub.add_parser("crear", help="respalda ahora y aplica la retención")
+    sub.add_parser("listar", help="respaldos disponibles")
+    v = sub.add_parser("verificar", help="integrity_check de un respaldo")
+    v.add_argument("nombre")
+    r = sub.add_parser("restaurar", help="vuelve la DB al estado de un respaldo")
+    r.add_argument("nombre", nargs="?")
+    r.add_argument("--antes-de", type=datetime.fromisoformat, help="el más reciente creado hasta esta fecha/hora")
+    r.add_argument("--sin-respaldo-previo", action="store_true", help="no respalda el estado actual antes")
+    g = sub.add_parser("programar", help="respalda cada N horas hasta Ctrl+C")
+    g.add_argument("--cada-horas", type=float, default=INTERVALO_HORAS)
+    args = p.parse_args(argv)
+
+    db.DB_PATH = args.db
+    ruta = str(args.db)
+    if args.orden == "crear":
+        res = crear(ruta)
+        print(f"{res['nombre']}: {res['bytes'] / 2**20:.1f} MiB en {res['segundos']:.1f} s (integridad ok)")
+        for n in rotar(ruta=ruta):
+            print(f"rotado: {n}")
+    elif args.orden == "listar":
+        for res in listar(ruta):
+            print(f"{res['nombre']}  {res['bytes'] / 2**20:8.1f} MiB  schema v{res['version_schema']}  "
+                  f"{len(res['archivos'])} archivo(s)")
+    elif args.orden == "verificar":
+        res = verificar(args.nombre, ruta)
+        for archivo, estado in res.items():
+            print(f"{archivo}: {estado}")
+        return 0 if all(e == "ok" for e in res.values()) else 1
+    elif args.orden == "restaurar":
+        if args.nombre is None:
+            elegido = elegir(args.antes_de, ruta)
+            if elegido is None:
+                print("No hay respaldos hasta esa fecha.")
+                return 1
+            args.nombre = elegido["nombre"]
+        res = restaurar(args.nombre, ruta, respaldar_antes=not args.sin_respaldo_previo)
+        print(f"restaurado: {res['restaurado']}")
+        if res["respaldo_previo"]:
+            print(f"estado anterior guardado en: {res['respaldo_previo']}")
+    elif args.orden == "programar":
+        prog = iniciar_programado(args.cada_horas, ruta)
+        try:
+            while True:
+                time.sleep(60)
+                if prog.ultimo_error:
+                    print(f"⚠️ {prog.ultimo_error}")
+        except KeyboardInterrupt:
+            prog.detener()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
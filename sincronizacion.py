@@ -0,0 +1,352 @@
+"""
+sincronizacion.py — Deltas del diario de cambios (tabla cambios, db._m008) entre los sitios y la central
+Cada sitio exporta lo anotado después de un seq (por defecto, desde su última exportación) a un
+.jsonl.gz; la central lo aplica en orden, en transacciones de LOTE cambios, y guarda en la misma
+transacción hasta qué seq aplicó de cada origen (sync_origenes): aplicar dos veces el mismo delta
+no hace nada y un delta con hueco (falta uno anterior) se rechaza. El costo es proporcional a los
+cambios, no al tamaño de la DB.
+
+Las filas viajan con su clave natural, porque los ids son locales de cada sitio: hoja por
+(semana_inicio, semana_fin), trabajador por nombre, entrada por (hoja, fecha, trabajador).
+Un cambio trae la fila antes y después; si aquí la fila no es la que el cambio esperaba ('antes')
+hay conflicto: se anota en sync_conflictos y se resuelve según la política, 'remoto' (gana el
+sitio) o 'local' (se conserva la de aquí). Nunca se tocan hojas archivadas ni se borra una hoja
+que aún tiene entradas de otros sitios.
+
+    python sincronizacion.py exportar --salida obra_norte.jsonl.gz
+    python sincronizacion.py aplicar obra_norte.jsonl.gz --politica local
+    python sincronizacion.py estado
+    python sincronizacion.py podar --hasta 12345     # en el sitio, lo que la central ya aplicó
+"""
+import argparse
+import gzip
+import json
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import datos
+import db
+from escritor import escritura
+
+FORMATO = "qualisem-delta"
+VERSION = 1
+LOTE = 5_000  # cambios por transacción al aplicar
+POLITICAS = ("remoto", "local")
+
+# Campos sincronizados de cada tabla (los del JSON de db._JSON_CAMBIO) y su clave natural
+CAMPOS = {
+    "semanas": ("semana_inicio", "semana_fin", "encargado", "cerrada"),
+    "trabajadores": ("nombre", "cargo", "activo"),
+    "entradas": ("semana_inicio", "semana_fin", "fecha", "trabajador", "actividad", "monto",
+                 "extra_sabado", "extra_monto"),
+}
+CLAVES = {
+    "semanas": ("semana_inicio", "semana_fin"),
+    "trabajadores": ("nombre",),
+    "entradas": ("semana_inicio", "semana_fin", "fecha", "trabajador"),
+}
+_BUSCAR = {
+    "semanas": "SELECT id, semana_inicio, semana_fin, encargado, cerrada FROM main.semanas "
+               "WHERE semana_inicio=? AND semana_fin=?",
+    "trabajadores": "SELECT id, nombre, cargo, activo FROM trabajadores WHERE nombre=?",
+    "entradas": """
+        SELECT e.id, e.semana_id, s.semana_inicio, s.semana_fin, e.fecha, t.nombre AS trabajador,
+               e.actividad, e.monto, e.extra_sabado, e.extra_monto
+        FROM main.semanas s
+        JOIN entradas e ON e.semana_id = s.id
+        JOIN trabajadores t ON t.id = e.trabajador_id
+        WHERE s.semana_inicio=? AND s.semana_fin=? AND e.fecha=? AND t.nombre=?
+    """,
+}
+
+
+def _local(conn, clave: str) -> str | None:
+    row = conn.execute("SELECT valor FROM sync_local WHERE clave=?", (clave,)).fetchone()
+    return row[0] if row else None
+
+
+# -------------------- Exportar (sitio) --------------------
+@escritura(tablas=("sync_local",))
+def _marcar_exportado(conn, hasta: int) -> None:
+    conn.execute("INSERT OR REPLACE INTO sync_local VALUES ('exportado', ?)", (str(hasta),))
+
+
+def exportar(salida: Path, desde: int | None = None) -> dict:
+    """
+    Escribe en `salida` (.jsonl.gz) los cambios con seq > `desde` (por defecto, los no exportados
+    aún). Devuelve {'origen', 'desde', 'hasta', 'cambios'}.
+    """
+    with db.get_conn() as conn:
+        origen = _local(conn, "origen")
+        if desde is None:
+            desde = int(_local(conn, "exportado") or 0)
+        podado = int(_local(conn, "podado") or 0)
+        if desde < podado:
+            raise ValueError(f"El diario ya se podó hasta el seq {podado}: no se puede exportar desde {desde}.")
+        # Tope fijo al empezar: lo que se anote mientras tanto va en el próximo delta
+        hasta = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0]
+        hasta = max(hasta, desde)
+        cabecera = {"formato": FORMATO, "version": VERSION, "origen": origen, "desde": desde, "hasta": hasta,
+                    "schema": db.version_schema(conn)}
+        n = 0
+        salida.parent.mkdir(parents=True, exist_ok=True)
+        with gzip.open(salida, "wt", encoding="utf-8") as fh:
+            fh.write(json.dumps(cabecera) + "\n")
+            cur = conn.execute(
+                "SELECT seq, tabla, op, antes, despues, creado FROM cambios WHERE seq > ? AND seq <= ? ORDER BY seq",
+                (desde, hasta),
+            )
+            # antes/despues ya son JSON: se pegan tal cual, sin decodificar
+            for seq, tabla, op, antes, despues, creado in cur:
+                fh.write(f'{{"seq":{seq},"tabla":"{tabla}","op":"{op}","antes":{antes or "null"},'
+                         f'"despues":{despues or "null"},"creado":"{creado}"}}\n')
+                n += 1
+    _marcar_exportado(hasta)
+    return {"origen": origen, "desde": desde, "hasta": hasta, "cambios": n}
+
+
+@escritura(tablas=("cambios",))
+def podar(conn, hasta: int) -> int:
+    """Borra del diario los cambios con seq <= `hasta` (ya aplicados en la central); devuelve cuántos."""
+    n = conn.execute("DELETE FROM cambios WHERE seq <= ?", (int(hasta),)).rowcount
+    podado = max(int(hasta), int(_local(conn, "podado") or 0))
+    conn.execute("INSERT OR REPLACE INTO sync_local VALUES ('podado', ?)", (str(podado),))
+    return n
+
+
+# -------------------- Aplicar (central) --------------------
+def _normal(fila: dict | None, tabla: str):
+    if fila is None:
+        return None
+    return tuple(round(float(v), 6) if isinstance(v, (int, float)) else v for v in (fila[c] for c in CAMPOS[tabla]))
+
+
+def _buscar(conn, tabla: str, fila: dict):
+    return conn.execute(_BUSCAR[tabla], tuple(fila[c] for c in CLAVES[tabla])).fetchone()
+
+
+def _archivada(conn, fila: dict) -> bool:
+    return conn.execute(
+        "SELECT 1 FROM todas_semanas WHERE semana_inicio=? AND semana_fin=? AND esquema <> 'main'",
+        (fila["semana_inicio"], fila["semana_fin"]),
+    ).fetchone() is not None
+
+
+def _id_semana(conn, fila: dict) -> int:
+    conn.execute(
+        "INSERT OR IGNORE INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,'—',0)",
+        (fila["semana_inicio"], fila["semana_fin"]),
+    )
+    return _buscar(conn, "semanas", fila)["id"]
+
+
+def _id_trabajador(conn, nombre: str) -> int:
+    conn.execute("INSERT OR IGNORE INTO trabajadores(nombre) VALUES (?)", (nombre,))
+    return conn.execute("SELECT id FROM trabajadores WHERE nombre=?", (nombre,)).fetchone()[0]
+
+
+def _escribir(conn, tabla: str, actual, fila: dict | None, hojas: set) -> None:
+    """Deja la fila `actual` (None: no existe) como `fila` (None: borrada)."""
+    if tabla == "semanas":
+        if fila is None:
+            conn.execute("DELETE FROM semanas WHERE id=?", (actual["id"],))
+            return
+        valores = (fila["semana_inicio"], fila["semana_fin"], fila["encargado"], fila["cerrada"])
+        if actual is None:
+            conn.execute("INSERT INTO semanas(semana_inicio, semana_fin, encargado, cerrada) VALUES (?,?,?,?)", valores)
+            hojas.add(_buscar(conn, "semanas", fila)["id"])
+        else:
+            conn.execute("UPDATE semanas SET semana_inicio=?, semana_fin=?, encargado=?, cerrada=? WHERE id=?",
+                         (*valores, actual["id"]))
+            hojas.add(actual["id"])
+    elif tabla == "trabajadores":
+        if fila is None:
+            conn.execute("DELETE FROM trabajadores WHERE id=?", (actual["id"],))
+        elif actual is None:
+            conn.execute("INSERT INTO trabajadores(nombre, cargo, activo) VALUES (?,?,?)",
+                         (fila["nombre"], fila["cargo"], fila["activo"]))
+        else:
+            conn.execute("UPDATE trabajadores SET nombre=?, cargo=?, activo=? WHERE id=?",
+                         (fila["nombre"], fila["cargo"], fila["activo"], actual["id"]))
+    else:
+        if actual is not None:
+            hojas.add(actual["semana_id"])
+        if fila is None:
+            conn.execute("DELETE FROM entradas WHERE id=?", (actual["id"],))
+            return
+        semana_id = _id_semana(conn, fila)
+        valores = (semana_id, fila["fecha"], _id_trabajador(conn, fila["trabajador"]), fila["trabajador"],
+                   fila["actividad"], fila["monto"], fila["extra_sabado"], fila["extra_monto"])
+        if actual is None:
+            conn.execute(
+                "INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, actividad, monto, extra_sabado, "
+                "extra_monto) VALUES (?,?,?,?,?,?,?,?)", valores,
+            )
+        else:
+            conn.execute(
+                "UPDATE entradas SET semana_id=?, fecha=?, trabajador_id=?, trabajador=?, actividad=?, monto=?, "
+                "extra_sabado=?, extra_monto=? WHERE id=?", (*valores, actual["id"]),
+            )
+        hojas.add(semana_id)
+
+
+def _aplicar_uno(conn, cambio: dict, politica: str, hojas: set) -> tuple[str, str | None, dict | None]:
+    """Aplica un cambio; devuelve (resultado, resolución del conflicto o None, fila local si hubo conflicto)."""
+    tabla, op, antes, despues = cambio["tabla"], cambio["op"], cambio["antes"], cambio["despues"]
+    actual = _buscar(conn, tabla, antes if op != "I" else despues)
+    if actual is None and op == "U":
+        actual = _buscar(conn, tabla, despues)  # aquí ya tenía la clave nueva (p. ej. renombre aplicado)
+    local = {c: actual[c] for c in CAMPOS[tabla]} if actual is not None else None
+    if actual is None and tabla != "trabajadores" and _archivada(conn, despues or antes):
+        return "conflicto", "archivada", local
+    if _normal(local, tabla) == _normal(despues, tabla):
+        return "omitido", None, None  # ya estaba así (delta repetido o mismo cambio por dos caminos)
+    if tabla == "semanas" and despues is None and conn.execute(
+        "SELECT 1 FROM entradas WHERE semana_id=? LIMIT 1", (actual["id"],)
+    ).fetchone():
+        return "conflicto", "en uso", local  # la hoja tiene entradas de otros sitios: se queda
+    if _normal(local, tabla) == _normal(antes, tabla):
+        _escribir(conn, tabla, actual, despues, hojas)
+        return "aplicado", None, None
+    if politica == "remoto":
+        _escribir(conn, tabla, actual, despues, hojas)
+    return "conflicto", politica, local
+
+
+@escritura(tablas=("semanas", "trabajadores", "entradas", "instantaneas", "sync_origenes", "sync_conflictos"))
+def _aplicar_lote(conn, origen: str, cambios: list[dict], politica: str, marca: int) -> dict:
+    res = {"aplicados": 0, "omitidos": 0, "conflictos": 0}
+    hojas: set[int] = set()
+    for c in cambios:
+        conn.execute("SAVEPOINT cambio")
+        try:
+            resultado, resolucion, local = _aplicar_uno(conn, c, politica, hojas)
+        except sqlite3.IntegrityError as e:
+            conn.execute("ROLLBACK TO cambio")
+            resultado, resolucion, local = "conflicto", f"error: {e}", None
+        conn.execute("RELEASE cambio")
+        res[{"aplicado": "aplicados", "omitido": "omitidos", "conflicto": "conflictos"}[resultado]] += 1
+        if resultado == "conflicto":
+            conn.execute(
+                "INSERT INTO sync_conflictos(origen, seq, tabla, op, local, remoto, resolucion) VALUES (?,?,?,?,?,?,?)",
+                (origen, c["seq"], c["tabla"], c["op"], json.dumps(local, ensure_ascii=False) if local else None,
+                 json.dumps(c["despues"], ensure_ascii=False) if c["despues"] else None, resolucion),
+            )
+    # Las hojas cerradas que cambiaron se recongelan; las abiertas no llevan instantánea
+    for sid in hojas:
+        row = conn.execute("SELECT cerrada FROM semanas WHERE id=?", (sid,)).fetchone()
+        if row is None:
+            continue
+        if row["cerrada"]:
+            datos._congelar(conn, sid)
+        else:
+            conn.execute("DELETE FROM instantaneas WHERE semana_id=?", (sid,))
+    conn.execute(
+        "INSERT INTO sync_origenes(origen, ultimo_seq) VALUES (?,?) "
+        "ON CONFLICT(origen) DO UPDATE SET ultimo_seq=excluded.ultimo_seq, aplicado=datetime('now')",
+        (origen, marca),
+    )
+    return res
+
+
+def _leer(ruta: Path):
+    fh = gzip.open(ruta, "rt", encoding="utf-8") if ruta.suffix == ".gz" else open(ruta, encoding="utf-8")
+    with fh:
+        for linea in fh:
+            if linea.strip():
+                yield json.loads(linea)
+
+
+def aplicar(ruta: Path, politica: str = "remoto", lote: int = LOTE) -> dict:
+    """
+    Aplica el delta `ruta` de otro sitio. Devuelve {'origen', 'desde', 'hasta', 'aplicados',
+    'omitidos', 'conflictos', 'segundos'}; lo ya aplicado antes (seq <= marca del origen) se salta.
+    """
+    if politica not in POLITICAS:
+        raise ValueError(f"Política desconocida: {politica} (use {', '.join(POLITICAS)}).")
+    t0 = time.perf_counter()
+    filas = _leer(Path(ruta))
+    cab = next(filas, None)
+    if not cab or cab.get("formato") != FORMATO or cab.get("version") != VERSION:
+        raise ValueError(f"{ruta} no es un delta de {FORMATO} v{VERSION}.")
+    with db.get_conn() as conn:
+        if cab["origen"] == _local(conn, "origen"):
+            raise ValueError("El delta es de este mismo sitio.")
+        row = conn.execute("SELECT ultimo_seq FROM sync_origenes WHERE origen=?", (cab["origen"],)).fetchone()
+    marca = row[0] if row else 0
+    if cab["desde"] > marca:
+        raise ValueError(f"Faltan cambios del origen {cab['origen']}: aplicado hasta {marca}, "
+                         f"el delta empieza en {cab['desde'] + 1}. Exporte desde {marca}.")
+
+    res = {"origen": cab["origen"], "desde": cab["desde"], "hasta": cab["hasta"],
+           "aplicados": 0, "omitidos": 0, "conflictos": 0}
+    pendientes: list[dict] = []
+    for c in filas:
+        if c["seq"] <= marca:
+            continue  # ya aplicado (delta repetido o solapado)
+        pendientes.append(c)
+        if len(pendientes) >= lote:
+            for k, v in _aplicar_lote(cab["origen"], pendientes, politica, pendientes[-1]["seq"]).items():
+                res[k] += v
+            pendientes = []
+    if pendientes or cab["hasta"] > marca:
+        for k, v in _aplicar_lote(cab["origen"], pendientes, politica, max(cab["hasta"], marca)).items():
+            res[k] += v
+    res["segundos"] = time.perf_counter() - t0
+    return res
+
+
+def estado() -> dict:
+    """Origen de este sitio, su último seq y lo exportado; marcas de los sitios aplicados y conflictos."""
+    with db.get_conn() as conn:
+        return {
+            "origen": _local(conn, "origen"),
+            "ultimo_seq": conn.execute("SELECT COALESCE(MAX(seq), 0) FROM cambios").fetchone()[0],
+            "exportado": int(_local(conn, "exportado") or 0),
+            "podado": int(_local(conn, "podado") or 0),
+            "origenes": [dict(r) for r in conn.execute("SELECT * FROM sync_origenes ORDER BY origen")],
+            "conflictos": [dict(r) for r in conn.execute(
+                "SELECT resolucion, COUNT(*) AS n FROM sync_conflictos GROUP BY resolucion ORDER BY n DESC")],
+        }
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--db", type=Path, default=db.DB_PATH, help="DB viva (por defecto %(default)s)")
+    sub = p.add_subparsers(dest="orden", required=True)
+    e = sub.add_parser("exportar", help="escribe el delta de este sitio")
+    e.add_argument("--salida", type=Path, help="por defecto <carpeta de la DB>/delta_<origen>_<desde>-<hasta>.jsonl.gz")
+    e.add_argument("--desde", type=int, help="seq de partida (por defecto, la última exportación)")
+    a = sub.add_parser("aplicar", help="aplica el delta de otro sitio")
+    a.add_argument("delta", type=Path)
+    a.add_argument("--politica", choices=POLITICAS, default="remoto", help="quién gana en un conflicto")
+    sub.add_parser("estado", help="seq local, marcas por origen y conflictos")
+    d = sub.add_parser("podar", help="borra del diario lo ya aplicado en la central")
+    d.add_argument("--hasta", type=int, required=True)
+    args = p.parse_args(argv)
+
+    db.DB_PATH = args.db
+    db.init_db()
+    if args.orden == "exportar":
+        tmp = args.salida or args.db.parent / "delta.tmp.jsonl.gz"
+        res = exportar(tmp, args.desde)
+        salida = args.salida or args.db.parent / f"delta_{res['origen']}_{res['desde']}-{res['hasta']}.jsonl.gz"
+        if salida != tmp:
+            tmp.replace(salida)
+        print(f"{res['cambios']} cambio(s) (seq {res['desde'] + 1}..{res['hasta']}) → {salida}")
+    elif args.orden == "aplicar":
+        res = aplicar(args.delta, args.politica)
+        print(f"{res['origen']} seq {res['desde'] + 1}..{res['hasta']}: {res['aplicados']} aplicado(s), "
+              f"{res['omitidos']} omitido(s), {res['conflictos']} conflicto(s) en {res['segundos']:.1f} s")
+        return 1 if res["conflictos"] else 0
+    elif args.orden == "estado":
+        print(json.dumps(estado(), ensure_ascii=False, indent=2))
+    elif args.orden == "podar":
+        print(f"{podar(args.hasta)} cambio(s) podado(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""
+sitios.py — Varios sitios en un solo proceso: cada sitio es su propia DB SQLite
+Un sitio vive en data/sitios/<sitio>/registro.db, con sus archivo/, respaldos/, historial/ y
+exportes/ al lado; PRINCIPAL es la DB de siempre (db.DB_PATH). data/sitios.json puede agregar
+sitios con la DB en otro lugar: {"norte": "/srv/norte/registro.db"}.
+Todo lo que corre dentro de usar(sitio) (pools, caché de lecturas, hilo escritor, init_db) va a
+la DB de ese sitio (db.ruta_actual); app.py lo fija por sesión.
+
+El consolidado lee la planilla de todos los sitios en una sola consulta: una conexión en memoria
+con las DBs adjuntas (ATTACH, solo lectura) y una vista temporal UNION ALL, de a db.ARCHIVOS_MAX
+sitios por conexión (límite de ATTACH de SQLite). Lee las hojas vivas de cada sitio: las
+archivadas no entran (adjuntarlas también pasaría el límite).
+
+    python sitios.py listar
+    python sitios.py crear norte
+    python sitios.py consolidado 2025-01-01 2025-03-31 --salida consolidado.csv
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+from typing import Iterator
+
+import db
+import reportes
+
+PRINCIPAL = "principal"
+CARPETA_SITIOS = "sitios"
+MAPA = "sitios.json"  # en la carpeta de db.DB_PATH; opcional
+NOMBRE = re.compile(r"[a-z0-9][a-z0-9_-]{0,39}")  # sitios creados desde la app/CLI (nombre de carpeta)
+COLUMNAS = ["sitio", *reportes.COLUMNAS]
+
+_RAMA = """
+    SELECT '{sitio}' AS sitio, t.nombre AS trabajador, COALESCE(t.cargo, '') AS cargo,
+           s.semana_inicio, s.semana_fin, ts.dias, ts.monto_semana, ts.monto_adicional,
+           ts.monto_semana + ts.monto_adicional AS total
+    FROM {e}.totales_semana ts
+    JOIN {e}.semanas s ON s.id = ts.semana_id
+    JOIN {e}.trabajadores t ON t.id = ts.trabajador_id
+"""
+
+
+# (firma, sitios) de la última lectura; la firma cambia si cambian DB_PATH, sitios.json o la
+# carpeta sitios/ (alta o baja de un sitio), así que cada rerun de la app no relee el disco.
+_leidos: tuple | None = None
+
+
+def _estado(ruta: Path) -> tuple | None:
+    try:
+        st = ruta.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size  # el tamaño cubre dos escrituras en el mismo tick del reloj
+
+
+def sitios() -> dict[str, Path]:
+    """Sitio → DB: PRINCIPAL, los de data/sitios/ (por nombre) y los de sitios.json."""
+    global _leidos
+    base = db.DB_PATH.parent
+    firma = (db.DB_PATH, _estado(base / MAPA), _estado(base / CARPETA_SITIOS))
+    leidos = _leidos
+    if leidos is not None and leidos[0] == firma:
+        return dict(leidos[1])
+    encontrados = {PRINCIPAL: db.DB_PATH}
+    carpeta = base / CARPETA_SITIOS
+    if carpeta.is_dir():
+        for d in sorted(carpeta.iterdir()):
+            if (d / db.DB_PATH.name).is_file():
+                encontrados[d.name] = d / db.DB_PATH.name
+    try:
+        mapa = json.loads((base / MAPA).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        mapa = {}
+    encontrados.update({str(k): Path(v) for k, v in mapa.items()})
+    _leidos = (firma, encontrados)
+    return dict(encontrados)
+
+
+def refrescar() -> None:
+    """Olvida la lista leída: la próxima llamada a sitios() vuelve a mirar el disco."""
+    global _leidos
+    _leidos = None
+
+
+def ruta(sitio: str) -> Path:
+    try:
+        return sitios()[sitio]
+    except KeyError:
+        raise ValueError(f"Sitio desconocido: {sitio}") from None
+
+
+def usar(sitio: str):
+    """Context manager: dentro del with, todo va a la DB de `sitio` (ver db.usar)."""
+    return db.usar(ruta(sitio))
+
+
+def crear(sitio: str) -> Path:
+    """Crea (o solo migra, si ya existe) la DB del sitio en data/sitios/<sitio>/; devuelve su ruta."""
+    sitio = sitio.strip().lower()
+    if not NOMBRE.fullmatch(sitio) or sitio == PRINCIPAL:
+        raise ValueError("Nombre de sitio inválido: minúsculas, números, '-' o '_' (hasta 40).")
+    destino = db.DB_PATH.parent / CARPETA_SITIOS / sitio / db.DB_PATH.name
+    db.init_db(str(destino))
+    refrescar()  # la carpeta del sitio pudo crearse antes que su DB
+    return destino
+
+
+# -------------------- Consolidado (ATTACH de todos los sitios) --------------------
+def _grupos(nombres: list) -> Iterator[list]:
+    for i in range(0, len(nombres), db.ARCHIVOS_MAX):
+        yield nombres[i:i + db.ARCHIVOS_MAX]
+
+
+def _adjuntar_sitios(grupo: list[tuple[str, Path]]) -> sqlite3.Connection:
+    """Conexión en memoria con las DBs del grupo adjuntas (solo lectura) y la vista temp.totales_sitios."""
+    conn = sqlite3.connect(":memory:", uri=True)
+    ramas = []
+    for i, (sitio, r) in enumerate(grupo):
+        conn.execute(f"ATTACH DATABASE ? AS s{i}", (f"{Path(r).resolve().as_uri()}?mode=ro",))
+        ramas.append(_RAMA.format(sitio=sitio.replace("'", "''"), e=f"s{i}"))
+    conn.execute("CREATE TEMP VIEW totales_sitios AS " + " UNION ALL ".join(ramas))
+    return conn
+
+
+def iter_consolidado(desde: date, hasta: date, bloque: int = reportes.BLOQUE) -> Iterator[tuple]:
+    """
+    Una fila (COLUMNAS) por sitio, trabajador y hoja viva con inicio en [desde, hasta], por sitio,
+    trabajador y semana. Los sitios cuya DB aún no existe se saltan.
+    """
+    nombres = [(s, r) for s, r in sitios().items() if Path(r).is_file()]
+    for _, r in nombres:
+        db.init_db(str(r))  # un sitio con schema viejo se migra antes de leerlo
+    for grupo in _grupos(nombres):
+        conn = _adjuntar_sitios(grupo)
+        try:
+            cur = conn.execute(
+                "SELECT * FROM totales_sitios WHERE semana_inicio BETWEEN ? AND ? "
+                "ORDER BY sitio, trabajador, semana_inicio",
+                (desde.isoformat(), hasta.isoformat()),
+            )
+            while filas := cur.fetchmany(bloque):
+                yield from filas
+        finally:
+            conn.close()
+
+
+def exportar_consolidado(desde: date, hasta: date, destino: Path | None = None) -> tuple[Path, int]:
+    """
+    CSV del consolidado (por defecto data/exportes/consolidado_<desde>_a_<hasta>.csv); devuelve (ruta, filas).
+    Igual que reportes.exportar_planilla: temporal en la misma carpeta y os.replace al terminar.
+    """
+    if destino is None:
+        destino = db.DB_PATH.parent / "exportes" / f"consolidado_{desde}_a_{hasta}.csv"
+    destino = Path(destino)
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=destino.parent, prefix=f".{destino.stem}_", suffix=".tmp", delete=False) as fh:
+        temporal = Path(fh.name)
+    n = 0
+    try:
+        with open(temporal, "w", newline="", encoding="utf-8") as fh:
+            w = csv.writer(fh)
+            w.writerow(COLUMNAS)
+            for fila in iter_consolidado(desde, hasta):
+                w.writerow(fila)
+                n += 1
+        os.replace(temporal, destino)
+    except BaseException:
+        temporal.unlink(missing_ok=True)
+        raise
+    return destino, n
+
+
+def resumen(desde: date, hasta: date) -> list[dict]:
+    """Por sitio: trabajadores, hojas y total a pagar en el rango (agregado en SQLite, por grupo)."""
+    nombres = [(s, r) for s, r in sitios().items() if Path(r).is_file()]
+    for _, r in nombres:
+        db.init_db(str(r))
+    salida = []
+    for grupo in _grupos(nombres):
+        conn = _adjuntar_sitios(grupo)
+        conn.row_factory = sqlite3.Row
+        try:
+            salida += [dict(r) for r in conn.execute(
+                """
+                SELECT sitio, COUNT(DISTINCT trabajador) AS trabajadores,
+                       COUNT(DISTINCT semana_inicio) AS hojas, SUM(total) AS total
+                FROM totales_sitios WHERE semana_inicio BETWEEN ? AND ?
+                GROUP BY sitio ORDER BY sitio
+                """,
+                (desde.isoformat(), hasta.isoformat()),
+            )]
+        finally:
+            conn.close()
+    return salida
+
+
+# -------------------- CLI --------------------
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = p.add_subparsers(dest="orden", required=True)
+    sub.add_parser("listar", help="sitios y sus DBs")
+    c = sub.add_parser("crear", help="crea la DB de un sitio nuevo")
+    c.add_argument("sitio")
+    k = sub.add_parser("consolidado", help="planilla de todos los sitios a CSV")
+    k.add_argument("desde", type=date.fromisoformat)
+    k.add_argument("hasta", type=date.fromisoformat)
+    k.add_argument("--salida", type=Path)
+    args = p.parse_args(argv)
+
+    if args.orden == "listar":
+        for sitio, r in sitios().items():
+            print(f"{sitio}: {r}{'' if Path(r).is_file() else '  (sin crear)'}")
+    elif args.orden == "crear":
+        print(f"{args.sitio}: {crear(args.sitio)}")
+    elif args.orden == "consolidado":
+        destino, n = exportar_consolidado(args.desde, args.hasta, args.salida)
+        print(f"{n} fila(s) → {destino}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,26 @@
+"""
+conftest.py — Cada prueba corre contra una DB nueva en tmp_path (db.DB_PATH apuntando ahí)
+"""
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import cache  # noqa: E402
+import db  # noqa: E402
+import escritor  # noqa: E402
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    """DB vacía y migrada; al terminar se detienen los escritores y se cierran las conexiones."""
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "registro.db")
+    db.fijar_ruta(None)
+    db.init_db()
+    cache.CACHE.limpiar()
+    yield db.DB_PATH
+    escritor.detener()
+    db.cerrar_conexiones()
+    cache.CACHE.limpiar()
@@ -0,0 +1,102 @@
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import datos
+
+APP = str(Path(__file__).resolve().parents[1] / "app.py")
+
+
+def test_selector_de_anio_sin_anios_vacios(base):
+    # Hojas en 2023 y 2025; 2024 no tiene ninguna
+    datos.ensure_semana(date(2023, 5, 1), date(2023, 5, 6), "Ana")
+    sid = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Beto")[0]
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["hoja_id"] = sid
+    at.run()
+    assert not at.exception
+    anio = at.sidebar.selectbox[0]
+    assert anio.options == ["2025", "2023"]
+
+    anio.set_value(2023).run()
+    assert not at.exception
+    assert at.sidebar.selectbox[1].value == datos.hojas_del_anio(2023)[0]["id"]
+
+
+def test_cambiar_de_hoja_no_copia_el_encargado(base):
+    a = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+    b = datos.ensure_semana(date(2025, 3, 10), date(2025, 3, 15), "Beto")[0]
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["hoja_id"] = a
+    at.run()
+    assert at.sidebar.text_input[0].value == "Ana"
+
+    at.sidebar.selectbox[1].set_value(b).run()
+    assert not at.exception
+    assert datos.hoja(b)["encargado"] == "Beto"
+    assert datos.hoja(a)["encargado"] == "Ana"
+
+
+def test_editor_de_trabajadores_en_hoja_archivada(base):
+    import archivo
+
+    sid = datos.ensure_semana(date(2023, 5, 1), date(2023, 5, 6), "Ana")[0]
+    tid = datos.guardar_registro(sid, date(2023, 5, 2), None, "Zoila", "Cocinera", "", 30.0, 0, 0.0)
+    datos.cambiar_estado_hoja(sid, True)
+    assert archivo.archivar(meses=1, hoy=date(2025, 1, 1))["hojas"] == 1
+
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["hoja_id"] = sid
+    at.run()
+    assert not at.exception
+    at.selectbox(key=f"edit_trab_sel_{sid}_").set_value(tid).run()
+    at.text_input(key=f"edit_cargo_{tid}").set_value("Jefa de cocina")
+    at.button(key=f"btn_save_trab_{tid}").click().run()
+    assert not at.exception
+    assert datos.trabajador(tid)["cargo"] == "Jefa de cocina"
+
+    at.button(key=f"btn_del_trab_{tid}").click().run()
+    assert not at.exception
+    assert not datos.trabajador(tid)["activo"]
+
+
+def _edicion(filas: dict) -> dict:
+    return {"edited_rows": filas, "added_rows": [], "deleted_rows": []}
+
+
+def test_grilla_guarda_sobre_la_fila_que_se_mostro(base):
+    sid = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+    beto = datos.guardar_registro(sid, date(2025, 3, 3), None, "Beto", "", "", 10.0, 0, 0.0)
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["hoja_id"] = sid
+    at.run()
+
+    # Otra sesión agrega un trabajador que queda antes en la grilla (orden por nombre)
+    aaron = datos.guardar_registro(sid, date(2025, 3, 3), None, "Aarón", "", "", 5.0, 0, 0.0)
+    at.session_state[f"grilla_{sid}_0"] = _edicion({0: {"Martes": 25.0}})  # fila 0 = Beto en pantalla
+    at.button(key=f"btn_grilla_{sid}").click().run()
+    assert not at.exception
+
+    grilla = datos.grilla_semana(sid).set_index("trabajador_id")
+    assert grilla.at[beto, "Martes"] == 25.0
+    assert pd.isna(grilla.at[aaron, "Martes"])
+
+
+def test_eliminar_seleccionados_borra_las_fechas_que_se_mostraron(base):
+    sid = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+    tid = datos.guardar_registro(sid, date(2025, 3, 3), None, "Beto", "", "", 10.0, 0, 0.0)
+    datos.guardar_registro(sid, date(2025, 3, 5), tid, "Beto", "", "", 20.0, 0, 0.0)
+    at = AppTest.from_file(APP, default_timeout=30)
+    at.session_state["hoja_id"] = sid
+    at.run()
+    at.selectbox(key=f"edit_trab_sel_{sid}_").set_value(tid).run()
+
+    # Otra sesión carga el martes: en una relectura, la fila 1 ya no sería el miércoles
+    datos.guardar_registro(sid, date(2025, 3, 4), tid, "Beto", "", "", 15.0, 0, 0.0)
+    at.session_state[f"ed_regs_{sid}_{tid}"] = _edicion({1: {"Seleccionar": True}})
+    at.button(key=f"del_sel_{sid}_{tid}").click().run()
+    assert not at.exception
+
+    assert datos.registros_trabajador(sid, tid)["fecha"].tolist() == ["2025-03-03", "2025-03-04"]
@@ -0,0 +1,78 @@
+import sqlite3
+import time
+from datetime import date
+
+import cache
+import datos
+import db
+
+
+def _hoja():
+    return datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+
+
+def test_escritura_propia_no_invalida_otras_tablas(base, monkeypatch):
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.05)
+    sid = _hoja()
+    datos.catalogo_trabajadores()
+    time.sleep(0.1)
+    datos.catalogo_trabajadores()  # el vigía ya vio el alta de la hoja
+    aciertos = cache.CACHE.stats()["aciertos"]
+
+    datos.actualizar_encargado(sid, "Beto")  # solo semanas (y sus derivadas)
+    time.sleep(0.1)
+    datos.catalogo_trabajadores()
+    assert cache.CACHE.stats()["aciertos"] == aciertos + 1
+    assert datos.hoja(sid)["encargado"] == "Beto"
+
+
+def test_escritura_de_otro_proceso_invalida(base, monkeypatch):
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.05)
+    assert datos.catalogo_trabajadores() == []
+    time.sleep(0.1)
+    datos.catalogo_trabajadores()
+
+    externa = sqlite3.connect(base)
+    with externa:
+        externa.execute("INSERT INTO trabajadores(nombre, cargo) VALUES ('Ana', 'Peón')")
+    externa.close()
+    time.sleep(0.1)
+    assert [t["nombre"] for t in datos.catalogo_trabajadores()] == ["Ana"]
+
+
+def _escribir_afuera(ruta, nombre: str) -> None:
+    externa = sqlite3.connect(ruta)
+    with externa:
+        externa.execute("INSERT INTO trabajadores(nombre) VALUES (?)", (nombre,))
+    externa.close()
+
+
+def test_escritura_externa_antes_de_una_propia(base, monkeypatch):
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.0)
+    sid = _hoja()
+    assert datos.catalogo_trabajadores() == []
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 3600.0)  # el vigía no vuelve a mirar solo
+
+    _escribir_afuera(base, "Ana")
+    datos.actualizar_encargado(sid, "Beto")  # solo semanas: no debe tapar la escritura de afuera
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.0)
+    assert [t["nombre"] for t in datos.catalogo_trabajadores()] == ["Ana"]
+
+
+def test_escritura_externa_justo_despues_del_commit_propio(base, monkeypatch):
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.0)
+    sid = _hoja()
+    assert datos.catalogo_trabajadores() == []
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 3600.0)
+
+    marcar = db._Pool.marcar_escritura
+
+    def con_intrusa(self, *args, **kwargs):
+        _escribir_afuera(base, "Ana")  # entre nuestro COMMIT y la lectura del vigía
+        return marcar(self, *args, **kwargs)
+
+    monkeypatch.setattr(db._Pool, "marcar_escritura", con_intrusa)
+    datos.actualizar_encargado(sid, "Beto")
+    monkeypatch.setattr(db._Pool, "marcar_escritura", marcar)
+    monkeypatch.setattr(db, "VIGIA_INTERVALO", 0.0)
+    assert [t["nombre"] for t in datos.catalogo_trabajadores()] == ["Ana"]
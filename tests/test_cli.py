@@ -0,0 +1,36 @@
+from datetime import date
+
+import archivo
+import cli
+import datos
+
+LUNES = date(2025, 3, 3)
+
+
+def test_codigos_de_salida(base, capsys):
+    def correr(*args: str) -> int:
+        return cli.main(["--db", str(base), *args])
+
+    assert correr("totales", "2025-03-05") == 1  # semana sin registros
+    assert "Sin registros en la semana del 2025-03-03" in capsys.readouterr().err
+
+    sid = datos.ensure_semana(LUNES, date(2025, 3, 8), "Ana")[0]
+    datos.guardar_registro(sid, LUNES, None, "Zoila", "", "", 35.0, 0, 0.0)
+    assert correr("totales", "2025-03-05") == 0
+    assert "TOTAL GENERAL" in capsys.readouterr().out
+    assert correr("totales", "2025-03-05", "--csv") == 0
+    assert capsys.readouterr().out.splitlines()[0].startswith("trabajador")
+
+    assert correr("exportar", "2025-03-31", "2025-03-01") == 2
+    assert correr("exportar", "2025-03-01", "2025-03-31") == 0
+    assert (base.parent / "exportes" / "planilla_2025-03-01_a_2025-03-31.csv").is_file()
+
+    assert correr("cerrar", "2025-03-12") == 1  # sin hoja
+    assert correr("cerrar", "2025-03-05") == 0
+    assert correr("cerrar", "2025-03-05") == 0  # ya estaba cerrada: no es un error
+    assert "ya estaba cerrada" in capsys.readouterr().out
+    assert archivo.archivar(meses=1, hoy=date(2026, 1, 1))["hojas"] == 1
+    assert correr("cerrar", "2025-03-05", "--abrir") == 1  # archivada: solo lectura
+    assert "archivada" in capsys.readouterr().err
+
+    assert cli.main(["--sitio", "no-existe", "totales", "2025-03-05"]) == 2
@@ -0,0 +1,173 @@
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+import datos
+import db
+
+LUNES = date(2025, 3, 3)
+
+
+def label_dow(idx: int) -> str:
+    return ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado"][idx]
+
+
+def vista_semanal_pivot(semana_id: int, sem_ini: date, sem_fin: date) -> pd.DataFrame:
+    """La vista semanal como la armaba app.py antes de datos.vista_semanal (pivot_table en pandas)."""
+    with db.get_conn() as conn:
+        df_det = pd.read_sql_query(
+            """
+            SELECT e.fecha, e.trabajador, e.actividad, e.monto, e.extra_monto,
+                   COALESCE(t.cargo, '') AS cargo
+            FROM entradas e
+            LEFT JOIN trabajadores t ON t.nombre = e.trabajador
+            WHERE e.semana_id=? AND date(e.fecha) BETWEEN date(?) AND date(?)
+            ORDER BY e.trabajador, date(e.fecha)
+            """,
+            conn,
+            params=(semana_id, sem_ini.isoformat(), sem_fin.isoformat()),
+        )
+    df_det["fecha"] = pd.to_datetime(df_det["fecha"]).dt.date
+    df_det["dow"] = pd.to_datetime(df_det["fecha"]).dt.weekday
+
+    df_pivot = df_det.pivot_table(index=["trabajador"], columns="dow", values="monto", aggfunc="sum").fillna(0)
+    df_pivot = df_pivot.rename(columns={i: label_dow(i) for i in range(6)})
+
+    extras = (
+        df_det[df_det["dow"] == 5]
+        .groupby("trabajador", as_index=False)
+        .agg(monto_adicional=("extra_monto", "sum"))
+    )
+    dias = df_det.groupby("trabajador")["fecha"].nunique().rename("dias").reset_index()
+    cargos = df_det.groupby("trabajador")["cargo"].agg(lambda x: next((v for v in x if v), "")).rename("cargo").reset_index()
+
+    df_sem = (
+        df_pivot.reset_index()
+        .merge(extras, on="trabajador", how="left")
+        .merge(dias, on="trabajador", how="left")
+        .merge(cargos, on="trabajador", how="left")
+    )
+    df_sem["monto_adicional"] = df_sem["monto_adicional"].fillna(0.0)
+    df_sem["dias"] = df_sem["dias"].fillna(0).astype(int)
+
+    cols_dias = [c for c in df_sem.columns if c in [label_dow(i) for i in range(6)]]
+    df_sem["Total semana"] = df_sem[cols_dias].sum(axis=1) + df_sem["monto_adicional"]
+
+    columnas = ["trabajador", "cargo"] + cols_dias + ["dias", "monto_adicional", "Total semana"]
+    return df_sem[columnas].rename(columns={"monto_adicional": "Monto adicional"})
+
+
+def _registrar(sid: int, dia: int, nombre: str, cargo: str, monto: float, extra: float = 0.0) -> None:
+    datos.guardar_registro(sid, LUNES + timedelta(days=dia), None, nombre, cargo, "", monto, int(extra > 0), extra)
+
+
+# fin Sábado: hoja actual; fin Domingo: hoja antigua Lun–Dom (los domingos entran en el rango)
+@pytest.mark.parametrize("fin", [LUNES + timedelta(days=5), LUNES + timedelta(days=6)])
+def test_vista_semanal_igual_al_pivot(base, fin):
+    sid = datos.ensure_semana(LUNES, fin, "Ana")[0]
+    _registrar(sid, 0, "Zoila", "Cocinera", 35.5)
+    _registrar(sid, 2, "Zoila", "Cocinera", 40.0)
+    _registrar(sid, 5, "Zoila", "Cocinera", 20.0, extra=15.0)  # sábado con adicional
+    _registrar(sid, 6, "Zoila", "Cocinera", 50.0)  # domingo: cuenta como día, no suma montos
+    _registrar(sid, 1, "Beto", "", 30.0)
+    _registrar(sid, 5, "Beto", "", 30.0)  # sábado sin adicional
+    _registrar(sid, 6, "Carla", "Peón", 25.0)  # solo domingo
+    _registrar(sid, 3, "Ana", "Capataz", 60.0)
+    _registrar(sid, 4, "Ana", "Capataz", 60.0)
+    otra = datos.ensure_semana(LUNES + timedelta(weeks=1), fin + timedelta(weeks=1), "Ana")[0]
+    datos.guardar_registro(otra, LUNES + timedelta(weeks=1), None, "Beto", "", "", 99.0, 0, 0.0)
+
+    esperada = vista_semanal_pivot(sid, LUNES, fin)
+    pd.testing.assert_frame_equal(datos.vista_semanal(sid, LUNES, fin), esperada)
+
+    # Cerrada se lee de la instantánea: el mismo resultado
+    datos.cambiar_estado_hoja(sid, True)
+    pd.testing.assert_frame_equal(datos.vista_semanal(sid, LUNES, fin), esperada)
+
+
+def test_verificar_instantaneas_reporta_y_repara_la_deriva(base):
+    sid = datos.ensure_semana(LUNES, LUNES + timedelta(days=5), "Ana")[0]
+    _registrar(sid, 0, "Zoila", "Cocinera", 35.5)
+    _registrar(sid, 5, "Zoila", "Cocinera", 20.0, extra=15.0)
+    otra = datos.ensure_semana(LUNES + timedelta(weeks=1), LUNES + timedelta(days=12), "Ana")[0]
+    datos.guardar_registro(otra, LUNES + timedelta(weeks=1), None, "Beto", "", "", 30.0, 0, 0.0)
+    datos.cambiar_estado_hoja(sid, True)
+    datos.cambiar_estado_hoja(otra, True)
+    assert datos.verificar_instantaneas() == []
+
+    with db.get_conn() as conn:
+        vista = datos._desempacar(conn.execute("SELECT vista FROM instantaneas WHERE semana_id=?", (sid,)).fetchone()[0])
+        vista.loc[0, "Lunes"] = 99.0
+        conn.execute("UPDATE instantaneas SET vista=?, montos=? WHERE semana_id=?",
+                     (datos._empacar(vista), datos._empacar(vista), sid))
+        conn.execute("DELETE FROM instantaneas WHERE semana_id=?", (otra,))
+
+    problemas = datos.verificar_instantaneas(reparar=True)
+    assert sorted((p["semana_id"], p["problema"]) for p in problemas) == sorted(
+        [(sid, "vista distinta"), (sid, "montos distintos"), (otra, "falta")]
+    )
+    assert datos.verificar_instantaneas() == []
+    assert datos.vista_semanal(sid, LUNES, LUNES + timedelta(days=5)).loc[0, "Lunes"] == 35.5
+
+
+def test_guardar_grilla_rechaza_la_hoja_cerrada(base):
+    fin = LUNES + timedelta(days=5)
+    sid = datos.ensure_semana(LUNES, fin, "Ana")[0]
+    _registrar(sid, 0, "Zoila", "Cocinera", 35.0)
+
+    original = datos.grilla_semana(sid)
+    editada = original.copy()
+    editada.loc[0, "Martes"] = 40.0
+    editada.loc[0, "Lunes"] = None
+    assert datos.guardar_grilla(sid, LUNES, original, editada) == (1, 1)
+    assert datos.registros_trabajador(sid, int(original.loc[0, "trabajador_id"]))["monto"].tolist() == [40.0]
+
+    original = datos.grilla_semana(sid)
+    editada = original.copy()
+    editada.loc[0, "Sábado"] = 10.0
+    datos.cambiar_estado_hoja(sid, True)
+    with pytest.raises(ValueError, match="cerrada"):
+        datos.guardar_grilla(sid, LUNES, original, editada)
+    assert datos.contar_registros(sid) == 1
+    pd.testing.assert_frame_equal(datos.grilla_semana(sid), original)
+
+
+def test_eliminar_hojas_rango_borra_en_cascada(base):
+    hojas = [datos.ensure_semana(LUNES + timedelta(weeks=k), LUNES + timedelta(weeks=k, days=5), "Ana")[0] for k in range(3)]
+    for k, sid in enumerate(hojas):
+        datos.guardar_registro(sid, LUNES + timedelta(weeks=k), None, "Zoila", "", "", 10.0 * (k + 1), 0, 0.0)
+    datos.cambiar_estado_hoja(hojas[1], True)  # con instantánea
+
+    assert datos.eliminar_hojas_rango(LUNES, LUNES + timedelta(weeks=1)) == 2
+
+    with db.get_conn() as conn:
+        restantes = {
+            tabla: [r[0] for r in conn.execute(f"SELECT DISTINCT semana_id FROM {tabla}")]
+            for tabla in ("entradas", "totales_semana", "instantaneas")
+        }
+    assert restantes == {"entradas": [hojas[2]], "totales_semana": [hojas[2]], "instantaneas": []}
+    assert datos.list_hojas()["id"].tolist() == [hojas[2]]
+    assert db.verificar_totales() == []
+
+
+def test_buscar_trabajadores_sin_tildes_ni_mayusculas(base):
+    sid = datos.ensure_semana(LUNES, LUNES + timedelta(days=5), "Ana")[0]
+    for nombre, cargo in [("José Muñoz", "Albañil"), ("Jose María", "Peón"), ("Ángela Ruiz", "Cocinera"), ("Beto", "")]:
+        _registrar(sid, 0, nombre, cargo, 10.0)
+    ids = {t["nombre"]: t["id"] for t in datos.catalogo_trabajadores()}
+    datos.desactivar_trabajador(ids["Ángela Ruiz"])
+
+    def nombres(texto, solo_activos=True):
+        return sorted(r["nombre"] for r in datos.buscar_trabajadores(texto, 20, solo_activos))
+
+    assert nombres("jose mu") == ["José Muñoz"]
+    assert nombres("JOSE") == ["Jose María", "José Muñoz"]
+    assert nombres("albanil") == ["José Muñoz"]
+    assert nombres("angela") == []  # inactiva
+    assert nombres("cocin", False) == ["Ángela Ruiz"]
+    assert nombres('jo"se ') == []  # comillas y espacios no rompen la consulta FTS
+
+    datos.actualizar_trabajador(ids["Beto"], "Bértolo", "Capataz", True)  # el índice sigue al catálogo
+    assert nombres("berto") == ["Bértolo"]
+    assert nombres("capa") == ["Bértolo"]
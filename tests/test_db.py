@@ -0,0 +1,245 @@
+import re
+import sqlite3
+from datetime import date, timedelta
+
+import pytest
+
+import datos
+import db
+
+
+def test_db_sin_version_sube_hasta_la_ultima_migracion(tmp_path, monkeypatch):
+    ruta = tmp_path / "vieja.db"
+    conn = sqlite3.connect(ruta)  # schema de antes del control de versiones: sin cargo, cerrada ni extras
+    conn.executescript("""
+        CREATE TABLE semanas (id INTEGER PRIMARY KEY AUTOINCREMENT, semana_inicio TEXT NOT NULL,
+                              semana_fin TEXT NOT NULL, encargado TEXT NOT NULL, UNIQUE (semana_inicio, semana_fin));
+        CREATE TABLE trabajadores (id INTEGER PRIMARY KEY AUTOINCREMENT, nombre TEXT NOT NULL UNIQUE,
+                                   activo INTEGER NOT NULL DEFAULT 1);
+        CREATE TABLE entradas (id INTEGER PRIMARY KEY AUTOINCREMENT, semana_id INTEGER NOT NULL, fecha TEXT NOT NULL,
+                               trabajador TEXT NOT NULL, actividad TEXT, monto REAL NOT NULL DEFAULT 0,
+                               UNIQUE(semana_id, fecha, trabajador));
+        INSERT INTO semanas VALUES (1, '2025-03-03', '2025-03-08', 'Ana');
+        INSERT INTO trabajadores(nombre) VALUES ('Ana');
+        INSERT INTO entradas(semana_id, fecha, trabajador, monto) VALUES (1, '2025-03-03', 'Ana', 10), (1, '2025-03-08', 'Ana', 20);
+    """)
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", ruta)
+    db.init_db()
+    try:
+        with db.get_conn() as conn:
+            assert db.version_schema(conn) == len(db.MIGRACIONES)
+            for tabla, col in [("trabajadores", "cargo"), ("semanas", "cerrada"), ("entradas", "extra_monto"),
+                               ("entradas", "trabajador_id")]:
+                assert db._has_column(conn, tabla, col)
+        assert datos.contar_registros(1) == 2
+        assert db.verificar_totales() == []
+
+        # Al día: otra pasada (p. ej. otro proceso) solo lee user_version, no vuelve a migrar
+        monkeypatch.setattr(db, "_migradas", set())
+        monkeypatch.setattr(db, "_migrar", lambda conn: pytest.fail("migró una DB al día"))
+        db.init_db()
+    finally:
+        db.cerrar_conexiones()
+
+
+def test_m002_manda_a_cuarentena_las_fechas_que_no_normaliza(tmp_path, monkeypatch):
+    ruta = tmp_path / "vieja.db"
+    conn = sqlite3.connect(ruta)
+    conn.row_factory = sqlite3.Row
+    db._m001_esquema_base(conn)
+    conn.execute("INSERT INTO semanas(id, semana_inicio, semana_fin, encargado) VALUES (1, '2025-03-03', '2025-03-08', 'Ana')")
+    conn.executemany(
+        "INSERT INTO entradas(semana_id, fecha, trabajador, monto) VALUES (1, ?, ?, ?)",
+        [
+            ("2025-03-03", "Ana", 10),
+            ("2025-03-03 08:00", "Ana", 99),   # choca con la de arriba al normalizarse
+            ("2025-03-04T00:00:00", "Beto", 20),  # se normaliza sin chocar
+            ("03/05/2025", "Ana", 30),          # date() no la entiende
+        ],
+    )
+    conn.execute("PRAGMA user_version=1")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", ruta)
+    db.init_db()
+    try:
+        with db.get_conn() as conn:
+            vivas = [tuple(r) for r in conn.execute("SELECT fecha, trabajador, monto FROM entradas ORDER BY fecha")]
+            cuarentena = [tuple(r) for r in conn.execute(
+                "SELECT fecha, trabajador, monto, motivo FROM entradas_cuarentena ORDER BY id"
+            )]
+    finally:
+        db.cerrar_conexiones()
+    assert vivas == [("2025-03-03", "Ana", 10.0), ("2025-03-04", "Beto", 20.0)]
+    assert cuarentena == [
+        ("2025-03-03 08:00", "Ana", 99.0, "repetida al normalizar la fecha"),
+        ("03/05/2025", "Ana", 30.0, "fecha inválida"),
+    ]
+
+
+
+def test_m002_une_las_hojas_que_chocan_al_normalizar(tmp_path, monkeypatch):
+    ruta = tmp_path / "vieja.db"
+    conn = sqlite3.connect(ruta)
+    conn.row_factory = sqlite3.Row
+    db._m001_esquema_base(conn)
+    conn.executemany(
+        "INSERT INTO semanas(id, semana_inicio, semana_fin, encargado) VALUES (?, ?, ?, 'Ana')",
+        [
+            (1, "2025-03-03", "2025-03-08"),
+            (2, "2025-03-03 00:00", "2025-03-08"),  # la misma hoja con hora: se une a la 1
+            (3, "3/10/2025", "2025-03-15"),          # date() no la entiende
+        ],
+    )
+    conn.executemany(
+        "INSERT INTO entradas(semana_id, fecha, trabajador, monto) VALUES (?, ?, ?, ?)",
+        [
+            (1, "2025-03-03", "Ana", 10),
+            (2, "2025-03-03", "Ana", 99),   # ya está en la hoja 1
+            (2, "2025-03-04", "Beto", 20),  # pasa a la hoja 1
+            (3, "2025-03-10", "Ana", 30),
+        ],
+    )
+    conn.execute("PRAGMA user_version=1")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", ruta)
+    db.init_db()
+    try:
+        with db.get_conn() as conn:
+            hojas = [tuple(r) for r in conn.execute("SELECT id, semana_inicio, semana_fin FROM semanas")]
+            vivas = [tuple(r) for r in conn.execute("SELECT semana_id, fecha, trabajador, monto FROM entradas ORDER BY fecha")]
+            hojas_q = [tuple(r) for r in conn.execute(
+                "SELECT id, semana_inicio, unida_a, motivo FROM semanas_cuarentena ORDER BY id"
+            )]
+            entradas_q = [tuple(r) for r in conn.execute(
+                "SELECT semana_id, trabajador, monto, motivo FROM entradas_cuarentena ORDER BY id"
+            )]
+    finally:
+        db.cerrar_conexiones()
+    assert hojas == [(1, "2025-03-03", "2025-03-08")]
+    assert vivas == [(1, "2025-03-03", "Ana", 10.0), (1, "2025-03-04", "Beto", 20.0)]
+    assert hojas_q == [
+        (2, "2025-03-03 00:00", 1, "repetida al normalizar la fecha"),
+        (3, "3/10/2025", None, "fecha inválida"),
+    ]
+    assert entradas_q == [(2, "Ana", 99.0, "repetida al unir hojas"), (3, "Ana", 30.0, "hoja con fecha inválida")]
+
+
+
+def test_m003_completa_trabajador_id_y_sigue_los_renombres(base, tmp_path, monkeypatch):
+    ruta = tmp_path / "vieja.db"
+    conn = sqlite3.connect(ruta)
+    conn.row_factory = sqlite3.Row
+    db._m001_esquema_base(conn)
+    db._m002_fechas_indexables(conn)
+    conn.execute("INSERT INTO semanas(id, semana_inicio, semana_fin, encargado) VALUES (1, '2025-03-03', '2025-03-08', 'Ana')")
+    conn.execute("INSERT INTO trabajadores(nombre, cargo) VALUES ('Ana', 'Capataz')")
+    conn.executemany(
+        "INSERT INTO entradas(semana_id, fecha, trabajador, monto) VALUES (1, ?, ?, ?)",
+        [("2025-03-03", "Ana", 10), ("2025-03-04", "Ana", 20), ("2025-03-04", "Zoila", 30)],  # Zoila no está en el catálogo
+    )
+    conn.execute("PRAGMA user_version=2")
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db, "DB_PATH", ruta)
+    db.init_db()
+    with db.get_conn() as conn:
+        catalogo = {r["nombre"]: (r["id"], r["activo"]) for r in conn.execute("SELECT id, nombre, activo FROM trabajadores")}
+        ids = [(r["trabajador"], r["trabajador_id"]) for r in conn.execute("SELECT * FROM entradas ORDER BY id")]
+    assert catalogo["Zoila"][1] == 0  # solo estaba en entradas: entra inactiva
+    assert ids == [("Ana", catalogo["Ana"][0]), ("Ana", catalogo["Ana"][0]), ("Zoila", catalogo["Zoila"][0])]
+
+    datos.actualizar_trabajador(catalogo["Ana"][0], "Ana María", "Capataz", True)
+    with db.get_conn() as conn:
+        nombres = [r[0] for r in conn.execute("SELECT trabajador FROM entradas ORDER BY id")]
+    assert nombres == ["Ana María", "Ana María", "Zoila"]
+    assert len(datos.registros_trabajador(1, catalogo["Ana"][0])) == 2
+
+
+@pytest.fixture
+def consultas(base, monkeypatch):
+    """SQL (con los parámetros ya sustituidos) de cada consulta que corre en las conexiones del pool."""
+    sqls = []
+    abrir = db._Pool._abrir
+
+    def _abrir(self):
+        conn = abrir(self)
+        conn.set_trace_callback(sqls.append)
+        return conn
+
+    monkeypatch.setattr(db._Pool, "_abrir", _abrir)
+    db.cerrar_conexiones()
+    return sqls
+
+
+def _plan(sql: str) -> list[str]:
+    with db.get_conn() as conn:
+        return [r["detail"] for r in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+
+
+def _consulta(sqls: list[str], fragmento: str) -> str:
+    (sql,) = [s for s in sqls if fragmento in s]
+    return sql
+
+
+def test_consultas_de_navegacion_usan_indices_cubrientes(consultas):
+    ini = date(2025, 3, 3)
+    for k in range(3):
+        sid = datos.ensure_semana(ini + timedelta(weeks=k), ini + timedelta(weeks=k, days=5), "Ana")[0]
+        for d in range(6):
+            datos.guardar_registro(sid, ini + timedelta(weeks=k, days=d), None, f"T{d % 2}", "", "", 10.0, d == 5, 5.0)
+    medio = ini + timedelta(weeks=1)
+    consultas.clear()
+
+    datos.hojas_del_anio(2025)
+    datos.hoja_vecina(medio, -1)
+    datos.hoja_vecina(medio, +1)
+    datos.vista_semanal(sid, ini + timedelta(weeks=2), ini + timedelta(weeks=2, days=5))
+    datos.grilla_semana(sid)
+
+    casos = {
+        "hojas del año": _consulta(consultas, "WHERE semana_inicio BETWEEN"),
+        "hoja anterior": _consulta(consultas, "semana_inicio < "),
+        "hoja siguiente": _consulta(consultas, "semana_inicio > "),
+        "vista semanal": _consulta(consultas, 'AS "Total semana"'),
+        "grilla": _consulta(consultas, f'AS "{datos.COL_ADICIONAL}"'),
+    }
+    for caso, sql in casos.items():
+        plan = _plan(sql)
+        lecturas = [p for p in plan if re.match(r"(SEARCH|SCAN) (main\.)?(semanas|entradas|e)\b", p)]
+        assert lecturas, (caso, plan)
+        for p in lecturas:
+            # El índice de la restricción UNIQUE (sqlite_autoindex_*) también vale si cubre la consulta
+            assert re.search(r"USING COVERING INDEX (idx_|sqlite_autoindex_)", p), (caso, plan)
+            assert not p.startswith("SCAN"), (caso, plan)
+
+
+def test_verificar_totales_reporta_y_repara_la_deriva(base):
+    lunes = date(2025, 3, 3)
+    sid = datos.ensure_semana(lunes, lunes + timedelta(days=5), "Ana")[0]
+    datos.guardar_registro(sid, lunes, None, "Zoila", "", "", 35.0, 0, 0.0)
+    datos.guardar_registro(sid, lunes + timedelta(days=5), None, "Zoila", "", "", 20.0, 1, 15.0)
+    datos.guardar_registro(sid, lunes, None, "Beto", "", "", 30.0, 0, 0.0)
+    assert db.verificar_totales() == []
+
+    externa = sqlite3.connect(base)
+    with externa:
+        externa.execute(
+            "UPDATE totales_semana SET monto_semana = monto_semana + 1, dias = 9"
+            " WHERE trabajador_id = (SELECT id FROM trabajadores WHERE nombre='Zoila')"
+        )
+        externa.execute("DELETE FROM totales_semana WHERE trabajador_id = (SELECT id FROM trabajadores WHERE nombre='Beto')")
+    externa.close()
+
+    deriva = {(d["dias_tabla"], d["dias_real"], d["monto_semana_tabla"], d["monto_semana_real"])
+              for d in db.verificar_totales()}
+    assert deriva == {(9, 2, 56.0, 55.0), (None, 1, None, 30.0)}
+
+    assert len(db.verificar_totales(reparar=True)) == 2
+    assert db.verificar_totales() == []
@@ -0,0 +1,94 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+import datos
+import db
+import escritor
+from escritor import escritura
+
+HILOS = 8
+ESCRITURAS = 12  # por hilo: más de un lote entre todos (escritor.LOTE_MAX)
+LUNES = date(2025, 3, 3)
+
+
+@escritura(tablas=("entradas",))
+def _upsert(conn, semana_id: int, fecha: date, trabajador_id: int, nombre: str, monto: float) -> None:
+    conn.execute(
+        """
+        INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, monto)
+        VALUES (?,?,?,?,?)
+        ON CONFLICT(semana_id, trabajador_id, fecha) DO UPDATE SET monto=excluded.monto
+        """,
+        (semana_id, fecha.isoformat(), trabajador_id, nombre, monto),
+    )
+
+
+@escritura(tablas=("entradas",))
+def _falla(conn, semana_id: int, trabajador_id: int) -> None:
+    conn.execute(
+        "INSERT INTO entradas(semana_id, fecha, trabajador_id, trabajador, monto) VALUES (?,?,?,'Fantasma',999)",
+        (semana_id, LUNES.isoformat(), trabajador_id),
+    )
+    raise ValueError("falla a propósito")
+
+
+@escritura(tablas=())
+def _esperar(conn, puerta: threading.Event) -> None:
+    puerta.wait(10)
+
+
+def test_escrituras_concurrentes_con_una_fallida(base):
+    sid = datos.ensure_semana(LUNES, LUNES + timedelta(days=5), "Ana")[0]
+    with db.get_conn() as conn:
+        conn.executemany(
+            "INSERT INTO trabajadores(nombre) VALUES (?)", [(f"T{n}",) for n in range(HILOS)] + [("Fantasma",)]
+        )
+        ids = {r["nombre"]: r["id"] for r in conn.execute("SELECT id, nombre FROM trabajadores")}
+
+    # El escritor queda ocupado hasta que todos encolaron: los lotes siguientes salen llenos
+    puerta = threading.Event()
+    bloqueo = _esperar.enviar(puerta)
+    barrera = threading.Barrier(HILOS)
+
+    def hilo(n: int) -> tuple[dict, list, object]:
+        esperado, futuros, fallida = {}, [], None
+        barrera.wait()
+        for k in range(ESCRITURAS):
+            fecha, monto = LUNES + timedelta(days=k % 6), float(10 * n + k)
+            futuros.append(_upsert.enviar(sid, fecha, ids[f"T{n}"], f"T{n}", monto))
+            esperado[(ids[f"T{n}"], fecha.isoformat())] = monto  # cada hilo escribe solo sus filas
+            if n == 0 and k == ESCRITURAS // 2:
+                fallida = _falla.enviar(sid, ids["Fantasma"])
+        return esperado, futuros, fallida
+
+    with ThreadPoolExecutor(HILOS) as pool:
+        enviados = list(pool.map(hilo, range(HILOS)))
+    puerta.set()
+    bloqueo.result(10)
+
+    esperado = {k: v for e, _, _ in enviados for k, v in e.items()}
+    for _, futuros, _ in enviados:
+        for f in futuros:
+            assert f.result(10) is None
+    fallida = enviados[0][2]
+    with pytest.raises(ValueError, match="a propósito"):
+        fallida.result(10)
+    assert escritor.stats()["lotes"] < HILOS * ESCRITURAS  # la fallida compartió lote con otras
+
+    with db.get_conn() as conn:
+        filas = {(r["trabajador_id"], r["fecha"]): r["monto"] for r in conn.execute(
+            "SELECT trabajador_id, fecha, monto FROM entradas WHERE semana_id=?", (sid,)
+        )}
+        totales = {r["trabajador_id"]: (r["dias"], r["monto_semana"]) for r in conn.execute(
+            "SELECT trabajador_id, dias, monto_semana FROM totales_semana WHERE semana_id=?", (sid,)
+        )}
+    assert filas == esperado  # sin la fila de la escritura fallida
+    por_trabajador = {}
+    for (tid, _), monto in esperado.items():
+        dias, suma = por_trabajador.get(tid, (0, 0.0))
+        por_trabajador[tid] = (dias + 1, suma + monto)
+    assert totales == por_trabajador
+    assert db.verificar_totales() == []
@@ -0,0 +1,54 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import datos
+import db
+import historial
+import sincronizacion
+
+LUNES = date(2025, 3, 3)
+
+
+def _desde_totales() -> pd.DataFrame:
+    """Lo que historial.resumen() tiene que dar: las sumas de totales_semana por trabajador."""
+    with db.get_conn() as conn:
+        return pd.read_sql_query(
+            "SELECT trabajador_id, SUM(dias) AS dias, SUM(monto_semana) AS monto, SUM(monto_adicional) AS adicional "
+            "FROM totales_semana GROUP BY trabajador_id HAVING SUM(dias) > 0 ORDER BY trabajador_id",
+            conn, index_col="trabajador_id",
+        )
+
+
+def _igual_a_totales() -> None:
+    res = historial.resumen()[["dias", "monto", "adicional"]]
+    pd.testing.assert_frame_equal(res, _desde_totales(), check_dtype=False, check_index_type=False)
+
+
+def test_refresco_incremental_igual_a_reconstruir(base):
+    cache = historial.cache_actual()
+    hojas = [datos.ensure_semana(LUNES + timedelta(weeks=k), LUNES + timedelta(weeks=k, days=5), "Ana")[0] for k in range(2)]
+    for k, sid in enumerate(hojas):
+        lunes = LUNES + timedelta(weeks=k)
+        datos.guardar_registro(sid, lunes, None, "Zoila", "", "", 35.0, 0, 0.0)
+        datos.guardar_registro(sid, lunes + timedelta(days=5), None, "Zoila", "", "", 20.0, 1, 15.0)
+        datos.guardar_registro(sid, lunes + timedelta(days=1), None, "Beto", "", "", 30.0, 0, 0.0)
+    _igual_a_totales()
+    assert cache.refrescos["reconstruccion"] == 1  # la primera vez no hay caché en disco
+
+    beto = next(t["id"] for t in datos.catalogo_trabajadores() if t["nombre"] == "Beto")
+    datos.guardar_registro(hojas[0], LUNES, None, "Zoila", "", "", 40.0, 0, 0.0)           # update
+    datos.guardar_registro(hojas[1], LUNES + timedelta(weeks=1, days=5), None, "Zoila", "", "", 20.0, 0, 0.0)  # sin adicional
+    datos.eliminar_registros(hojas[0], beto, [(LUNES + timedelta(days=1)).isoformat()])  # delete
+    datos.actualizar_trabajador(beto, "Alberto", "", True)                                 # renombre
+    datos.guardar_registro(hojas[1], LUNES + timedelta(weeks=1, days=2), beto, "Alberto", "", "", 25.0, 0, 0.0)
+    _igual_a_totales()
+    assert (cache.refrescos["incremental"], cache.refrescos["reconstruccion"]) == (1, 1)
+
+    # Con el diario podado más allá de la marca de la caché ya no alcanza: se reconstruye
+    datos.guardar_registro(hojas[1], LUNES + timedelta(weeks=1, days=3), beto, "Alberto", "", "", 25.0, 0, 0.0)
+    with db.get_conn() as conn:
+        seq = conn.execute("SELECT MAX(seq) FROM cambios").fetchone()[0]
+    sincronizacion.podar(seq)
+    _igual_a_totales()
+    assert cache.refrescos["reconstruccion"] == 2
@@ -0,0 +1,61 @@
+import io
+from datetime import date
+
+import datos
+import db
+import importador
+
+CSV = """fecha,trabajador,cargo,monto,extra_monto
+2025-03-03,Ana,Capataz,50,
+2025-03-08,Ana,Capataz,40,10
+2025-03-10,Beto,,30,
+"""
+
+
+def _semanas(inicio: str) -> list[tuple]:
+    with db.get_conn() as conn:
+        return [tuple(r) for r in conn.execute(
+            "SELECT id, semana_fin FROM semanas WHERE semana_inicio=? ORDER BY id", (inicio,)
+        )]
+
+
+def test_importa_en_la_hoja_antigua_lunes_a_domingo(base):
+    antigua = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 9), "Ana")[0]  # Lun–Dom
+
+    res = importador.importar(importador.leer(io.StringIO(CSV), "registros.csv"))
+
+    assert res["errores"].empty
+    assert (res["importadas"], res["hojas_creadas"]) == (3, 1)  # solo la del 10/03
+    assert _semanas("2025-03-03") == [(antigua, "2025-03-09")]
+    assert _semanas("2025-03-10")[0][1] == "2025-03-15"
+    assert datos.contar_registros(antigua) == 2
+
+
+def test_hoja_antigua_cerrada_rechaza_sus_filas(base):
+    antigua = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 9), "Ana")[0]
+    datos.cambiar_estado_hoja(antigua, True)
+
+    res = importador.importar(importador.leer(io.StringIO(CSV), "registros.csv"))
+
+    assert res["errores"].to_dict("records") == [
+        {"fila": 2, "error": "hoja cerrada"}, {"fila": 3, "error": "hoja cerrada"},
+    ]
+    assert res["importadas"] == 1
+    assert _semanas("2025-03-03") == [(antigua, "2025-03-09")]
+
+
+def test_hoja_cerrada_despues_de_validar_va_al_reporte(base, monkeypatch):
+    crear = importador._crear_hojas_y_trabajadores
+
+    def y_cerrar(semanas, trabajadores):
+        hojas, *resto = crear(semanas, trabajadores)
+        datos.cambiar_estado_hoja(hojas["2025-03-03"], True)  # otra sesión cierra la hoja en el medio
+        return hojas, *resto
+
+    monkeypatch.setattr(importador, "_crear_hojas_y_trabajadores", y_cerrar)
+    res = importador.importar(importador.leer(io.StringIO(CSV), "registros.csv"), lote=1)
+
+    assert res["errores"].to_dict("records") == [
+        {"fila": 2, "error": "hoja cerrada"}, {"fila": 3, "error": "hoja cerrada"},
+    ]
+    assert res["importadas"] == 1
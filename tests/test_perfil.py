@@ -0,0 +1,30 @@
+import json
+from datetime import date
+
+import datos
+import perfil
+
+
+def test_volcar_agrega_una_linea_por_rerun(base, tmp_path):
+    sid = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+    datos.guardar_registro(sid, date(2025, 3, 3), None, "Zoila", "", "", 35.0, 0, 0.0)
+    ruta = tmp_path / "perfil_sql.jsonl"
+    try:
+        perfil.iniciar(True)
+        with perfil.seccion("grilla"):
+            assert datos.contar_registros(sid) == 1
+        perfil.volcar(ruta, {"hoja_id": sid})
+
+        perfil.iniciar(False)  # apagado no mide nada, pero volcar igual deja su línea
+        datos.list_hojas()
+        perfil.volcar(ruta)
+    finally:
+        perfil.iniciar(False)
+
+    medido, apagado = [json.loads(linea) for linea in ruta.read_text(encoding="utf-8").splitlines()]
+    assert medido["hoja_id"] == sid
+    assert medido["consultas"] >= 1 and medido["db_ms"] >= 0
+    assert set(medido["secciones_ms"]) == {"grilla"}
+    assert any("entradas WHERE semana_id" in c["sql"] and c["filas"] == 1 and c["params"] == "tuple[1]"
+               for c in medido["mas_lentas"])
+    assert (apagado["consultas"], apagado["mas_lentas"], apagado["secciones_ms"]) == (0, [], {})
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+import datos
+import reportes
+
+DESDE, HASTA = date(2025, 3, 3), date(2025, 3, 15)
+
+
+@pytest.fixture
+def planilla(base):
+    for lunes in (date(2025, 3, 3), date(2025, 3, 10)):
+        sid = datos.ensure_semana(lunes, lunes.replace(day=lunes.day + 5), "Ana")[0]
+        for i, nombre in enumerate(("Ana", "Beto", "Carla")):
+            datos.guardar_registro(sid, lunes, None, nombre, "", "", 10.0 * (i + 1), 0, 0.0)
+    return base.parent / "exportes"
+
+
+def test_exportes_simultaneos_del_mismo_rango(planilla):
+    with ThreadPoolExecutor(4) as pool:
+        resultados = list(pool.map(lambda _: reportes.exportar_planilla(DESDE, HASTA), range(8)))
+
+    destino, n = resultados[0]
+    assert {r for r in resultados} == {(destino, n)}
+    lineas = destino.read_text(encoding="utf-8").splitlines()
+    assert len(lineas) == n + 1 and lineas[-1].startswith("TOTAL GENERAL")
+    assert [p.name for p in planilla.iterdir()] == [destino.name]  # sin temporales
+
+
+def test_export_fallido_no_deja_archivos(planilla, monkeypatch):
+    def falla(*args, **kwargs):
+        yield ("Ana", "", "2025-03-03", "2025-03-08", 1, 10.0, 0.0, 10.0)
+        raise RuntimeError("se cortó la lectura")
+
+    monkeypatch.setattr(reportes, "iter_planilla_rango", falla)
+    with pytest.raises(RuntimeError):
+        reportes.exportar_planilla(DESDE, HASTA)
+    assert list(planilla.iterdir()) == []
+
+
+def test_export_xlsx(planilla):
+    pytest.importorskip("openpyxl")
+    destino, n = reportes.exportar_planilla(DESDE, HASTA, "xlsx")
+    assert destino.suffix == ".xlsx" and n > 0
+    assert [p.name for p in planilla.iterdir()] == [destino.name]
@@ -0,0 +1,41 @@
+from datetime import date
+
+import archivo
+import datos
+import db
+import respaldo
+
+
+def _seq_cambios() -> int:
+    with db.get_conn() as conn:
+        return conn.execute("SELECT seq FROM sqlite_sequence WHERE name='cambios'").fetchone()[0]
+
+
+def test_respaldo_y_restauracion(base):
+    vieja = datos.ensure_semana(date(2024, 3, 4), date(2024, 3, 9), "Ana")[0]
+    datos.guardar_registro(vieja, date(2024, 3, 4), None, "Zoila", "", "", 10.0, 0, 0.0)
+    datos.cambiar_estado_hoja(vieja, True)
+    assert archivo.archivar(meses=1, hoy=date(2025, 1, 1))["hojas"] == 1
+    sid = datos.ensure_semana(date(2025, 3, 3), date(2025, 3, 8), "Ana")[0]
+    datos.guardar_registro(sid, date(2025, 3, 3), None, "Zoila", "", "", 35.0, 0, 0.0)
+
+    creado = respaldo.crear(pausa=0)
+    assert creado["archivos"] == ["registro_2024.db"]
+    assert respaldo.verificar(creado["nombre"]) == {"registro.db": "ok", "archivo/registro_2024.db": "ok"}
+    # Con fecha anterior: el respaldo previo de restaurar() no choca con este nombre en el mismo segundo
+    nombre = "registro_20250101-000000"
+    creado["ruta"].rename(respaldo.carpeta() / nombre)
+
+    datos.guardar_registro(sid, date(2025, 3, 4), None, "Beto", "", "", 30.0, 0, 0.0)
+    datos.delete_hoja(sid)
+    assert datos.contar_registros(sid) == 0
+    seq = _seq_cambios()
+
+    res = respaldo.restaurar(nombre)
+
+    assert res["restaurado"] == nombre and res["respaldo_previo"] in {r["nombre"] for r in respaldo.listar()}
+    assert datos.contar_registros(sid) == 1  # sin limpiar la caché a mano
+    assert sorted(datos.list_hojas()["id"].tolist()) == sorted([vieja, sid])
+    assert datos.contar_registros(vieja) == 1  # la archivada sigue accesible
+    assert db.verificar_totales() == []
+    assert _seq_cambios() >= seq  # el diario no retrocede
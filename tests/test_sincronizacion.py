@@ -0,0 +1,68 @@
+import json
+from datetime import date
+
+import pytest
+
+import cache
+import datos
+import db
+import sincronizacion
+
+LUNES = date(2025, 3, 3)
+
+
+@pytest.fixture
+def sitio(base, tmp_path, monkeypatch):
+    """Cambia la DB actual entre la central (la de `base`) y un sitio en otra carpeta."""
+    rutas = {"central": base, "norte": tmp_path / "norte" / "registro.db"}
+
+    def usar(nombre: str) -> None:
+        monkeypatch.setattr(db, "DB_PATH", rutas[nombre])
+        db.init_db()
+        cache.CACHE.limpiar()
+
+    return usar
+
+
+def _monto(trabajador: str) -> float:
+    with db.get_conn() as conn:
+        return conn.execute("SELECT monto FROM entradas WHERE trabajador=?", (trabajador,)).fetchone()[0]
+
+
+def test_delta_repetido_no_hace_nada_y_los_conflictos_se_anotan(sitio, tmp_path):
+    sitio("norte")
+    sid = datos.ensure_semana(LUNES, date(2025, 3, 8), "Ana")[0]
+    datos.guardar_registro(sid, LUNES, None, "Zoila", "", "", 35.0, 0, 0.0)
+    datos.guardar_registro(sid, LUNES, None, "Beto", "", "", 30.0, 0, 0.0)
+    primero = sincronizacion.exportar(tmp_path / "d1.jsonl.gz")
+
+    sitio("central")
+    res = sincronizacion.aplicar(tmp_path / "d1.jsonl.gz")
+    assert (res["aplicados"], res["conflictos"]) == (primero["cambios"], 0)
+    res = sincronizacion.aplicar(tmp_path / "d1.jsonl.gz")
+    assert (res["aplicados"], res["omitidos"], res["conflictos"]) == (0, 0, 0)
+    assert (_monto("Zoila"), _monto("Beto")) == (35.0, 30.0)
+    central = datos.hoja_mas_reciente()
+    datos.guardar_registro(central, LUNES, None, "Zoila", "", "", 50.0, 0, 0.0)  # edición en la central
+
+    sitio("norte")
+    datos.guardar_registro(sid, LUNES, None, "Zoila", "", "", 40.0, 0, 0.0)  # el mismo día, en el sitio
+    sincronizacion.exportar(tmp_path / "d2.jsonl.gz")
+    datos.guardar_registro(sid, LUNES, None, "Beto", "", "", 31.0, 0, 0.0)
+    datos.guardar_registro(sid, LUNES, None, "Beto", "", "", 32.0, 0, 0.0)
+    tercero = sincronizacion.exportar(tmp_path / "d3.jsonl.gz")
+    sincronizacion.exportar(tmp_path / "d4.jsonl.gz", desde=tercero["desde"] + 1)  # le falta el primero de d3
+
+    sitio("central")
+    res = sincronizacion.aplicar(tmp_path / "d2.jsonl.gz", politica="local")
+    assert (res["aplicados"], res["conflictos"]) == (0, 1)
+    assert _monto("Zoila") == 50.0  # gana la de aquí
+    with db.get_conn() as conn:
+        conflicto = dict(conn.execute("SELECT tabla, op, local, remoto, resolucion FROM sync_conflictos").fetchone())
+    assert (conflicto["tabla"], conflicto["op"], conflicto["resolucion"]) == ("entradas", "U", "local")
+    assert (json.loads(conflicto["local"])["monto"], json.loads(conflicto["remoto"])["monto"]) == (50.0, 40.0)
+
+    with pytest.raises(ValueError, match="Faltan cambios"):
+        sincronizacion.aplicar(tmp_path / "d4.jsonl.gz")
+    assert sincronizacion.aplicar(tmp_path / "d3.jsonl.gz")["conflictos"] == 0
+    assert _monto("Beto") == 32.0
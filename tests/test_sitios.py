@@ -0,0 +1,41 @@
+import json
+from datetime import date
+
+import pytest
+
+import sitios
+
+
+def test_lista_de_sitios_se_relee_solo_si_cambia(base, monkeypatch):
+    lecturas = []
+    loads = json.loads
+    monkeypatch.setattr(sitios.json, "loads", lambda texto: lecturas.append(texto) or loads(texto))
+    (base.parent / sitios.MAPA).write_text(json.dumps({"sur": "/srv/sur/registro.db"}), encoding="utf-8")
+
+    assert list(sitios.sitios()) == [sitios.PRINCIPAL, "sur"]
+    assert list(sitios.sitios()) == [sitios.PRINCIPAL, "sur"]
+    assert len(lecturas) == 1
+
+    sitios.crear("norte")  # la lista se refresca sin esperar otro cambio de mtime
+    assert list(sitios.sitios()) == [sitios.PRINCIPAL, "norte", "sur"]
+
+    (base.parent / sitios.MAPA).write_text("{}", encoding="utf-8")
+    assert list(sitios.sitios()) == [sitios.PRINCIPAL, "norte"]
+    assert len(lecturas) == 3
+
+
+def test_consolidado_fallido_no_pisa_el_anterior(base, monkeypatch):
+    desde, hasta = date(2025, 1, 6), date(2025, 1, 11)
+    destino, n = sitios.exportar_consolidado(desde, hasta)
+    assert n == 0 and destino.read_text(encoding="utf-8").startswith(",".join(sitios.COLUMNAS))
+    anterior = destino.read_bytes()
+
+    def a_medias(desde, hasta):
+        yield ("x",) * len(sitios.COLUMNAS)
+        raise RuntimeError("se cayó el sitio")
+
+    monkeypatch.setattr(sitios, "iter_consolidado", a_medias)
+    with pytest.raises(RuntimeError):
+        sitios.exportar_consolidado(desde, hasta)
+    assert destino.read_bytes() == anterior
+    assert [p.name for p in destino.parent.iterdir()] == [destino.name]  # sin temporales huérfanos